@@ -0,0 +1,75 @@
+"""
+Disk savings and encode cost of the archival copies of transaction images.
+
+Encodes document-like scans (light background, dark text-like strokes, sensor
+noise) of typical upload sizes with ``encode_archive_image`` and reports, per
+format, the size of the original and of the archival copy, the saving, and the
+encode latency added per image.
+
+Usage::
+
+    python app/benchmarks/bench_archive.py
+"""
+import random
+from io import BytesIO
+
+from common import print_table, setup_django, timeit
+
+SCANS = {
+    "phone_photo_4000x3000": ((4000, 3000), 92),
+    "scan_2480x1754": ((2480, 1754), 95),
+    "small_1280x960": ((1280, 960), 90),
+}
+ARCHIVE_FORMATS = [("WEBP", 60), ("WEBP", 75), ("JPEG", 70)]
+
+
+def make_document(size, quality):
+    """
+    Build a JPEG resembling a photographed identity document.
+    """
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(0)
+    width, height = size
+    image = Image.new("RGB", size, (236, 232, 222))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((width // 20, height // 8, width // 3, height * 3 // 4), fill=(170, 160, 150))
+    for _ in range(400):
+        x, y = rng.randrange(width // 2 - 100, width - 200), rng.randrange(height // 8, height - 60)
+        draw.rectangle((x, y, x + rng.randrange(20, 180), y + rng.randrange(8, 24)), fill=(40, 40, 60))
+    noise = Image.effect_noise(size, 12).convert("RGB")
+    image = Image.blend(image, noise, 0.08).filter(ImageFilter.GaussianBlur(0.6))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def main():
+    setup_django()
+    from django.core.files.base import ContentFile
+    from utils.processing_images import encode_archive_image
+
+    rows = []
+    for scan, (size, quality) in SCANS.items():
+        original = make_document(size, quality)
+        for image_format, archive_quality in ARCHIVE_FORMATS:
+
+            def encode():
+                return encode_archive_image(ContentFile(original), image_format, archive_quality, (1600, 1600))
+
+            archive = encode()
+            rows.append(
+                {
+                    "scan": scan,
+                    "format": f"{image_format} q{archive_quality}",
+                    "original_kb": len(original) // 1024,
+                    "archive_kb": archive.size // 1024,
+                    "saving": f"{100 - 100 * archive.size / len(original):.1f}%",
+                    **timeit(encode, repeat=10),
+                }
+            )
+    print_table(rows, ["scan", "format", "original_kb", "archive_kb", "saving", "median_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Load test of the transaction create/retrieve endpoints served over WSGI and ASGI.
+
+Drives the real Django application objects in-process, each scenario in its own
+interpreter pinned to the same CPUs, with the same number of concurrent
+clients:
+
+* ``wsgi``: ``core.wsgi`` called from ``--threads`` server threads, as a
+  gunicorn ``gthread`` worker does.
+* ``asgi``: ``core.asgi`` on one event loop with the sync DRF views, i.e. only
+  swapping the server (Django runs the views on its single sync thread).
+* ``asgi_views``: ``core.asgi`` with ``ASGI_VIEWS`` enabled, so the async
+  views run their blocking work on ``--threads`` view threads.
+
+``retrieve`` is GET /transaction/{id}/, ``create`` POST /transaction/ with two
+distinct 1280x960 JPEGs per request. Reports throughput, latency and CPU time
+per request. The database comes from ``DJANGO_SETTINGS_MODULE`` (a test
+database is created and dropped; SQLite uses a temporary file so server threads
+share it). Usage::
+
+    python app/benchmarks/bench_asgi_wsgi.py [--cpus 2] [--clients 32] [--threads 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from common import print_table, run_isolated, setup_django, setup_test_database
+
+SCENARIOS = ("wsgi", "asgi", "asgi_views")
+REQUESTS = {"retrieve": 2000, "create": 200}
+
+
+def make_bodies(count, client_id):
+    from PIL import Image
+    from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    bodies = []
+    for index in range(count):
+        files = {}
+        for side, offset in (("image_frontside", 0), ("image_backside", 1)):
+            buffer = BytesIO()
+            color = ((2 * index + offset) % 256, (2 * index + offset) // 256 % 256, 128)
+            Image.new("RGB", (1280, 960), color).save(buffer, format="JPEG")
+            files[side] = SimpleUploadedFile(f"{side}.jpg", buffer.getvalue())
+        bodies.append(encode_multipart(BOUNDARY, {"client": client_id, **files}))
+    return MULTIPART_CONTENT, bodies
+
+
+def wsgi_runner(clients, threads):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    server_threads = threading.Semaphore(threads)
+
+    def call(method, path, content_type, body):
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_TYPE": content_type,
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": BytesIO(body),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": sys.stderr,
+        }
+        statuses = []
+        with server_threads:
+            result = application(environ, lambda status, headers: statuses.append(status))
+            b"".join(result)
+            result.close()
+        return int(statuses[0].split()[0])
+
+    def run(requests):
+        latencies, lock = [], threading.Lock()
+        queue = iter(requests)
+
+        def client():
+            while True:
+                with lock:
+                    request = next(queue, None)
+                if request is None:
+                    return
+                start = time.perf_counter()
+                status = call(*request)
+                assert status in (200, 201), status
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        workers = [threading.Thread(target=client) for _ in range(clients)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return latencies
+
+    return run
+
+
+def asgi_runner(clients):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+
+    async def call(method, path, content_type, body):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        statuses = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await application(scope, receive, send)
+        return statuses[0]
+
+    async def run_async(requests):
+        latencies = []
+        queue = iter(requests)
+
+        async def client():
+            for request in queue:
+                start = time.perf_counter()
+                status = await call(*request)
+                assert status in (200, 201), status
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return latencies
+
+    return lambda requests: asyncio.run(run_async(requests))
+
+
+def run_child(scenario, workload, clients, threads):
+    clients, threads = int(clients), int(threads)
+    os.environ["ASGI_VIEWS"] = "true" if scenario == "asgi_views" else "false"
+    os.environ["ASGI_VIEW_THREADS"] = str(threads)
+    setup_django()
+    from django.db import connections
+
+    database = connections["default"].settings_dict
+    if database["ENGINE"].endswith("sqlite3"):
+        database["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    teardown = setup_test_database()
+    from django.test import override_settings
+    from clients.models import Client
+    from transactions.models import Transaction
+
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            client_id = Client.objects.create(full_name="Bench", email="bench@example.com").id
+            count = REQUESTS[workload]
+            if workload == "create":
+                content_type, bodies = make_bodies(count, client_id)
+                requests = [("POST", "/transaction/", content_type, body) for body in bodies]
+            else:
+                transaction = Transaction.objects.create(client_id=client_id, result=True)
+                requests = [("GET", f"/transaction/{transaction.id}/", "", b"")] * count
+            run = wsgi_runner(clients, threads) if scenario == "wsgi" else asgi_runner(clients)
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            cpu = usage.ru_utime + usage.ru_stime
+            start = time.perf_counter()
+            latencies = sorted(run(requests))
+            elapsed = time.perf_counter() - start
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            cpu = usage.ru_utime + usage.ru_stime - cpu
+    finally:
+        teardown()
+    print(
+        json.dumps(
+            {
+                "req_per_s": round(count / elapsed, 1),
+                "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+                "cpu_ms_per_req": round(cpu * 1000 / count, 2),
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cpus", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    # Pin every scenario (the child inherits the affinity) to the same CPUs.
+    os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[: args.cpus])
+    rows = []
+    for workload in REQUESTS:
+        for scenario in SCENARIOS:
+            result = run_isolated(__file__, "--child", scenario, workload, str(args.clients), str(args.threads))
+            rows.append({"workload": workload, "server": scenario, **result})
+    print(f"cpus={args.cpus} clients={args.clients} threads={args.threads}")
+    print_table(rows, ["workload", "server", "req_per_s", "p50_ms", "p95_ms", "cpu_ms_per_req"])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run_child(*sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,83 @@
+"""
+Streaming base64 ingest versus parsing the whole JSON body.
+
+For a JSON body carrying one base64 image of 1, 4 and 16 MB, compares
+
+* ``current``: DRF's ``JSONParser`` followed by ``base64.b64decode`` into a
+  ``BytesIO`` (the previous ``base64_to_image``).
+* ``streaming``: ``Base64StreamingJSONParser`` decoding into a spooled
+  temporary file, with the 4 MB ``max_size_mb`` limit of POST /transaction/.
+
+Each measurement runs in a fresh interpreter and reads the body from a file, as
+it would be read from the socket.
+
+Usage::
+
+    python app/benchmarks/bench_base64_ingest.py
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+from common import peak_rss_mb, print_table, run_isolated, setup_django, timeit
+
+SIZES_MB = [1, 4, 16]
+
+
+class View:
+    base64_file_fields = ("image_frontside",)
+    base64_max_size_mb = 4
+
+
+def run_child(path_name, body_path):
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from utils.parsers import Base64StreamingJSONParser
+
+    def current():
+        with open(body_path, "rb") as stream:
+            data = JSONParser().parse(stream)
+        return BytesIO(base64.b64decode(data["image_frontside"]))
+
+    def streaming():
+        with open(body_path, "rb") as stream:
+            data = Base64StreamingJSONParser().parse(stream, parser_context={"view": View()})
+        data["image_frontside"].close()
+
+    func = current if path_name == "current" else streaming
+    rss_before = peak_rss_mb()
+    timing = timeit(func, repeat=5)
+    print(
+        json.dumps(
+            {
+                **timing,
+                "peak_rss_mb": peak_rss_mb(),
+                "rss_delta_mb": round(peak_rss_mb() - rss_before, 1),
+            }
+        )
+    )
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in SIZES_MB:
+            body_path = os.path.join(directory, f"body_{size_mb}.json")
+            with open(body_path, "w") as body:
+                encoded = base64.b64encode(os.urandom(size_mb * 1024 * 1024)).decode()
+                json.dump({"client": 1, "image_frontside": encoded}, body)
+                del encoded
+            for path_name in ("current", "streaming"):
+                result = run_isolated(__file__, path_name, body_path)
+                rows.append({"payload_mb": size_mb, "path": path_name, **result})
+    print_table(rows, ["payload_mb", "path", "median_ms", "p95_ms", "peak_rss_mb", "rss_delta_mb"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run_child(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,118 @@
+"""
+Throughput of POST /transactions/bulk/ versus one POST /transaction/ per pair.
+
+Submits the same front/back pairs (distinct images, so deduplication does not
+help) through the single-item endpoint and through the NDJSON bulk endpoint at
+several chunk sizes, and reports pairs per second.
+
+The database comes from ``DJANGO_SETTINGS_MODULE`` (a test database is created
+and dropped). Usage::
+
+    python app/benchmarks/bench_bulk_transactions.py [pairs]
+"""
+import base64
+import json
+import sys
+import tempfile
+import time
+
+from common import print_table, setup_django, setup_test_database
+
+CHUNK_SIZES = [50, 200]
+
+
+def make_pairs(count):
+    from PIL import Image
+    from io import BytesIO
+
+    pairs = []
+    for index in range(count * 2):
+        buffer = BytesIO()
+        Image.new("RGB", (640, 480), (index % 256, index // 256 % 256, 128)).save(buffer, format="JPEG")
+        pairs.append(buffer.getvalue())
+    return list(zip(pairs[::2], pairs[1::2]))
+
+
+def reset():
+    from transactions.models import Transaction
+    from utils.processing_images import get_verdict_cache
+
+    Transaction.objects.all().delete()
+    get_verdict_cache().clear()
+
+
+def run_single(client, client_id, pairs):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    start = time.perf_counter()
+    for front, back in pairs:
+        response = client.post(
+            "/transaction/",
+            {
+                "client": client_id,
+                "image_frontside": SimpleUploadedFile("front.jpg", front),
+                "image_backside": SimpleUploadedFile("back.jpg", back),
+            },
+            format="multipart",
+        )
+        assert response.status_code == 201, response.content
+    return time.perf_counter() - start
+
+
+def run_bulk(client, client_id, pairs, chunk_size):
+    from django.test import override_settings
+
+    body = "\n".join(
+        json.dumps(
+            {
+                "client": client_id,
+                "image_frontside": base64.b64encode(front).decode(),
+                "image_backside": base64.b64encode(back).decode(),
+            }
+        )
+        for front, back in pairs
+    )
+    with override_settings(BULK_TRANSACTIONS={"CHUNK_SIZE": chunk_size}):
+        start = time.perf_counter()
+        response = client.post("/transactions/bulk/", body, content_type="application/x-ndjson")
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.content
+    return elapsed
+
+
+def main(count=200):
+    setup_django()
+    teardown = setup_test_database()
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from clients.models import Client
+
+    pairs = make_pairs(count)
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            client_id = Client.objects.create(full_name="Bench", email="bench@example.com").id
+            api = APIClient()
+            runs = [("single", None)] + [("bulk", chunk_size) for chunk_size in CHUNK_SIZES]
+            for endpoint, chunk_size in runs:
+                reset()
+                if chunk_size is None:
+                    elapsed = run_single(api, client_id, pairs)
+                else:
+                    elapsed = run_bulk(api, client_id, pairs, chunk_size)
+                rows.append(
+                    {
+                        "endpoint": endpoint,
+                        "chunk_size": chunk_size or "-",
+                        "pairs": count,
+                        "seconds": round(elapsed, 3),
+                        "pairs_per_s": round(count / elapsed, 1),
+                    }
+                )
+    finally:
+        teardown()
+    print_table(rows, ["endpoint", "chunk_size", "pairs", "seconds", "pairs_per_s"])
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
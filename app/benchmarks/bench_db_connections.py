@@ -0,0 +1,79 @@
+"""
+Database connection setup cost versus request latency.
+
+For each connection mode, times opening the connection of a request on its own
+(``connect``) and a whole GET /transaction/{id}/ including the end-of-request
+connection handling (``request``):
+
+* ``new``: ``CONN_MAX_AGE = 0`` without pool, a connection per request.
+* ``persistent``: ``CONN_MAX_AGE = 60``, one connection kept per thread.
+* ``pool``: the ``utils.pooled_postgresql`` backend with ``CONN_MAX_AGE = 0``,
+  the connection goes back to the pool after each request (PostgreSQL only).
+
+The database comes from ``DJANGO_SETTINGS_MODULE`` (a test database is created
+and dropped); run it against the PostgreSQL of compose.yaml, the connect cost of
+SQLite is not representative. Usage::
+
+    DJANGO_SETTINGS_MODULE=core.settings POSTGRES_HOST=localhost python app/benchmarks/bench_db_connections.py
+"""
+from common import print_table, setup_django, setup_test_database, timeit
+
+REPEAT = 200
+
+
+def main():
+    setup_django()
+    teardown = setup_test_database()
+    from django.db import connections
+
+    default = connections["default"]
+    try:
+        rows = run(default)
+    finally:
+        connections["default"].close()
+        if hasattr(connections["default"], "close_pools"):
+            connections["default"].close_pools()
+        connections["default"] = default
+        teardown()
+    print_table(rows, ["mode", "scope", "median_ms", "p95_ms"])
+
+
+def run(default):
+    from django.db import close_old_connections, connections
+    from django.db.utils import load_backend
+    from rest_framework.test import APIClient
+    from clients.models import Client
+    from transactions.models import Transaction
+
+    client = Client.objects.create(full_name="Bench", email="bench@example.com")
+    transaction_id = Transaction.objects.create(client=client).id
+    api = APIClient()
+    settings_dict = default.settings_dict
+    modes = [("new", 0, None), ("persistent", 60, None)]
+    if default.vendor == "postgresql":
+        modes.append(("pool", 0, "utils.pooled_postgresql"))
+
+    def connect():
+        connection = connections["default"]
+        connection.close()
+        connection.ensure_connection()
+
+    def request():
+        response = api.get(f"/transaction/{transaction_id}/")
+        assert response.status_code == 200, response.content
+        # What the request_finished signal does, the test client disconnects it.
+        close_old_connections()
+
+    rows = []
+    for mode, max_age, engine in modes:
+        connections["default"].close()
+        settings_dict["CONN_MAX_AGE"] = max_age
+        if engine is not None:
+            connections["default"] = load_backend(engine).DatabaseWrapper(settings_dict, "default")
+        rows.append({"mode": mode, "scope": "connect", **timeit(connect, REPEAT)})
+        rows.append({"mode": mode, "scope": "request", **timeit(request, REPEAT)})
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Peak memory of a burst of concurrent decodes, with and without the decode budget.
+
+THREADS threads decode (``decode_working_image``, RGB to 1024) large PNG
+uploads at the same time, as the validation executor and thumbnail requests
+would under load. PNGs have no reduced-scale decode, so each one holds its
+full-size pixels twice (decoded and converted) while it is resized.
+
+* ``unbounded``: a budget larger than the burst, every decode starts at once.
+* ``budget_<N>mb``: ``IMAGE_DECODE["MAX_BYTES"]`` of N MB, decodes past the
+  budget wait for memory (``TIMEOUT`` 30 s, none is rejected).
+
+Each scenario runs in a fresh interpreter; ``rss_delta_mb`` is the growth of
+the peak RSS during the burst, ``waited`` the decodes that had to wait. The
+children run with a fixed glibc mmap threshold, so freed pixel blocks go back
+to the system instead of staying in the heap and hiding the difference.
+
+Usage::
+
+    python app/benchmarks/bench_decode_budget.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from common import make_image, peak_rss_mb, print_table, run_isolated, setup_django
+
+THREADS = 8
+UPLOAD_SIZE = (3840, 2160)
+BUDGETS = {"unbounded": 4096, "budget_256mb": 256, "budget_128mb": 128}
+
+
+def run_child(mode, path):
+    setup_django()
+    from django.conf import settings
+    from utils.processing_images import decode_working_image, get_decode_budget
+
+    settings.IMAGE_DECODE = {"MAX_BYTES": BUDGETS[mode] * 1024 * 1024, "TIMEOUT": 30}
+    with open(path, "rb") as upload_file:
+        content = upload_file.read()
+    decode_working_image(BytesIO(content), (1024, 1024))
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(lambda _: decode_working_image(BytesIO(content), (1024, 1024)), range(THREADS)))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    stats = get_decode_budget().stats()
+    print(
+        json.dumps(
+            {
+                "burst_ms": round(elapsed_ms, 1),
+                "rss_delta_mb": round(peak_rss_mb() - rss_before, 1),
+                "peak_reserved_mb": round(stats["peak"] / 1024 / 1024, 1),
+                "waited": stats["waited"],
+                "rejected": stats["rejected"],
+            }
+        )
+    )
+
+
+def main():
+    rows = []
+    os.environ.setdefault("MALLOC_MMAP_THRESHOLD_", str(1024 * 1024))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "upload.png")
+        with open(path, "wb") as upload_file:
+            upload_file.write(make_image("PNG", UPLOAD_SIZE))
+        for mode in BUDGETS:
+            rows.append({"mode": mode, **run_isolated(__file__, mode, path)})
+    print_table(rows, ["mode", "burst_ms", "rss_delta_mb", "peak_reserved_mb", "waited", "rejected"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run_child(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,86 @@
+"""
+Reduced-resolution decode of uploads versus a full decode.
+
+For photographed-document JPEGs and a PNG of upload sizes, compares
+
+* ``full``: ``Image.open(...).convert("RGB")`` at full resolution, what any
+  stage needing pixels did before.
+* ``rgb_1024``: ``decode_working_image`` to the largest thumbnail (RGB).
+* ``gray_512``: ``decode_working_image`` to the quality check working image
+  ("L", box filter).
+* ``memo_hit``: a second stage asking for a smaller RGB image of an upload
+  already decoded to 1024, derived from the memoized image.
+
+Each measurement runs in a fresh interpreter so its peak RSS is its own;
+``rss_delta_mb`` is the growth of the peak during the decodes.
+
+Usage::
+
+    python app/benchmarks/bench_image_decode.py
+"""
+import json
+import os
+import sys
+import tempfile
+from io import BytesIO
+
+from bench_archive import make_document
+from common import make_image, peak_rss_mb, print_table, run_isolated, setup_django, timeit
+
+UPLOADS = {
+    "jpeg_4000x3000": lambda: make_document((4000, 3000), 92),
+    "jpeg_3840x2160": lambda: make_document((3840, 2160), 92),
+    "png_1600x1200": lambda: make_image("PNG", (1600, 1200)),
+}
+MODES = ["full", "rgb_1024", "gray_512", "memo_hit"]
+
+
+def run_child(mode, path):
+    setup_django()
+    from PIL import Image
+    from utils.processing_images import decode_working_image
+
+    with open(path, "rb") as upload_file:
+        content = upload_file.read()
+
+    def full():
+        with Image.open(BytesIO(content)) as image:
+            return image.convert("RGB")
+
+    def rgb_1024():
+        return decode_working_image(BytesIO(content), (1024, 1024))
+
+    def gray_512():
+        return decode_working_image(BytesIO(content), (512, 512), "L", Image.Resampling.BOX)
+
+    upload = BytesIO(content)
+    decode_working_image(upload, (1024, 1024))
+    decoded = dict(upload.working_images)
+
+    def memo_hit():
+        upload.working_images = dict(decoded)
+        return decode_working_image(upload, (480, 480))
+
+    decode = {"full": full, "rgb_1024": rgb_1024, "gray_512": gray_512, "memo_hit": memo_hit}[mode]
+    rss_before = peak_rss_mb()
+    timing = timeit(decode, repeat=10)
+    print(json.dumps({**timing, "rss_delta_mb": round(peak_rss_mb() - rss_before, 1)}))
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, build in UPLOADS.items():
+            path = os.path.join(directory, name)
+            with open(path, "wb") as upload_file:
+                upload_file.write(build())
+            for mode in MODES:
+                rows.append({"upload": name, "mode": mode, **run_isolated(__file__, mode, path)})
+    print_table(rows, ["upload", "mode", "median_ms", "p95_ms", "rss_delta_mb"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run_child(*sys.argv[1:])
+    else:
+        main()
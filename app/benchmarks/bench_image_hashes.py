@@ -0,0 +1,160 @@
+"""
+Perceptual hashes and the near-duplicate index of transactions.
+
+* ``robustness``: the dHash distance between a photographed document and
+  re-encoded, downscaled, brightened, rotated or cropped copies of it, and to
+  documents of the same layout with other contents.
+* ``hash``: ``dhash_image`` of a 12 MP JPEG, decoding it, and reusing the
+  working image of the quality checks.
+* ``search``: the "seen before" lookup (both sides, ``MAX_DISTANCE`` 4 and 6)
+  in a ``HashIndex`` of N random transactions loaded from its snapshot,
+  versus a linear scan of the hashes; the memory of the index (tracemalloc),
+  the size of the snapshot and the time to save (compact) and load it.
+
+Usage::
+
+    python app/benchmarks/bench_image_hashes.py
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from bench_archive import make_document
+from common import print_table, setup_django, timeit
+
+SIZES = [10_000, 100_000, 1_000_000]
+MAX_DISTANCES = [4, 6]
+
+
+def make_layout(seed, size=(2400, 1800)):
+    """
+    Build a document with the layout of ``make_document`` and random contents.
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, (236, 232, 222))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((width // 20, height // 8, width // 3, height * 3 // 4), fill=(170, 160, 150))
+    for _ in range(400):
+        x, y = rng.randrange(width // 2 - 100, width - 200), rng.randrange(height // 8, height - 60)
+        draw.rectangle((x, y, x + rng.randrange(20, 180), y + rng.randrange(8, 24)), fill=(40, 40, 60))
+    return image
+
+
+def robustness():
+    from PIL import ImageEnhance
+    from transactions.duplicates import hamming_distance
+    from utils.processing_images import dhash_image
+
+    def encoded(image, quality=90):
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        return buffer
+
+    document = make_layout(0)
+    width, height = document.size
+    variants = {
+        "jpeg_q50": encoded(document, 50),
+        "downscaled_1200": encoded(document.resize((1200, 900))),
+        "brighter_15pct": encoded(ImageEnhance.Brightness(document).enhance(1.15)),
+        "rotated_1deg": encoded(document.rotate(1, fillcolor=(236, 232, 222))),
+        "cropped_2pct": encoded(document.crop((width // 50, height // 50, width - width // 50, height - height // 50))),
+        **{f"same_layout_{seed}": encoded(make_layout(seed)) for seed in range(1, 6)},
+    }
+    reference = dhash_image(encoded(document))
+    return [
+        {"variant": name, "distance": hamming_distance(reference, dhash_image(upload))}
+        for name, upload in variants.items()
+    ]
+
+
+def hashing():
+    from utils.processing_images import decode_grayscale, dhash_image
+
+    content = make_document((4000, 3000), 92)
+    upload = BytesIO(content)
+    decode_grayscale(upload, 512)
+    return [
+        {"mode": "decode_and_hash", **timeit(lambda: dhash_image(BytesIO(content)))},
+        {"mode": "memoized_working_image", **timeit(lambda: dhash_image(upload))},
+    ]
+
+
+def search():
+    from transactions.duplicates import HashIndex, hamming_distance
+
+    rng = random.Random(0)
+    rows = []
+    for size in SIZES:
+        hashes = [(rng.getrandbits(64) - (1 << 63), rng.getrandbits(64) - (1 << 63)) for _ in range(size)]
+        building = HashIndex()
+        for pk, pair in enumerate(hashes, 1):
+            building.add(pk, pk, *pair)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.bin")
+            start = time.perf_counter()
+            building.save(path)
+            save_ms = (time.perf_counter() - start) * 1000
+            del building
+            snapshot_mb = os.path.getsize(path) / 1024 / 1024
+            tracemalloc.start()
+            start = time.perf_counter()
+            index = HashIndex.load(path)
+            load_ms = (time.perf_counter() - start) * 1000
+            index_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            tracemalloc.stop()
+        # A resubmission of a known document, a few bits off.
+        front, back = hashes[size // 2][0] ^ 0b101, hashes[size // 2][1] ^ 0b11 << 40
+        for max_distance in MAX_DISTANCES:
+
+            def lookup():
+                # As check_seen_before: search the front side, compare the back side.
+                return [
+                    pk
+                    for _, pk, _ in index.search(front, "frontside", max_distance)
+                    if hamming_distance(back, index.get(pk)[2]) <= max_distance
+                ]
+
+            def scan():
+                return [
+                    pk
+                    for pk, (a, b) in enumerate(hashes, 1)
+                    if hamming_distance(front, a) <= max_distance and hamming_distance(back, b) <= max_distance
+                ]
+
+            assert lookup() == scan() == [size // 2 + 1]
+            rows.append(
+                {
+                    "transactions": size,
+                    "max_distance": max_distance,
+                    "lookup_ms": timeit(lookup, 200)["median_ms"],
+                    "scan_ms": timeit(scan, 3)["median_ms"],
+                    "index_mb": round(index_mb, 1),
+                    "snapshot_mb": round(snapshot_mb, 1),
+                    "save_ms": round(save_ms, 1),
+                    "load_ms": round(load_ms, 1),
+                }
+            )
+        del index, hashes
+    return rows
+
+
+def main():
+    setup_django()
+    print_table(robustness(), ["variant", "distance"])
+    print()
+    print_table(hashing(), ["mode", "median_ms", "p95_ms"])
+    print()
+    print_table(
+        search(),
+        ["transactions", "max_distance", "lookup_ms", "scan_ms", "index_mb", "snapshot_mb", "save_ms", "load_ms"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Header probing versus the Pillow based upload validation.
+
+Compares, per request (front and back side), the latency and peak RSS of
+
+* ``current``: DRF's ``ImageField`` (Pillow open + verify) followed by ``validate_image``.
+* ``probe``: ``ProbedImageField`` followed by ``validate_image`` and, for
+  images passing the header checks, ``ProbedImageField.verify``.
+
+Usage::
+
+    python app/benchmarks/bench_image_probe.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+from common import make_image, peak_rss_mb, print_table, run_isolated, setup_django, timeit
+
+SCENARIOS = {
+    "valid_jpeg": ("JPEG", (2048, 1536), True),
+    "valid_png": ("PNG", (1280, 960), True),
+    "too_large_jpeg": ("JPEG", (4000, 3000), False),
+    "too_small_png": ("PNG", (200, 150), True),
+    "bad_format_gif": ("GIF", (1024, 768), True),
+}
+LIMITS = {"max_size_mb": 4, "min_resolution": (224, 224), "max_resolution": (3840, 2160)}
+
+
+def open_upload(path):
+    from django.conf import settings
+    from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+
+    with open(path, "rb") as source:
+        content = source.read()
+    # Mirror Django's upload handlers: large files are spooled to disk.
+    if len(content) <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        return SimpleUploadedFile(os.path.basename(path), content)
+    upload = TemporaryUploadedFile(
+        os.path.basename(path), "application/octet-stream", len(content), None
+    )
+    upload.write(content)
+    upload.seek(0)
+    return upload
+
+
+def run_child(path_name, image_path):
+    setup_django()
+    from rest_framework import serializers
+    from utils.fields import ProbedImageField
+    from utils.processing_images import validate_image
+
+    if path_name == "current":
+        field = serializers.ImageField()
+    else:
+        field = ProbedImageField()
+        field.bind("image", serializers.Serializer())
+
+    def validate_side():
+        upload = open_upload(image_path)
+        try:
+            image = field.to_internal_value(upload)
+        except Exception:
+            return
+        result = validate_image(client=None, image=image, **LIMITS)
+        if not isinstance(result, dict) and path_name == "probe":
+            field.verify(result)
+
+    rss_before = peak_rss_mb()
+    timing = timeit(lambda: (validate_side(), validate_side()))
+    print(
+        json.dumps(
+            {
+                **timing,
+                "peak_rss_mb": peak_rss_mb(),
+                "rss_delta_mb": round(peak_rss_mb() - rss_before, 1),
+            }
+        )
+    )
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario, (image_format, size, noise) in SCENARIOS.items():
+            image_path = os.path.join(directory, f"{scenario}.{image_format.lower()}")
+            with open(image_path, "wb") as target:
+                target.write(make_image(image_format, size, noise))
+            for path_name in ("current", "probe"):
+                result = run_isolated(__file__, path_name, image_path)
+                rows.append(
+                    {
+                        "scenario": scenario,
+                        "bytes": os.path.getsize(image_path),
+                        "path": path_name,
+                        **result,
+                    }
+                )
+    print_table(rows, ["scenario", "bytes", "path", "median_ms", "p95_ms", "peak_rss_mb", "rss_delta_mb"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run_child(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,84 @@
+"""
+Cost of the image quality checks (sharpness, exposure, glare).
+
+For photographed-document JPEGs of upload sizes, sharp and blurred, reports
+the metrics and verdict of ``check_image_quality`` and times:
+
+* ``full``: the same metrics on a full-resolution grayscale decode, what a
+  naive implementation would do.
+* ``floor``: the cheapest decode libjpeg offers, luminance only at 1/8 scale.
+  Entropy decoding costs the same at every scale, so this bounds ``check``.
+* ``decode``: ``decode_grayscale`` alone (DCT-scaled JPEG decode + box filter).
+* ``check``: ``check_image_quality``, decode and NumPy scoring, the latency
+  added per image. The target is under 15 ms for a 12 MP photo; on a slow
+  core the floor of a 12 MP JPEG alone is above it (known limitation).
+
+Every timed call gets a fresh upload, so the memoized working images of
+``decode_working_image`` are not reused.
+
+Usage::
+
+    python app/benchmarks/bench_image_quality.py
+"""
+from io import BytesIO
+
+from bench_archive import make_document
+from common import print_table, setup_django, timeit
+
+PHOTOS = {
+    "12mp_4000x3000": ((4000, 3000), 92),
+    "8mp_3840x2160": ((3840, 2160), 92),
+    "2mp_1600x1200": ((1600, 1200), 90),
+}
+
+
+def main():
+    setup_django()
+    from PIL import Image, ImageFilter
+    from utils.processing_images import (
+        check_image_quality,
+        decode_grayscale,
+        get_quality_settings,
+        score_image_quality,
+    )
+
+    config = {**get_quality_settings(), "ENABLED": True}
+    rows = []
+    for name, (size, quality) in PHOTOS.items():
+        sharp = make_document(size, quality)
+        with Image.open(BytesIO(sharp)) as image:
+            buffer = BytesIO()
+            image.filter(ImageFilter.GaussianBlur(size[0] / 400)).save(buffer, format="JPEG", quality=quality)
+        for variant, content in (("sharp", sharp), ("blurred", buffer.getvalue())):
+
+            def full():
+                with Image.open(BytesIO(content)) as image:
+                    return score_image_quality(image.convert("L"))
+
+            def floor():
+                with Image.open(BytesIO(content)) as image:
+                    image.draft("L", (image.width // 8, image.height // 8))
+                    image.load()
+
+            score = score_image_quality(decode_grayscale(BytesIO(content), config["WORKING_SIZE"]))
+            verdict = check_image_quality(BytesIO(content), config)
+            row = {
+                "image": f"{name}_{variant}",
+                "sharpness": round(score.sharpness, 1),
+                "brightness": round(score.brightness, 1),
+                "glare": round(score.glare_ratio, 4),
+                "verdict": verdict["error_code"] if isinstance(verdict, dict) else "ok",
+            }
+            for mode, func in (
+                ("full", full),
+                ("floor", floor),
+                ("decode", lambda: decode_grayscale(BytesIO(content), config["WORKING_SIZE"])),
+                ("check", lambda: check_image_quality(BytesIO(content), config)),
+            ):
+                row[f"{mode}_ms"] = timeit(func, 20)["median_ms"]
+            rows.append(row)
+    print_table(rows, ["image", "sharpness", "brightness", "glare", "verdict", "full_ms", "floor_ms", "decode_ms", "check_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Per-request JWT authentication overhead.
+
+Compares, for a request carrying a valid access token,
+
+* ``simplejwt``: ``JWTAuthentication.authenticate`` followed by the former
+  ``jwt_required`` check (a second ``UntypedToken`` verification).
+* ``cached``: ``CachedJWTAuthentication.authenticate`` followed by
+  ``jwt_required``, both going through the shared verified-token cache.
+* ``cached_user`` / ``token``: the same with ``CachedUserAuthentication`` and
+  ``TokenUserAuthentication``, which skip the per-request user query.
+
+Also times token verification alone (no user lookup), which is the part the
+cache removes. Needs the database for the user lookup; uses a test database.
+
+Usage::
+
+    DJANGO_SETTINGS_MODULE=core.settings python app/benchmarks/bench_jwt_auth.py
+"""
+from common import print_table, setup_django, setup_test_database, timeit
+
+REPEAT = 2000
+
+
+def main():
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        run()
+    finally:
+        teardown()
+
+
+def run():
+    from django.contrib.auth.models import User
+    from rest_framework.response import Response
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+    from utils.authentication import (
+        CachedJWTAuthentication,
+        CachedUserAuthentication,
+        TokenUserAuthentication,
+        verify_token,
+    )
+    from utils.decorators import jwt_required
+
+    user = User.objects.create_user(username="bench", password="bench")
+    raw_token = str(RefreshToken.for_user(user).access_token)
+    request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {raw_token}")
+    view = jwt_required(lambda request: Response())
+    simplejwt, cached = JWTAuthentication(), CachedJWTAuthentication()
+
+    def simplejwt_request():
+        simplejwt.authenticate(request)
+        assert UntypedToken(raw_token)["token_type"] == "access"
+
+    def authenticated_request(authentication):
+        def request_():
+            authentication.authenticate(request)
+            view(request)
+
+        return request_
+
+    rows = [
+        {"path": "simplejwt", "scope": "verify", **timeit(lambda: UntypedToken(raw_token), REPEAT)},
+        {"path": "cached", "scope": "verify", **timeit(lambda: verify_token(raw_token), REPEAT)},
+        {"path": "simplejwt", "scope": "auth + jwt_required", **timeit(simplejwt_request, REPEAT)},
+        {"path": "cached", "scope": "auth + jwt_required", **timeit(authenticated_request(cached), REPEAT)},
+        {
+            "path": "cached_user",
+            "scope": "auth + jwt_required",
+            **timeit(authenticated_request(CachedUserAuthentication()), REPEAT),
+        },
+        {
+            "path": "token",
+            "scope": "auth + jwt_required",
+            **timeit(authenticated_request(TokenUserAuthentication()), REPEAT),
+        },
+    ]
+    for row in rows:
+        row["median_us"] = round(row.pop("median_ms") * 1000, 1)
+        row["p95_us"] = round(row.pop("p95_ms") * 1000, 1)
+    print_table(rows, ["path", "scope", "median_us", "p95_us"])
+
+
+if __name__ == "__main__":
+    main()
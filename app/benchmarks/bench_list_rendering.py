@@ -0,0 +1,96 @@
+"""
+Per-page render time of GET /transactions/ and /clients/ (35 objects).
+
+For each list, times turning one page into the response body:
+
+* ``serializer``: model instances through the serializer and JSONRenderer, as
+  ``ListModelMixin`` does.
+* ``plan``: ``.values()`` rows through the ReadPlan of the serializer, still
+  encoded by JSONRenderer.
+* ``plan_orjson``: the same encoded by FastJSONRenderer (orjson when installed),
+  what ReadPlanListMixin serves.
+
+The query is included in every mode. ``request`` times the whole GET with
+``READ_PLANS`` off and on. The bodies of all modes are checked to be identical.
+Uses a test database. Usage::
+
+    python app/benchmarks/bench_list_rendering.py
+"""
+from common import print_table, setup_django, setup_test_database, timeit
+
+REPEAT = 200
+PAGE_SIZE = 35
+
+
+def main():
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        rows = run()
+    finally:
+        teardown()
+    print_table(rows, ["list", "mode", "median_ms", "p95_ms"])
+
+
+def run():
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIClient, APIRequestFactory
+    from clients.models import Client
+    from clients.serializers import ClientSerializer
+    from transactions.models import Transaction
+    from transactions.serializers import TransactionSerializer
+    from utils.read_plans import get_read_plan
+    from utils.renderers import FastJSONRenderer
+
+    clients = Client.objects.bulk_create(
+        Client(full_name=f"Client {index}", email=f"client{index}@example.com", phone="5551234567")
+        for index in range(PAGE_SIZE)
+    )
+    Transaction.objects.bulk_create(
+        Transaction(
+            client=clients[index],
+            image_frontside=f"transaction_images/{index:064x}.jpg",
+            image_backside=f"transaction_images/{index + 1:064x}.jpg",
+            error_code=index % 5 or None,
+            details="Rejected" if index % 5 else None,
+        )
+        for index in range(PAGE_SIZE)
+    )
+    request = Request(APIRequestFactory().get("/transactions/"))
+    json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    api = APIClient()
+    api.force_authenticate(User.objects.create_user(username="bench", password="bench"))
+    rows = []
+    for name, serializer_class, queryset, url in (
+        ("transactions", TransactionSerializer, Transaction.objects.select_related("client"), "/transactions/"),
+        ("clients", ClientSerializer, Client.objects.all(), "/clients/?page=1"),
+    ):
+        queryset = queryset.order_by("-id")[:PAGE_SIZE]
+        context = {"request": request}
+
+        def serializer():
+            return json_renderer.render(serializer_class(list(queryset), many=True, context=context).data)
+
+        def plan(renderer):
+            def render():
+                child = serializer_class(context=context)
+                plan = get_read_plan(child)
+                return renderer.render(plan.render(queryset.values(*plan.paths), child))
+
+            return render
+
+        assert serializer() == plan(json_renderer)() == plan(fast_renderer)()
+        rows.append({"list": name, "mode": "serializer", **timeit(serializer, REPEAT)})
+        rows.append({"list": name, "mode": "plan", **timeit(plan(json_renderer), REPEAT)})
+        rows.append({"list": name, "mode": "plan_orjson", **timeit(plan(fast_renderer), REPEAT)})
+        for mode, enabled in (("request_off", False), ("request_on", True)):
+            with override_settings(READ_PLANS={"ENABLED": enabled}):
+                rows.append({"list": name, "mode": mode, **timeit(lambda: api.get(url), REPEAT)})
+    return rows
+
+
+if __name__ == "__main__":
+    main()
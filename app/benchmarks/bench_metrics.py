@@ -0,0 +1,73 @@
+"""
+Overhead of the request metrics (``METRICS``).
+
+* ``stage_us``: entering and leaving ``stage(...)``, in microseconds,
+  disabled (a shared no-op context manager) and enabled (two clock reads and
+  a histogram observation).
+* ``post``: POST /transaction/ of two 1600x1200 JPEGs with metrics disabled
+  and enabled (stage timers, query wrapper, request histograms).
+* ``scrape``: rendering GET /metrics after the posts.
+
+Uses the test database of ``DJANGO_SETTINGS_MODULE``. Usage::
+
+    python app/benchmarks/bench_metrics.py
+"""
+from common import make_image, print_table, setup_django, setup_test_database, timeit
+
+CALLS = 100_000
+REPEAT = 100
+
+
+def main():
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        rows = run()
+    finally:
+        teardown()
+    print_table(rows, ["case", "mode", "median_ms", "p95_ms"])
+
+
+def stage_call():
+    from utils.metrics import stage
+
+    def enter_and_leave():
+        for _ in range(CALLS):
+            with stage("bench"):
+                pass
+
+    timing = timeit(enter_and_leave, 5)
+    return {key: round(value / CALLS * 1000, 3) for key, value in timing.items()}
+
+
+def run():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from clients.models import Client
+
+    client = Client.objects.create(full_name="Bench", email="bench@example.com")
+    api = APIClient()
+    images = [make_image("JPEG", (1600, 1200)) for _ in range(2)]
+
+    def post():
+        data = {
+            "client": client.id,
+            "image_frontside": SimpleUploadedFile("front.jpg", images[0]),
+            "image_backside": SimpleUploadedFile("back.jpg", images[1]),
+        }
+        assert api.post("/transaction/", data, format="multipart").status_code == 201
+
+    rows = []
+    for mode, enabled in (("disabled", False), ("enabled", True)):
+        with override_settings(METRICS={"ENABLED": enabled}):
+            # stage_call reports microseconds per call in the *_ms columns.
+            rows.append({"case": "stage_us", "mode": mode, **stage_call()})
+            rows.append({"case": "post", "mode": mode, **timeit(post, REPEAT)})
+    with override_settings(METRICS={"ENABLED": True}):
+        rows.append({"case": "scrape", "mode": "enabled", **timeit(lambda: api.get("/metrics"), REPEAT)})
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Response cache of GET /transaction/{id}/ and GET /client/{id}/.
+
+For each endpoint, times a retrieve with the cache disabled (``off``), a
+retrieve served from the cache (``hit``) and a revalidation with the ETag of
+the previous response (``not_modified``, a 304 without body). Uses the test
+database of ``DJANGO_SETTINGS_MODULE`` and the "responses" cache of the
+settings, so set RESPONSE_CACHE_REDIS_URL to measure Redis instead of local
+memory. Usage::
+
+    python app/benchmarks/bench_response_cache.py
+"""
+from common import print_table, setup_django, setup_test_database, timeit
+
+REPEAT = 500
+
+
+def main():
+    setup_django()
+    teardown = setup_test_database()
+    try:
+        rows = run()
+    finally:
+        teardown()
+    print_table(rows, ["endpoint", "mode", "median_ms", "p95_ms"])
+
+
+def run():
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+    from clients.models import Client
+    from transactions.models import Transaction
+
+    client = Client.objects.create(full_name="Bench", email="bench@example.com")
+    transaction = Transaction.objects.create(client=client)
+    api = APIClient()
+    rows = []
+    for endpoint, url in (
+        ("transaction", f"/transaction/{transaction.id}/"),
+        ("client", f"/client/{client.id}/"),
+    ):
+        with override_settings(RESPONSE_CACHE={"ENABLED": False}):
+            rows.append({"endpoint": endpoint, "mode": "off", **timeit(lambda: api.get(url), REPEAT)})
+        etag = api.get(url)["ETag"]
+
+        def hit():
+            assert api.get(url).status_code == 200
+
+        def not_modified():
+            assert api.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        rows.append({"endpoint": endpoint, "mode": "hit", **timeit(hit, REPEAT)})
+        rows.append({"endpoint": endpoint, "mode": "not_modified", **timeit(not_modified, REPEAT)})
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Benchmarks are plain scripts, run them from the repository root::
+
+    python app/benchmarks/bench_image_probe.py
+
+Scripts that need the database honour ``DJANGO_SETTINGS_MODULE`` (defaults to
+``core.settings``).
+"""
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """
+    Put the project on ``sys.path`` and configure Django.
+    """
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+
+
+def setup_test_database():
+    """
+    Create the Django test databases, as the test runner does.
+
+    Returns:
+        callable: Tears the databases down again.
+    """
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+
+    def teardown():
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+    return teardown
+
+
+def make_image(image_format, size, noise=True):
+    """
+    Build an encoded test image.
+
+    Args:
+        image_format (str): The PIL format name, e.g. "JPEG".
+        size (tuple): The ``(width, height)`` of the image.
+        noise (bool): Fill with gaussian noise so the encoded size is realistic.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    from PIL import Image
+
+    if noise:
+        image = Image.effect_noise(size, 48).convert("RGB")
+    else:
+        image = Image.new("RGB", size, "white")
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def timeit(func, repeat=20):
+    """
+    Time a callable.
+
+    Args:
+        func (callable): The callable to time, called without arguments.
+        repeat (int): The number of timed calls.
+
+    Returns:
+        dict: The median and p95 latency in milliseconds.
+    """
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def peak_rss_mb():
+    """
+    Returns:
+        float: The peak resident set size of this process in megabytes.
+    """
+    # ru_maxrss survives fork + exec on Linux and would report the parent's
+    # peak, VmHWM belongs to the current address space only.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_isolated(script, *args):
+    """
+    Run a benchmark scenario in a fresh interpreter so its peak RSS is its own.
+
+    The child is expected to print a single JSON object on its last line.
+
+    Args:
+        script (str): The path of the benchmark script.
+        *args (str): Command line arguments selecting the scenario.
+
+    Returns:
+        dict: The decoded JSON result of the child.
+    """
+    output = subprocess.run(
+        [sys.executable, script, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(rows, columns):
+    """
+    Print benchmark results as an aligned text table.
+
+    Args:
+        rows (list): A list of dicts.
+        columns (list): The keys to print, in order.
+    """
+    widths = [max(len(str(c)), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
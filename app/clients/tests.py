@@ -1,11 +1,76 @@
-from rest_framework.test import APITestCase
+import base64
+import json
+from unittest import mock
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.backends import TokenBackend
 from rest_framework_simplejwt.tokens import RefreshToken
+from utils.authentication import reset_token_cache
+from utils.decorators import jwt_required
+from .viewsets import ClientListCreateView
 
 class ClienteTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.refresh_token = RefreshToken.for_user(self.user)
         self.access_token = str(self.refresh_token.access_token)
-        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
\ No newline at end of file
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+
+class CachedJWTVerificationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.access_token = str(RefreshToken.for_user(self.user).access_token)
+        reset_token_cache('SIMPLE_JWT')
+
+    def test_token_is_verified_once(self):
+        @api_view(['GET'])
+        @jwt_required
+        def protected(request):
+            return Response({'ok': True})
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        with mock.patch.object(TokenBackend, 'decode', autospec=True, side_effect=TokenBackend.decode) as decode:
+            self.assertEqual(self.client.get('/clients/').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/clients/').status_code, status.HTTP_200_OK)
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+            self.assertEqual(protected(request).status_code, status.HTTP_200_OK)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_forged_payload_with_cached_signature_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.assertEqual(self.client.get('/clients/').status_code, status.HTTP_200_OK)
+        header, _, signature = self.access_token.split('.')
+        payload = base64.urlsafe_b64encode(json.dumps({'token_type': 'access', 'user_id': 999, 'exp': 4102444800, 'jti': 'x'}).encode()).decode().rstrip('=')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {header}.{payload}.{signature}')
+        self.assertEqual(self.client.get('/clients/').status_code, status.HTTP_401_UNAUTHORIZED)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {header}.{payload}.{signature}')
+        self.assertEqual(jwt_required(lambda request: Response())(request).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticationModeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        reset_token_cache('JWT_USER_CACHE')
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        return sum('auth_user' in query['sql'] for query in context.captured_queries)
+
+    def test_token_mode_skips_user_lookup(self):
+        self.assertEqual(self.user_queries('/transactions/'), 0)
+        self.assertEqual(self.user_queries('/clients/'), 1)
+
+    def test_cached_user_mode_invalidated_on_change(self):
+        with mock.patch.object(ClientListCreateView, 'authentication_mode', 'cached_user'):
+            self.assertEqual(self.user_queries('/clients/'), 1)
+            self.assertEqual(self.user_queries('/clients/'), 0)
+            self.user.is_active = False
+            self.user.save()
+            self.assertEqual(self.client.get('/clients/').status_code, status.HTTP_401_UNAUTHORIZED)
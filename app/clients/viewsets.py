@@ -1,12 +1,13 @@
 from rest_framework import mixins
 from .models import Client
 from .serializers import ClientSerializer, ClientCreateSerializer
-from utils.viewsets import BaseViewSet
+from utils.response_cache import CachedRetrieveMixin
+from utils.viewsets import BaseViewSet, ReadPlanListMixin
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 
 class ClientListCreateView(
-    mixins.ListModelMixin, BaseViewSet
+    ReadPlanListMixin, mixins.ListModelMixin, BaseViewSet
 ):
     """
     View for listing and creating clients.
@@ -18,6 +19,7 @@ class ClientListCreateView(
 
 
 class ClientDetailView(
+    CachedRetrieveMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -26,6 +28,7 @@ class ClientDetailView(
 ):
     """
     View for retrieving, updating, and deleting a single client.
+    Retrieves are served from the response cache.
     """
 
     queryset = Client.objects.all()
@@ -58,7 +58,9 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    "utils.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "utils.middleware.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -90,23 +92,99 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# With DB_POOL the connections of each process come from a pool of at most
+# DB_POOL_MAX_SIZE connections (utils.pooled_postgresql) and go back to it at the end
+# of every request; keep it above the threads per worker (GUNICORN_THREADS or
+# ASGI_VIEW_THREADS + 1). Without it, DB_CONN_MAX_AGE keeps one connection per thread
+# open. Reused connections are health checked before use either way.
+DB_POOL = os.getenv("DB_POOL", "true").lower() == "true"
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "utils.pooled_postgresql" if DB_POOL else "django.db.backends.postgresql",
         "NAME": os.getenv("POSTGRES_DB"),
         "USER": os.getenv("POSTGRES_USER"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
-        "HOST": "db",
-        "PORT": "5432",
+        "HOST": os.getenv("POSTGRES_HOST", "db"),
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0 if DB_POOL else 60)),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true",
+        "POOL": {
+            "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            "TIMEOUT": int(os.getenv("DB_POOL_TIMEOUT", 5)),
+            "CHECK_AFTER": 30,
+            "MAX_IDLE": 300,
+            "MAX_LIFETIME": 3600,
+        },
     }
 }
 
+# Streaming replicas of the primary, comma separated. GET/HEAD/OPTIONS requests read
+# from one of them (utils.db_router); writes, and every read of a write request, stay
+# on the primary. After a write the client reads from the primary for PIN_SECONDS,
+# through the db_pinned_until cookie or, without cookies, by echoing the
+# DB-Pinned-Until response header. Locally, any database with the same tables works.
+READ_REPLICAS = {
+    "ALIASES": [],
+    "PIN_SECONDS": int(os.getenv("READ_REPLICA_PIN_SECONDS", 5)),
+}
+for index, host in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")), 1):
+    DATABASES[f"replica_{index}"] = {**DATABASES["default"], "HOST": host.strip(), "TEST": {"MIRROR": "default"}}
+    READ_REPLICAS["ALIASES"].append(f"replica_{index}")
+
+DATABASE_ROUTERS = ["utils.db_router.ReplicaRouter"]
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'utils.authentication.CachedJWTAuthentication',
     ],
 }
 
+# Verified JWTs are cached per process until they expire, see utils.authentication.
+JWT_VERIFICATION_CACHE = {
+    "MAX_ENTRIES": 10000,
+}
+
+# Users authenticated by viewsets with authentication_mode = "cached_user" are kept
+# for TTL seconds per process, or until the user is saved or deleted in that process.
+JWT_USER_CACHE = {
+    "MAX_ENTRIES": 10000,
+    "TTL": 300,
+}
+
+# Serialized representations of single clients and transactions, see utils.response_cache.
+# Entries are invalidated on save/delete through the "responses" cache, which must be
+# shared by every worker: set RESPONSE_CACHE_REDIS_URL (redis package) outside of a
+# single-process development server, local memory is per process.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+if os.getenv("RESPONSE_CACHE_REDIS_URL"):
+    CACHES["responses"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("RESPONSE_CACHE_REDIS_URL"),
+    }
+
+RESPONSE_CACHE = {
+    "ENABLED": os.getenv("RESPONSE_CACHE", "true").lower() == "true",
+    "ALIAS": "responses",
+    "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300)),
+}
+
+# GET /transaction/ and /client/ render their pages from .values() rows with a
+# precompiled field plan and orjson (if installed), see utils.read_plans.
+READ_PLANS = {
+    "ENABLED": os.getenv("READ_PLANS", "true").lower() == "true",
+}
+
 # Configuración específica de djangorestframework-simplejwt
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -124,8 +202,213 @@ SIMPLE_JWT = {
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Shared pool validating the front and back images of a transaction concurrently.
+# MODE is "thread", "process" or "sync"; at most MAX_WORKERS + MAX_QUEUE checks are
+# in flight, callers waiting longer than QUEUE_TIMEOUT seconds validate inline.
+VALIDATION_EXECUTOR = {
+    "MODE": os.getenv("VALIDATION_EXECUTOR_MODE", "thread"),
+    "MAX_WORKERS": int(os.getenv("VALIDATION_EXECUTOR_WORKERS", 2)),
+    "MAX_QUEUE": int(os.getenv("VALIDATION_EXECUTOR_QUEUE", 32)),
+    "QUEUE_TIMEOUT": 5,
+}
+
+# Background validation for POST /transaction/ (see transactions.tasks). When ENABLED,
+# or with ?async=true, the images are stored and 202 is returned right away. With
+# IN_PROCESS the web process runs WORKERS threads, started by the first asynchronous
+# upload or, with AUTOSTART (set by docker/gunicorn.conf.py), when the process starts;
+# otherwise run `manage.py run_validation_workers`. Transactions whose validation keeps
+# failing (e.g. storage errors) are retried every CLAIM_TIMEOUT seconds, then recorded
+# as failed with error code 12 after MAX_ATTEMPTS claims.
+ASYNC_VALIDATION = {
+    "ENABLED": os.getenv("ASYNC_VALIDATION", "false").lower() == "true",
+    "WORKERS": int(os.getenv("ASYNC_VALIDATION_WORKERS", 2)),
+    "IN_PROCESS": os.getenv("ASYNC_VALIDATION_IN_PROCESS", "true").lower() == "true",
+    "AUTOSTART": os.getenv("ASYNC_VALIDATION_AUTOSTART", "false").lower() == "true",
+    "BATCH_SIZE": 10,
+    "POLL_INTERVAL": 1,
+    "CLAIM_TIMEOUT": 300,
+    "MAX_ATTEMPTS": int(os.getenv("ASYNC_VALIDATION_MAX_ATTEMPTS", 5)),
+}
+
+# Production serving profile (compose-prod.yaml, ASGI workers): with ENABLED,
+# POST /transaction/ and /transaction/{id}/ are served by transactions.async_views,
+# which run their blocking work on a pool of THREADS threads per worker instead of
+# Django's single sync thread. Leave it off under WSGI.
+ASGI_VIEWS = {
+    "ENABLED": os.getenv("ASGI_VIEWS", "false").lower() == "true",
+    "THREADS": int(os.getenv("ASGI_VIEW_THREADS", 8)),
+}
+
+if ASGI_VIEWS["ENABLED"]:
+    # The same middleware, run on the event loop instead of the sync thread.
+    MIDDLEWARE = [
+        "utils.metrics.MetricsMiddleware",
+        "utils.middleware.InlineSecurityMiddleware",
+        "utils.middleware.ReplicaRoutingMiddleware",
+        "utils.middleware.InlineSessionMiddleware",
+        "utils.middleware.InlineCommonMiddleware",
+        "utils.middleware.InlineCsrfViewMiddleware",
+        "utils.middleware.InlineAuthenticationMiddleware",
+        "utils.middleware.InlineMessageMiddleware",
+        "utils.middleware.InlineXFrameOptionsMiddleware",
+    ]
+
 MEDIA_URL = '/media/'
 
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    # Content-addressed: resubmitted images point at the already stored file.
+    # Files are sharded by hash prefix (transaction_images/ab/cd/<sha256>.jpg),
+    # move older files with `manage.py rehome_transaction_images`.
+    "transaction_images": {
+        "BACKEND": "utils.storage.ContentAddressedStorage",
+        "OPTIONS": {
+            "fsync": os.getenv("TRANSACTION_IMAGES_FSYNC", "batch"),
+            "fallback": ["transaction_images_cold"],
+        },
+    },
+    # Originals moved out of the hot storage by `manage.py archive_transaction_images`.
+    "transaction_images_cold": {
+        "BACKEND": "utils.storage.ContentAddressedStorage",
+        "OPTIONS": {
+            "location": os.getenv("TRANSACTION_IMAGES_COLD_ROOT", os.path.join(BASE_DIR, 'cold')),
+            "fsync": "always",
+        },
+    },
+}
+
+# Store the transaction images in an S3 compatible bucket instead. Set
+# TRANSACTION_IMAGES_FALLBACK to "legacy_transaction_images" while re-homing the
+# files that are still on disk.
+if os.getenv("TRANSACTION_IMAGES_S3_BUCKET"):
+    STORAGES["legacy_transaction_images"] = STORAGES["transaction_images"]
+    STORAGES["transaction_images"] = {
+        "BACKEND": "utils.storage.S3ContentAddressedStorage",
+        "OPTIONS": {
+            "bucket_name": os.getenv("TRANSACTION_IMAGES_S3_BUCKET"),
+            "endpoint_url": os.getenv("TRANSACTION_IMAGES_S3_ENDPOINT_URL"),
+            "prefix": os.getenv("TRANSACTION_IMAGES_S3_PREFIX", ""),
+            "fallback": [
+                *filter(None, [os.getenv("TRANSACTION_IMAGES_FALLBACK")]),
+                "transaction_images_cold",
+            ],
+        },
+    }
+
+# After validation, transactions get a downscaled FORMAT ("WEBP" or "JPEG") copy of
+# their images for audits. `manage.py archive_transaction_images` (run periodically)
+# creates the missing copies and moves the originals of transactions older than
+# COLD_AFTER_DAYS to the transaction_images_cold storage.
+TRANSACTION_ARCHIVE = {
+    "ENABLED": os.getenv("TRANSACTION_ARCHIVE", "true").lower() == "true",
+    "FORMAT": os.getenv("TRANSACTION_ARCHIVE_FORMAT", "WEBP"),
+    "QUALITY": int(os.getenv("TRANSACTION_ARCHIVE_QUALITY", 60)),
+    "MAX_RESOLUTION": (1600, 1600),
+    "COLD_AFTER_DAYS": int(os.getenv("TRANSACTION_ARCHIVE_COLD_AFTER_DAYS", 30)),
+}
+
+# GET /transaction/{id}/thumbnail/{side}/{size}/ renders JPEG thumbnails of SIZES
+# (longest side in pixels) on first request and caches them in ROOT, deleting the
+# least recently used ones above MAX_BYTES.
+THUMBNAILS = {
+    "ROOT": os.getenv("THUMBNAILS_ROOT", os.path.join(BASE_DIR, 'thumbnails')),
+    "MAX_BYTES": int(os.getenv("THUMBNAILS_MAX_MB", 512)) * 1024 * 1024,
+    "SIZES": {"small": 160, "medium": 480, "large": 1024},
+    "QUALITY": 80,
+}
+
+# Sharpness (Laplacian variance), exposure (mean luminance) and glare (share of
+# clipped highlights) checks run on a reduced-scale decode once the images pass the
+# header and Pillow checks, see utils.processing_images.check_image_quality. Error
+# codes: 7 blurry, 8 glare, 9 too dark, 10 overexposed. Off by default: requires numpy,
+# from the "production" dependency group (`poetry install --with production`), which
+# only the production image (docker/Dockerfile) installs.
+# Adds about 10-35 ms per upload side (mostly the JPEG decode, 12 MP photos cost the most).
+IMAGE_QUALITY = {
+    "ENABLED": os.getenv("IMAGE_QUALITY_CHECKS", "false").lower() == "true",
+    "WORKING_SIZE": 512,
+    "MIN_SHARPNESS": float(os.getenv("IMAGE_QUALITY_MIN_SHARPNESS", 100)),
+    "MIN_BRIGHTNESS": float(os.getenv("IMAGE_QUALITY_MIN_BRIGHTNESS", 40)),
+    "MAX_BRIGHTNESS": float(os.getenv("IMAGE_QUALITY_MAX_BRIGHTNESS", 220)),
+    "GLARE_LEVEL": 250,
+    "MAX_GLARE_RATIO": float(os.getenv("IMAGE_QUALITY_MAX_GLARE_RATIO", 0.05)),
+}
+
+# Valid images get a 64-bit perceptual hash (dHash) stored on the transaction, looked
+# up in an in-memory index (transactions.duplicates) by GET /transaction/{id}/matches/.
+# SEEN_BEFORE_CHECK rejects documents whose both sides are within MAX_DISTANCE bits of
+# a transaction of another client (error code 11). Each process keeps the index up to
+# date on a background thread, every REFRESH_INTERVAL seconds, started with the process
+# with AUTOSTART (set by docker/gunicorn.conf.py) or else by the first lookup; requests
+# use the current index and never build it. The thread loads the INDEX_PATH snapshot
+# when it changes; keep it fresh with `manage.py update_image_hash_index` (e.g. from
+# cron) so new processes do not read every transaction.
+IMAGE_HASHES = {
+    "ENABLED": os.getenv("IMAGE_HASHES", "true").lower() == "true",
+    "SEEN_BEFORE_CHECK": os.getenv("IMAGE_SEEN_BEFORE_CHECK", "false").lower() == "true",
+    "MAX_DISTANCE": int(os.getenv("IMAGE_HASHES_MAX_DISTANCE", 4)),
+    "INDEX_PATH": os.getenv("IMAGE_HASHES_INDEX_PATH", os.path.join(BASE_DIR, "image_hash_index.bin")),
+    "REFRESH_INTERVAL": 5,
+    "SETTLE_SECONDS": 300,
+    "AUTOSTART": os.getenv("IMAGE_HASHES_AUTOSTART", "false").lower() == "true",
+}
+
+# Every decode of image pixels reserves its estimated memory (decoded + converted
+# pixels) from a budget; when it is used up, decodes wait up to TIMEOUT seconds, then
+# the request gets a 503 with Retry-After (async validation retries the transaction).
+# Images over MAX_PIXELS are rejected before decoding. The budget is kept per process:
+# IMAGE_DECODE_BUDGET_MB is the share of one web worker, split between the worker and
+# the validation processes it starts in "process" mode. A host uses up to
+# WEB_CONCURRENCY times IMAGE_DECODE_BUDGET_MB.
+DECODE_PROCESSES = 1 + (VALIDATION_EXECUTOR["MAX_WORKERS"] if VALIDATION_EXECUTOR["MODE"] == "process" else 0)
+IMAGE_DECODE = {
+    "MAX_BYTES": int(os.getenv("IMAGE_DECODE_BUDGET_MB", 256)) * 1024 * 1024 // DECODE_PROCESSES,
+    "TIMEOUT": float(os.getenv("IMAGE_DECODE_TIMEOUT", 10)),
+    "MAX_PIXELS": int(os.getenv("IMAGE_DECODE_MAX_PIXELS", 30_000_000)),
+}
+
+# With ENABLED, GET /metrics serves in the Prometheus text format the latency of the
+# stages of POST /transaction/ (body parsing, base64 decoding, image checks, failure
+# inserts, storage), the latency, query count and query time of each route, and the
+# decode budget. Metrics are kept per process: scrape every worker. With a TOKEN,
+# scrapes send "Authorization: Bearer <token>". Disabled, the timers are no-ops.
+METRICS = {
+    "ENABLED": os.getenv("METRICS", "false").lower() == "true",
+    "TOKEN": os.getenv("METRICS_TOKEN", ""),
+}
+
+# In-process LRU cache of validation verdicts keyed by image content hash, so
+# retried submissions of the same images skip probing and decoding.
+VALIDATION_CACHE = {
+    "MAX_ENTRIES": 4096,
+    "TTL": 3600,
+}
+
+# POST /transactions/bulk/: items are validated WORKERS at a time and inserted with
+# bulk_create in chunks of CHUNK_SIZE.
+BULK_TRANSACTIONS = {
+    "CHUNK_SIZE": int(os.getenv("BULK_TRANSACTIONS_CHUNK_SIZE", 500)),
+    "WORKERS": int(os.getenv("BULK_TRANSACTIONS_WORKERS", 4)),
+    "MAX_ITEMS": 10000,
+}
+
+# GET /transactions/stats/ reads the TransactionDailyStats rollup when USE_ROLLUP is set.
+# Refresh it periodically (e.g. from cron) with `manage.py refresh_transaction_stats`,
+# which recomputes the last REFRESH_DAYS days.
+TRANSACTION_STATS = {
+    "USE_ROLLUP": os.getenv("TRANSACTION_STATS_USE_ROLLUP", "false").lower() == "true",
+    "REFRESH_DAYS": 2,
+}
+
+# How long POST /transaction/ responses are replayed for a repeated Idempotency-Key.
+# Expired keys are removed with `manage.py purge_idempotency_keys`.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
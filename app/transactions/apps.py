@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
+
+    def ready(self):
+        from .duplicates import get_duplicate_settings, start_hash_index_updater
+        from .tasks import get_async_settings, get_worker_pool
+
+        config = get_async_settings()
+        if config["IN_PROCESS"] and config["AUTOSTART"]:
+            # Drain the transactions left pending or processing by the previous
+            # run without waiting for the next asynchronous upload.
+            get_worker_pool()
+        config = get_duplicate_settings()
+        if config["ENABLED"] and config["AUTOSTART"]:
+            # Build the image hash index before the first request needs it.
+            start_hash_index_updater()
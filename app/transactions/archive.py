@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db.models import Q
+from django.utils import timezone
+from utils.processing_images import encode_archive_image
+from utils.response_cache import invalidate_cached_responses
+from utils.storage import get_transaction_image_storage
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+SIDES = ("frontside", "backside")
+
+
+def get_archive_settings():
+    """
+    Get the ``TRANSACTION_ARCHIVE`` settings with their defaults.
+
+    Returns:
+        dict: The archive settings.
+    """
+    return {
+        "ENABLED": True,
+        "FORMAT": "WEBP",
+        "QUALITY": 60,
+        "MAX_RESOLUTION": (1600, 1600),
+        "COLD_AFTER_DAYS": 30,
+        "COLD_STORAGE": "transaction_images_cold",
+        **getattr(settings, "TRANSACTION_ARCHIVE", {}),
+    }
+
+
+def archive_transaction(transaction):
+    """
+    Store the archival copies of the images of a validated transaction.
+
+    Args:
+        transaction (Transaction): The transaction.
+
+    Returns:
+        bool: Whether both copies were stored. Images Pillow cannot read are
+        logged and left without a copy.
+    """
+    config = get_archive_settings()
+    for side in SIDES:
+        original = getattr(transaction, f"image_{side}")
+        archive = getattr(transaction, f"archive_{side}")
+        if archive:
+            continue
+        try:
+            with original.open("rb"):
+                content = encode_archive_image(
+                    original, config["FORMAT"], config["QUALITY"], config["MAX_RESOLUTION"]
+                )
+        except Exception:
+            logger.warning("Could not archive the %s of transaction %s", side, transaction.pk, exc_info=True)
+            return False
+        archive.save(content.name, content, save=False)
+    Transaction.objects.filter(pk=transaction.pk).update(
+        archive_frontside=transaction.archive_frontside.name,
+        archive_backside=transaction.archive_backside.name,
+    )
+    invalidate_cached_responses(Transaction, [transaction.pk])
+    return True
+
+
+def archive_pending_transactions(batch_size=100):
+    """
+    Store the missing archival copies of the finished, valid transactions.
+
+    Failed transactions are skipped: rejected or corrupt uploads have no
+    stored images to archive.
+
+    Args:
+        batch_size (int): The number of transactions read per query.
+
+    Returns:
+        int: The number of transactions archived.
+    """
+    archived, last_pk = 0, 0
+    pending = (
+        Transaction.objects.filter(status=Transaction.Status.DONE, result=True)
+        .filter(Q(archive_frontside="") | Q(archive_backside=""))
+        .exclude(Q(image_frontside="") | Q(image_backside=""))
+    )
+    while batch := list(pending.filter(pk__gt=last_pk).order_by("pk")[:batch_size]):
+        last_pk = batch[-1].pk
+        archived += sum(archive_transaction(transaction) for transaction in batch)
+    return archived
+
+
+def move_originals_to_cold_storage(days=None, batch_size=100):
+    """
+    Move the original images of archived transactions older than ``days`` days
+    to the cold storage.
+
+    A file is removed from the hot storage once no transaction newer than the
+    cutoff refers to it (identical uploads share one file). Reads keep working
+    through the ``fallback`` of the transaction image storage.
+
+    Args:
+        days (int): The age after which originals move, defaults to ``COLD_AFTER_DAYS``.
+        batch_size (int): The number of transactions read per query.
+
+    Returns:
+        int: The number of transactions whose originals were moved.
+    """
+    config = get_archive_settings()
+    cutoff = timezone.now() - timedelta(days=config["COLD_AFTER_DAYS"] if days is None else days)
+    hot = get_transaction_image_storage()
+    cold = storages[config["COLD_STORAGE"]]
+    recent = Transaction.objects.filter(creation_date__gte=cutoff)
+    candidates = Transaction.objects.filter(
+        creation_date__lt=cutoff, originals_archived_at__isnull=True
+    ).exclude(Q(archive_frontside="") | Q(archive_backside=""))
+    moved, last_pk = 0, 0
+    while batch := list(
+        candidates.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "image_frontside", "image_backside")[:batch_size]
+    ):
+        last_pk = batch[-1][0]
+        skipped = set()
+        for name in {name for row in batch for name in row[1:]}:
+            if not hot.stored(name):
+                continue
+            if not hot.is_content_name(name):
+                # A legacy name, re-home it first.
+                skipped.add(name)
+                continue
+            if not cold.exists(name):
+                with hot.open(name, "rb") as original:
+                    cold.save(name, original)
+            if not recent.filter(Q(image_frontside=name) | Q(image_backside=name)).exists():
+                hot.delete(name)
+        pks = [row[0] for row in batch if not skipped.intersection(row[1:])]
+        moved += Transaction.objects.filter(pk__in=pks).update(originals_archived_at=timezone.now())
+        invalidate_cached_responses(Transaction, pks)
+    return moved
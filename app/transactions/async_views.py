@@ -0,0 +1,108 @@
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from utils.authentication import AUTHENTICATION_MODES
+from utils.executors import run_in_view_thread
+from utils.response_cache import cached_representation, conditional_json_response
+from .models import Transaction
+from .serializers import TransactionSerializer
+from .viewsets import TransactionDetailView
+
+
+class TransactionAsyncView(View):
+    """
+    Async-capable POST /transaction/ and GET/PUT/PATCH/DELETE /transaction/{id}/
+    for ASGI workers, routed instead of TransactionDetailView when
+    ``ASGI_VIEWS["ENABLED"]`` is set.
+
+    Nothing blocking runs on the event loop: retrieve authenticates on the loop
+    and reads the transaction from the response cache, or loads and serializes
+    it, in ``run_in_view_thread``; the
+    other methods run TransactionDetailView there, so uploads are parsed,
+    validated (the PIL work on the validation executor) and written to the
+    storage off the loop, with the same responses, idempotency and async
+    validation mode as under WSGI.
+    """
+
+    create_view = staticmethod(TransactionDetailView.as_view({"post": "create"}))
+    detail_view = staticmethod(
+        TransactionDetailView.as_view({"put": "update", "patch": "partial_update", "delete": "destroy"})
+    )
+    renderer = JSONRenderer()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Authentication is JWT only, as in the DRF views.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def get(self, request, pk=None):
+        """
+        Retrieves a transaction, with the body and ETag TransactionDetailView
+        renders as JSON.
+        """
+        if pk is None:
+            return await self.http_method_not_allowed(request)
+        authenticator = AUTHENTICATION_MODES[TransactionDetailView.authentication_mode]()
+        try:
+            authenticator.authenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return self.error_response(exc, {"WWW-Authenticate": authenticator.authenticate_header(request)})
+        cached = await run_in_view_thread(self.serialize_transaction, request, pk)
+        if cached is None:
+            return self.error_response(exceptions.NotFound())
+        return conditional_json_response(request, *cached, response_class=self.json_response)
+
+    async def post(self, request, pk=None):
+        if pk is not None:
+            return await self.http_method_not_allowed(request)
+        return await run_in_view_thread(self.call_sync_view, self.create_view, request)
+
+    async def put(self, request, pk=None):
+        return await run_in_view_thread(self.call_sync_view, self.detail_view, request, pk=pk)
+
+    async def patch(self, request, pk=None):
+        return await run_in_view_thread(self.call_sync_view, self.detail_view, request, pk=pk)
+
+    async def delete(self, request, pk=None):
+        return await run_in_view_thread(self.call_sync_view, self.detail_view, request, pk=pk)
+
+    def serialize_transaction(self, request, pk):
+        """
+        Returns the serialized transaction and its ETag through the response
+        cache, or None if there is no such transaction.
+        """
+
+        def load():
+            transaction = Transaction.objects.select_related("client").get(pk=pk)
+            return TransactionSerializer(transaction, context={"request": request}).data
+
+        try:
+            return cached_representation(request, Transaction, pk, load, TransactionDetailView.cache_embeds)
+        except (Transaction.DoesNotExist, ValueError, TypeError):
+            return None
+
+    def call_sync_view(self, view, request, **kwargs):
+        """
+        Calls a DRF view and returns its rendered response as a plain HttpResponse,
+        so Django does not go back to its sync thread to render it.
+        """
+        response = view(request, **kwargs)
+        if isinstance(response, SimpleTemplateResponse):
+            response.render()
+            response = HttpResponse(
+                response.content, status=response.status_code, headers=dict(response.items())
+            )
+        return response
+
+    def json_response(self, data, status=200, headers=None):
+        return HttpResponse(
+            self.renderer.render(data), status=status, headers=headers, content_type="application/json"
+        )
+
+    def error_response(self, exc, headers=None):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return self.json_response(data, status=exc.status_code, headers=headers)
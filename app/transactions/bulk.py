@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+from clients.models import Client
+from .duplicates import get_duplicate_settings
+from .models import Transaction
+from .serializers import TransactionCreateSerializer
+from utils.metrics import stage
+
+
+def get_bulk_settings():
+    """
+    Get the ``BULK_TRANSACTIONS`` settings with their defaults.
+
+    Returns:
+        dict: The bulk submission settings.
+    """
+    return {
+        "CHUNK_SIZE": 500,
+        "WORKERS": 4,
+        "MAX_ITEMS": 10000,
+        **getattr(settings, "BULK_TRANSACTIONS", {}),
+    }
+
+
+class PrefetchedClientField(serializers.PrimaryKeyRelatedField):
+    """
+    Client field resolving primary keys from the ``clients`` dict in the context,
+    so validating a chunk does not query the clients one by one.
+    """
+
+    def to_internal_value(self, data):
+        try:
+            return self.context["clients"][int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class BulkTransactionSerializer(TransactionCreateSerializer):
+    """
+    TransactionCreateSerializer for one item of a bulk submission.
+
+    Failure rows are collected in the ``failure_rows`` context list instead of
+    being inserted, so the whole chunk is written with ``bulk_create``. Items
+    are validated on a thread pool without touching the database; the
+    seen-before lookup is deferred to ``_check_seen_before``.
+    """
+
+    client = PrefetchedClientField(queryset=Client.objects.all())
+
+
+def _client_id(item):
+    try:
+        return int(item.get("client"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_valid(serializer):
+    try:
+        return serializer.is_valid()
+    finally:
+        # The pool threads end with the request, release anything they opened.
+        connections.close_all()
+
+
+def _check_seen_before(item_serializers, valid):
+    # On the request thread, inside its transaction.
+    config = get_duplicate_settings()
+    if not (config["ENABLED"] and config["SEEN_BEFORE_CHECK"]):
+        return valid
+    checked = []
+    for serializer, is_valid in zip(item_serializers, valid):
+        if is_valid:
+            try:
+                serializer.validate_seen_before(serializer.validated_data)
+            except serializers.ValidationError:
+                is_valid = False
+        checked.append(is_valid)
+    return checked
+
+
+def _validate_chunk(items, pool):
+    clients = Client.objects.in_bulk({_client_id(item) for item in items} - {None})
+    item_serializers = [
+        BulkTransactionSerializer(
+            data=item, context={"clients": clients, "failure_rows": [], "defer_seen_before": True}
+        )
+        for item in items
+    ]
+    valid = list(pool.map(_is_valid, item_serializers))
+    return item_serializers, _check_seen_before(item_serializers, valid)
+
+
+def create_transactions_in_bulk(items, chunk_size=None, workers=None, max_items=None):
+    """
+    Validate and store transactions in chunks.
+
+    Each chunk is validated concurrently on a thread pool (the image checks of
+    every item still go through the shared validation executor) and then
+    written, failure rows included, with a single ``bulk_create``.
+
+    Args:
+        items (iterable): Dicts with ``client``, ``image_frontside`` and ``image_backside``.
+        chunk_size (int): The number of items validated and inserted together.
+        workers (int): The number of items validated at the same time.
+        max_items (int): The maximum number of items accepted.
+
+    Raises:
+        serializers.ValidationError: If there are more than ``max_items`` items.
+
+    Returns:
+        list: One dict per item, in order, with ``index``, ``id``, ``result``,
+        ``error_code`` and ``details``. Items rejected before a transaction
+        could be recorded (e.g. unknown client) have ``id`` None and ``errors``.
+    """
+    config = get_bulk_settings()
+    chunk_size = chunk_size or config["CHUNK_SIZE"]
+    max_items = max_items or config["MAX_ITEMS"]
+    items = iter(items)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers or config["WORKERS"]) as pool:
+        while chunk := list(islice(items, chunk_size)):
+            if len(results) + len(chunk) > max_items:
+                raise serializers.ValidationError(f"A bulk submission accepts at most {max_items} items.")
+            item_serializers, valid = _validate_chunk(chunk, pool)
+            rows, row_items = [], []
+            for index, (serializer, is_valid) in enumerate(zip(item_serializers, valid), start=len(results)):
+                result = {"index": index, "id": None}
+                if is_valid:
+                    rows.append(Transaction(**serializer.validated_data))
+                elif serializer.context["failure_rows"]:
+                    rows.append(serializer.context["failure_rows"][0])
+                else:
+                    result["errors"] = serializer.errors
+                if not result.get("errors"):
+                    row_items.append(result)
+                results.append(result)
+            with stage("bulk_insert"):
+                Transaction.objects.bulk_create(rows, batch_size=chunk_size)
+            for result, row in zip(row_items, rows):
+                result.update(id=row.pk, result=row.result, error_code=row.error_code, details=row.details)
+    return results
@@ -0,0 +1,585 @@
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+SIDES = ("frontside", "backside")
+MASK64 = (1 << 64) - 1
+# The 64-bit hashes are indexed as four 16-bit chunks.
+CHUNKS = 4
+CHUNK_BITS = 16
+SNAPSHOT_HEADER = struct.Struct("<4sQQQQ")
+SNAPSHOT_MAGIC = b"DHI1"
+
+
+def get_duplicate_settings():
+    """
+    Get the ``IMAGE_HASHES`` settings with their defaults.
+
+    Returns:
+        dict: The perceptual hash settings.
+    """
+    return {
+        "ENABLED": True,
+        "SEEN_BEFORE_CHECK": False,
+        "MAX_DISTANCE": 4,
+        "INDEX_PATH": os.path.join(settings.BASE_DIR, "image_hash_index.bin"),
+        "REFRESH_INTERVAL": 5,
+        "SETTLE_SECONDS": 300,
+        "AUTOSTART": False,
+        **getattr(settings, "IMAGE_HASHES", {}),
+    }
+
+
+def hamming_distance(a, b):
+    """
+    Returns:
+        int: The number of bits in which two signed 64-bit hashes differ.
+    """
+    return ((a ^ b) & MASK64).bit_count()
+
+
+def _chunks(value):
+    return [(value >> (CHUNK_BITS * index)) & 0xFFFF for index in range(CHUNKS)]
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius):
+    # Every 16-bit mask with at most ``radius`` bits set, closest first.
+    return sorted((mask for mask in range(1 << CHUNK_BITS) if mask.bit_count() <= radius), key=int.bit_count)
+
+
+@lru_cache(maxsize=None)
+def _chunk_masks(max_distance):
+    # Hashes at most r = q * CHUNKS + a bits apart are at most q bits apart on
+    # one of the first a + 1 chunks or q - 1 bits apart on one of the others
+    # (otherwise they differ by at least r + 1 bits), so those are the chunk
+    # values to probe.
+    q, a = divmod(max_distance, CHUNKS)
+    return tuple(_flip_masks(q if index <= a else q - 1) for index in range(CHUNKS))
+
+
+class _Segment:
+    """
+    Immutable, compact part of a HashIndex.
+
+    Parallel arrays of the indexed transactions sorted by id and, per side and
+    chunk, the chunk values in order with the positions of their rows, looked
+    up with ``bisect``. About 80 bytes per transaction, written to and read
+    from snapshots as is.
+    """
+
+    def __init__(self, pks, client_ids, dhashes, present, keys, rows):
+        self.pks = pks
+        self.client_ids = client_ids
+        self.dhashes = dhashes
+        self.present = present
+        self.keys = keys
+        self.rows = rows
+
+    @classmethod
+    def build(cls, items):
+        """
+        Args:
+            items (iterable): ``(pk, client_id, dhash_frontside, dhash_backside)`` tuples.
+        """
+        items = sorted(items)
+        pks = array("q", (item[0] for item in items))
+        client_ids = array("q", (item[1] for item in items))
+        dhashes, keys, rows = {}, {}, {}
+        present = array("b", ((item[2] is not None) | (item[3] is not None) << 1 for item in items))
+        for bit, side in enumerate(SIDES):
+            dhashes[side] = array("q", (item[2 + bit] or 0 for item in items))
+            indexed = [position for position, flags in enumerate(present) if flags >> bit & 1]
+            keys[side], rows[side] = [], []
+            for shift in range(0, CHUNKS * CHUNK_BITS, CHUNK_BITS):
+                chunks = [value >> shift & 0xFFFF for value in dhashes[side]]
+                order = sorted(indexed, key=chunks.__getitem__)
+                keys[side].append(array("H", map(chunks.__getitem__, order)))
+                rows[side].append(array("I", order))
+        return cls(pks, client_ids, dhashes, present, keys, rows)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def get(self, pk):
+        """
+        Returns:
+            tuple: ``(client_id, dhash_frontside, dhash_backside)``, or None if not in the segment.
+        """
+        position = bisect_left(self.pks, pk)
+        if position == len(self.pks) or self.pks[position] != pk:
+            return None
+        return self._entry(position)
+
+    def _entry(self, position):
+        flags = self.present[position]
+        return (
+            self.client_ids[position],
+            self.dhashes["frontside"][position] if flags & 1 else None,
+            self.dhashes["backside"][position] if flags & 2 else None,
+        )
+
+    def items(self):
+        for position, pk in enumerate(self.pks):
+            yield (pk, *self._entry(position))
+
+    def candidates(self, side, chunks, masks):
+        """
+        Yield the positions of the rows sharing a chunk value of ``side`` with
+        ``chunks`` up to one of the ``masks`` of that chunk.
+        """
+        for keys, rows, chunk, chunk_masks in zip(self.keys[side], self.rows[side], chunks, masks):
+            for mask in chunk_masks:
+                value = chunk ^ mask
+                start = bisect_left(keys, value)
+                end = bisect_right(keys, value, start)
+                if start != end:
+                    yield from rows[start:end]
+
+    def write(self, stream):
+        for values in (self.pks, self.client_ids, self.dhashes["frontside"], self.dhashes["backside"], self.present):
+            values.tofile(stream)
+        for side in SIDES:
+            for keys, rows in zip(self.keys[side], self.rows[side]):
+                keys.tofile(stream)
+                rows.tofile(stream)
+
+    @classmethod
+    def read(cls, stream, count, side_counts):
+        def read_array(typecode, length):
+            values = array(typecode)
+            values.fromfile(stream, length)
+            return values
+
+        pks, client_ids, frontsides, backsides = (read_array("q", count) for _ in range(4))
+        present = read_array("b", count)
+        keys, rows = {}, {}
+        for side, side_count in zip(SIDES, side_counts):
+            keys[side], rows[side] = [], []
+            for _ in range(CHUNKS):
+                keys[side].append(read_array("H", side_count))
+                rows[side].append(read_array("I", side_count))
+        return cls(pks, client_ids, {"frontside": frontsides, "backside": backsides}, present, keys, rows)
+
+
+class HashIndex:
+    """
+    Multi-index hashing (MIH) of the dHashes of transactions.
+
+    Each hash is split into four 16-bit chunks, indexed per side. Two hashes
+    at most ``r`` bits apart have a chunk at most ``r // 4`` bits apart, so a
+    search only probes the chunk values that close to the query (one per
+    chunk below 4 bits, 17 below 8) and checks the full distance of the few
+    candidates.
+
+    Most transactions sit in a compact, immutable ``_Segment`` loaded from the
+    snapshot. Transactions added since (``refresh``, or saved by this process)
+    go to small dict tables, and discarded or changed ones are masked out of
+    the segment. ``save`` merges both into a new segment and writes it.
+
+    Attributes:
+        watermark (int): Every transaction up to this id is indexed for good.
+        snapshot_mtime (int): The modification time (ns) of the snapshot it was loaded from.
+    """
+
+    def __init__(self, segment=None, watermark=0):
+        self.segment = segment or _Segment.build([])
+        self.watermark = watermark
+        self.snapshot_mtime = None
+        self.entries = {}
+        self.tables = {side: [{} for _ in range(CHUNKS)] for side in SIDES}
+        self.removed = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.segment) - len(self.removed) + len(self.entries)
+
+    def add(self, pk, client_id, dhash_frontside, dhash_backside):
+        """
+        Index the hashes of a transaction, replacing any previous ones.
+        """
+        entry = (client_id, dhash_frontside, dhash_backside)
+        with self._lock:
+            if self.entries.get(pk) == entry:
+                return
+            if pk not in self.removed and pk not in self.entries and self.segment.get(pk) == entry:
+                return
+            self._discard(pk)
+            self.entries[pk] = entry
+            for side, value in zip(SIDES, entry[1:]):
+                if value is not None:
+                    for table, chunk in zip(self.tables[side], _chunks(value)):
+                        table.setdefault(chunk, []).append(pk)
+
+    def get(self, pk):
+        """
+        Returns:
+            tuple: ``(client_id, dhash_frontside, dhash_backside)`` of a transaction, or None if not indexed.
+        """
+        with self._lock:
+            if pk in self.entries:
+                return self.entries[pk]
+            if pk in self.removed:
+                return None
+            return self.segment.get(pk)
+
+    def discard(self, pk):
+        """
+        Remove a transaction from the index, if it is indexed.
+        """
+        with self._lock:
+            self._discard(pk)
+
+    def _discard(self, pk):
+        if self.segment.get(pk) is not None:
+            self.removed.add(pk)
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        for side, value in zip(SIDES, entry[1:]):
+            if value is not None:
+                for table, chunk in zip(self.tables[side], _chunks(value)):
+                    table[chunk].remove(pk)
+                    if not table[chunk]:
+                        del table[chunk]
+
+    def search(self, value, side, max_distance):
+        """
+        Find the transactions with a hash of ``side`` within ``max_distance`` bits.
+
+        Args:
+            value (int): The hash to look up.
+            side (str): "frontside" or "backside".
+            max_distance (int): The maximum Hamming distance.
+
+        Returns:
+            list: ``(distance, transaction_id, client_id)`` tuples, closest first.
+        """
+        masks = _chunk_masks(max_distance)
+        chunks = _chunks(value)
+        position = 1 + SIDES.index(side)
+        matches = []
+        with self._lock:
+            segment = self.segment
+            for row in set(segment.candidates(side, chunks, masks)):
+                distance = hamming_distance(value, segment.dhashes[side][row])
+                if distance <= max_distance and segment.pks[row] not in self.removed:
+                    matches.append((distance, segment.pks[row], segment.client_ids[row]))
+            candidates = set()
+            for table, chunk, chunk_masks in zip(self.tables[side], chunks, masks):
+                for mask in chunk_masks:
+                    pks = table.get(chunk ^ mask)
+                    if pks:
+                        candidates.update(pks)
+            for pk in candidates:
+                entry = self.entries[pk]
+                distance = hamming_distance(value, entry[position])
+                if distance <= max_distance:
+                    matches.append((distance, pk, entry[0]))
+        matches.sort()
+        return matches
+
+    def refresh(self, settle_seconds=300):
+        """
+        Index the transactions added since ``watermark``.
+
+        The watermark only moves past finished transactions older than
+        ``settle_seconds``: younger ids may still be committed out of order and
+        pending ones get their hashes from the validation workers, so rows past
+        it are read again on the next refresh.
+
+        Returns:
+            int: The number of rows read.
+        """
+        with self._refresh_lock:
+            settled_before = timezone.now() - timedelta(seconds=settle_seconds)
+            rows = (
+                Transaction.objects.filter(pk__gt=self.watermark)
+                .order_by("pk")
+                .values_list("pk", "client_id", "dhash_frontside", "dhash_backside", "status", "creation_date")
+            )
+            watermark, settled, count = self.watermark, True, 0
+            for pk, client_id, dhash_frontside, dhash_backside, status, creation_date in rows.iterator(chunk_size=2000):
+                count += 1
+                if dhash_frontside is not None or dhash_backside is not None:
+                    self.add(pk, client_id, dhash_frontside, dhash_backside)
+                settled = settled and status == Transaction.Status.DONE and creation_date < settled_before
+                if settled:
+                    watermark = pk
+            self.watermark = watermark
+            return count
+
+    def compact(self):
+        """
+        Merge the transactions added since the segment was built into a new
+        segment. Searches wait meanwhile, about a second per million transactions.
+        """
+        with self._lock:
+            items = [item for item in self.segment.items() if item[0] not in self.removed]
+            items.extend((pk, *entry) for pk, entry in self.entries.items())
+            self.segment = _Segment.build(items)
+            self.entries = {}
+            self.tables = {side: [{} for _ in range(CHUNKS)] for side in SIDES}
+            self.removed = set()
+
+    def save(self, path):
+        """
+        Compact the index and write it to ``path``, atomically.
+        """
+        self.compact()
+        with self._lock:
+            segment, watermark = self.segment, self.watermark
+        side_counts = [len(segment.keys[side][0]) for side in SIDES]
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".image-hash-index-")
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, watermark, len(segment), *side_counts))
+            segment.write(temp_file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a snapshot written by ``save``.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is not a snapshot.
+            EOFError: If the file is truncated.
+
+        Returns:
+            HashIndex: The index.
+        """
+        with open(path, "rb") as snapshot:
+            header = snapshot.read(SNAPSHOT_HEADER.size)
+            if len(header) != SNAPSHOT_HEADER.size:
+                raise EOFError(f"{path} is truncated.")
+            magic, watermark, count, *side_counts = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not an image hash index snapshot.")
+            return cls(_Segment.read(snapshot, count, side_counts), watermark)
+
+
+_index = None
+_index_lock = threading.Lock()
+_updater = None
+
+
+def get_hash_index():
+    """
+    Get the current process-wide HashIndex.
+
+    Never reads the database: the index is built and refreshed by the updater
+    thread (``start_hash_index_updater``), started here on first use if
+    ``TransactionsConfig.ready`` did not start it. Until its first build
+    completes the index is empty.
+
+    Returns:
+        HashIndex: The shared index.
+    """
+    index = _index
+    if index is None:
+        start_hash_index_updater()
+        index = _index or HashIndex()
+    return index
+
+
+def update_hash_index():
+    """
+    Bring the process-wide HashIndex up to date: load the ``INDEX_PATH``
+    snapshot when it is new or has changed, else index the transactions added
+    since the last refresh. A reloaded index replaces the current one once it
+    is refreshed, so searches keep using the previous index meanwhile.
+
+    Returns:
+        HashIndex: The updated index.
+    """
+    global _index
+    config = get_duplicate_settings()
+    index = _index
+    try:
+        mtime = os.stat(config["INDEX_PATH"]).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        mtime = None
+    if index is None or mtime != index.snapshot_mtime:
+        index = load_hash_index(config["INDEX_PATH"])
+        index.refresh(config["SETTLE_SECONDS"])
+        with _index_lock:
+            _index = index
+    else:
+        index.refresh(config["SETTLE_SECONDS"])
+    return index
+
+
+def _run_updater():
+    while True:
+        close_old_connections()
+        try:
+            update_hash_index()
+        except Exception:
+            logger.exception("Failed to update the image hash index")
+        time.sleep(get_duplicate_settings()["REFRESH_INTERVAL"] or 1)
+
+
+def start_hash_index_updater():
+    """
+    Start the thread running ``update_hash_index`` every ``REFRESH_INTERVAL``
+    seconds, if not already running.
+    """
+    global _updater
+    with _index_lock:
+        if _updater is None:
+            _updater = threading.Thread(target=_run_updater, name="image-hash-index", daemon=True)
+            _updater.start()
+
+
+def load_hash_index(path):
+    """
+    Build a HashIndex from the snapshot at ``path``.
+
+    Unreadable snapshots, and snapshots ahead of the database (e.g. restored
+    from another environment), are ignored and the index is rebuilt from the
+    database instead.
+
+    Returns:
+        HashIndex: The index, not refreshed.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError, ValueError):
+        return HashIndex()
+    try:
+        index = HashIndex.load(path)
+    except (OSError, ValueError, EOFError):
+        logger.warning("Ignoring unreadable image hash index snapshot %s", path, exc_info=True)
+        index = HashIndex()
+    else:
+        last_pk = Transaction.objects.order_by("-pk").values_list("pk", flat=True).first()
+        if index.watermark > (last_pk or 0):
+            logger.warning("Ignoring image hash index snapshot %s, it is ahead of the database", path)
+            index = HashIndex()
+    index.snapshot_mtime = mtime
+    return index
+
+
+@receiver(setting_changed)
+def reset_hash_index(setting, **kwargs):
+    """
+    Drop the shared index when ``IMAGE_HASHES`` is overridden in tests.
+    """
+    global _index
+    if setting == "IMAGE_HASHES":
+        with _index_lock:
+            _index = None
+
+
+@receiver(post_save, sender=Transaction)
+def index_saved_transaction(instance, **kwargs):
+    """
+    Add the hashes of a saved transaction to the index of this process, once
+    committed. Rows written by other processes or with ``bulk_create`` are
+    picked up by ``HashIndex.refresh``.
+    """
+    index = _index
+    if index is not None and (instance.dhash_frontside is not None or instance.dhash_backside is not None):
+        entry = (instance.pk, instance.client_id, instance.dhash_frontside, instance.dhash_backside)
+        db_transaction.on_commit(lambda: index.add(*entry))
+
+
+@receiver(post_delete, sender=Transaction)
+def unindex_deleted_transaction(instance, **kwargs):
+    """
+    Remove a deleted transaction from the index of this process, once committed.
+    """
+    index = _index
+    if index is not None:
+        pk = instance.pk
+        db_transaction.on_commit(lambda: index.discard(pk))
+
+
+def check_seen_before(client, dhash_frontside, dhash_backside):
+    """
+    Reject a document whose both sides match a transaction of another client.
+
+    Looks up the front side in the in-memory index and compares the back
+    side of the matches. Only a match is confirmed against the database, in
+    case the transaction was deleted.
+
+    Args:
+        client (clients.models.Client): The client submitting the document.
+        dhash_frontside (int): The hash of the front side.
+        dhash_backside (int): The hash of the back side.
+
+    Returns:
+        dict: The error dict, or None if the document was not seen before.
+    """
+    config = get_duplicate_settings()
+    if dhash_frontside is None or dhash_backside is None:
+        return None
+    index = get_hash_index()
+    both = []
+    for _, pk, client_id in index.search(dhash_frontside, "frontside", config["MAX_DISTANCE"]):
+        entry = index.get(pk)
+        if (
+            client_id != client.pk
+            and entry is not None
+            and entry[2] is not None
+            and hamming_distance(dhash_backside, entry[2]) <= config["MAX_DISTANCE"]
+        ):
+            both.append(pk)
+    if both and Transaction.objects.filter(pk__in=both).exclude(client=client).exists():
+        return {
+            "result": False,
+            "error_code": 11,
+            "details": "Document was already submitted by another client.",
+        }
+    return None
+
+
+def find_matches(transaction, max_distance=None):
+    """
+    Find the transactions whose images are near-duplicates of those of ``transaction``.
+
+    Args:
+        transaction (Transaction): The transaction.
+        max_distance (int): The maximum Hamming distance, defaults to ``MAX_DISTANCE``.
+
+    Returns:
+        list: Dicts with the ``transaction`` id, its ``client`` id, the matching
+        ``side`` and the ``distance``, closest first.
+    """
+    config = get_duplicate_settings()
+    if max_distance is None:
+        max_distance = config["MAX_DISTANCE"]
+    index = get_hash_index()
+    matches = [
+        (distance, pk, client_id, side)
+        for side, value in zip(SIDES, (transaction.dhash_frontside, transaction.dhash_backside))
+        if value is not None
+        for distance, pk, client_id in index.search(value, side, max_distance)
+        if pk != transaction.pk
+    ]
+    existing = set(Transaction.objects.filter(pk__in={pk for _, pk, _, _ in matches}).values_list("pk", flat=True))
+    return [
+        {"transaction": pk, "client": client_id, "side": side, "distance": distance}
+        for distance, pk, client_id, side in sorted(matches)
+        if pk in existing
+    ]
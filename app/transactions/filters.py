@@ -0,0 +1,112 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("0", "false", "no")
+
+
+class TransactionFilterBackend(BaseFilterBackend):
+    """
+    Filters transactions by ``client``, ``result``, ``error_code`` and a
+    ``created_after``/``created_before`` range (ISO dates or datetimes, both
+    inclusive).
+
+    Every filter maps to a leading column of an index on Transaction:
+    ``(client, creation_date)``, ``(result, error_code, creation_date)`` or
+    ``(creation_date, id)``.
+    """
+
+    def get_filters(self, request):
+        """
+        Parse the filter query parameters.
+
+        Args:
+            request (Request): The current request.
+
+        Raises:
+            serializers.ValidationError: If a parameter has an invalid value.
+
+        Returns:
+            dict: The given filters among ``client``, ``result``, ``error_code``,
+            ``created_after`` and ``created_before`` (aware datetimes, the latter exclusive).
+        """
+        params = request.query_params
+        filters, errors = {}, {}
+        for name in ("client", "error_code"):
+            if params.get(name):
+                try:
+                    filters[name] = int(params[name])
+                except ValueError:
+                    errors[name] = ["A valid integer is required."]
+        if params.get("result"):
+            value = params["result"].lower()
+            if value in TRUE_VALUES + FALSE_VALUES:
+                filters["result"] = value in TRUE_VALUES
+            else:
+                errors["result"] = ["Must be true or false."]
+        if "error_code" in filters:
+            # Only failed transactions have an error code, filtering on result
+            # too lets the (result, error_code, creation_date) index be used.
+            filters["result"] = False
+        for name, end_of_day in (("created_after", False), ("created_before", True)):
+            if params.get(name):
+                value = self.parse_datetime(params[name], end_of_day)
+                if value is None:
+                    errors[name] = ["A valid ISO 8601 date or datetime is required."]
+                else:
+                    filters[name] = value
+        if errors:
+            raise serializers.ValidationError(errors)
+        return filters
+
+    def parse_datetime(self, value, end_of_day):
+        """
+        Parse an ISO date or datetime. A date means the start of that day, or
+        the start of the next one when ``end_of_day`` is set.
+        """
+        try:
+            if (day := parse_date(value)) is not None:
+                parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+            elif (parsed := parse_datetime(value)) is not None and end_of_day:
+                parsed += timedelta(microseconds=1)
+        except ValueError:
+            return None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def filter_queryset(self, request, queryset, view):
+        """
+        Return the filtered transactions.
+        """
+        filters = self.get_filters(request)
+        lookups = {
+            "client_id": filters.get("client"),
+            "result": filters.get("result"),
+            "error_code": filters.get("error_code"),
+            "creation_date__gte": filters.get("created_after"),
+            "creation_date__lt": filters.get("created_before"),
+        }
+        return queryset.filter(**{lookup: value for lookup, value in lookups.items() if value is not None})
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            ("client", "integer", None, "The client id."),
+            ("result", "boolean", None, "Whether the transaction passed validation."),
+            ("error_code", "integer", None, "The validation error code."),
+            ("created_after", "string", "date-time", "Created on or after this date or datetime."),
+            ("created_before", "string", "date-time", "Created on or before this date or datetime."),
+        ]
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": schema_type, **({"format": schema_format} if schema_format else {})},
+            }
+            for name, schema_type, schema_format, description in parameters
+        ]
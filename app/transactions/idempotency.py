@@ -0,0 +1,116 @@
+from functools import wraps
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADERS = ("Location",)
+
+
+def get_key_owner(request):
+    """
+    Get who an ``Idempotency-Key`` belongs to: the authenticated user or, for
+    anonymous requests, the client the transaction is created for.
+
+    Args:
+        request (rest_framework.request.Request): The request.
+
+    Returns:
+        str: The owner.
+    """
+    user = request.user
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"client:{request.data.get('client', '')}"[:64]
+
+
+def idempotent(view_func):
+    """
+    Decorator that makes a viewset action safe to retry with an ``Idempotency-Key``.
+
+    The first request with a given key runs the action and stores its status
+    and body; later requests with the same key get the stored response back,
+    with an ``Idempotent-Replayed`` header, without running the action. The key
+    row is locked while the action runs, so concurrent duplicates wait for the
+    first one and then replay it. Keys are scoped to their owner (see
+    ``get_key_owner``), so a key reused or guessed by another caller runs that
+    caller's request instead of replaying. Error responses (including the
+    failure rows written by the serializer) are stored and committed like
+    successful ones. Requests without the header are passed through unchanged.
+
+    Args:
+        view_func (function): The viewset action to be decorated.
+
+    Returns:
+        function: The decorated action.
+    """
+
+    @wraps(view_func)
+    def wrapped_view(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        now = timezone.now()
+        with db_transaction.atomic():
+            record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+                key=key,
+                owner=get_key_owner(request),
+                defaults={
+                    "method": request.method,
+                    "path": request.path,
+                    "expires_at": now + settings.IDEMPOTENCY_KEY_TTL,
+                },
+            )
+            if not created and record.expires_at > now and record.status_code is not None:
+                if (record.method, record.path) != (request.method, request.path):
+                    return Response(
+                        {"detail": f"{IDEMPOTENCY_HEADER} was already used for another request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return Response(
+                    record.response_body,
+                    status=record.status_code,
+                    headers={**record.response_headers, "Idempotent-Replayed": "true"},
+                )
+
+            try:
+                response = view_func(self, request, *args, **kwargs)
+            except Exception as exc:
+                # Turns API errors into responses, anything else is re-raised and rolls back.
+                response = self.handle_exception(exc)
+            if response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+                # Not an outcome, the retry runs the request again.
+                return response
+
+            record.method = request.method
+            record.path = request.path
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.response_headers = {
+                name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)
+            }
+            record.expires_at = now + settings.IDEMPOTENCY_KEY_TTL
+            record.save()
+        return response
+
+    return wrapped_view
+
+
+def purge_expired_keys():
+    """
+    Delete the idempotency keys whose stored response has expired.
+
+    Returns:
+        int: The number of deleted keys.
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from transactions.archive import archive_pending_transactions, get_archive_settings, move_originals_to_cold_storage
+
+
+class Command(BaseCommand):
+    """
+    Archives the transaction images, run it periodically (e.g. from cron).
+    """
+
+    help = "Store the missing archival copies and move old originals to cold storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=get_archive_settings()["COLD_AFTER_DAYS"],
+            help="Move the originals of transactions older than this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=100, help="Transactions read per query.")
+
+    def handle(self, *args, **options):
+        archived = archive_pending_transactions(options["batch_size"])
+        moved = move_originals_to_cold_storage(options["days"], options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Archived {archived} transactions, moved the originals of {moved} to cold storage.")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from transactions.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    """
+    Deletes the expired idempotency keys, run it periodically (e.g. from cron).
+    """
+
+    help = "Delete idempotency keys whose stored response has expired."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from transactions.stats import get_stats_settings, refresh_daily_stats
+
+
+class Command(BaseCommand):
+    """
+    Refreshes the TransactionDailyStats rollup, run it periodically (e.g. from cron).
+    """
+
+    help = "Recompute the daily transaction stats read by GET /transactions/stats/?source=rollup."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=get_stats_settings()["REFRESH_DAYS"],
+            help="Number of days to recompute, including today.",
+        )
+        parser.add_argument("--all", action="store_true", help="Recompute every day.")
+
+    def handle(self, *args, **options):
+        written = refresh_daily_stats(None if options["all"] else options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily stats rows."))
@@ -0,0 +1,72 @@
+import posixpath
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from transactions.models import Transaction
+from utils.response_cache import invalidate_cached_responses
+from utils.storage import get_transaction_image_storage
+
+IMAGE_FIELDS = ("image_frontside", "image_backside")
+
+
+class Command(BaseCommand):
+    """
+    Moves the transaction images to the layout of the configured storage.
+
+    Rows are updated one stored file at a time while the application keeps
+    serving: a row always points at a file that exists, either the old one or
+    the re-homed copy. Safe to interrupt and run again.
+    """
+
+    help = "Copy transaction images to the sharded content-addressed layout and update the rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            help="Alias of the storage to read the old files from, defaults to the transaction image storage.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows read per query.")
+        parser.add_argument(
+            "--delete-old",
+            action="store_true",
+            help="Delete each old file once no transaction refers to it anymore.",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_transaction_image_storage()
+        source = storages[options["source"]] if options["source"] else storage
+        rehomed = {}
+        last_pk = 0
+        while True:
+            rows = list(
+                Transaction.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", *IMAGE_FIELDS)[: options["batch_size"]]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            for name in {name for row in rows for name in row[1:]}:
+                if name and name not in rehomed and not storage.is_content_name(name):
+                    rehomed[name] = self.rehome(name, storage, source, options["delete_old"])
+        self.stdout.write(self.style.SUCCESS(f"Re-homed {len(rehomed)} files."))
+
+    def rehome(self, name, storage, source, delete_old):
+        """
+        Copy one file to its content-addressed name and point the rows at it.
+
+        Returns:
+            str: The new name.
+        """
+        upload_to = Transaction._meta.get_field("image_frontside").upload_to
+        with source.open(name, "rb") as old_file:
+            new_name = storage.save(posixpath.join(upload_to, posixpath.basename(name)), old_file)
+        pks = list(
+            Transaction.objects.filter(Q(image_frontside=name) | Q(image_backside=name)).values_list("pk", flat=True)
+        )
+        for field in IMAGE_FIELDS:
+            Transaction.objects.filter(**{field: name}).update(**{field: new_name})
+        invalidate_cached_responses(Transaction, pks)
+        if delete_old and not Transaction.objects.filter(Q(image_frontside=name) | Q(image_backside=name)).exists():
+            source.delete(name)
+        return new_name
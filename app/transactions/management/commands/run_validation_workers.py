@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand
+from transactions.tasks import ValidationWorkerPool, get_async_settings, process_pending_transactions
+
+
+class Command(BaseCommand):
+    """
+    Runs the asynchronous validation workers outside the web process.
+
+    Use together with ``ASYNC_VALIDATION["IN_PROCESS"] = False`` to keep the
+    image validation off the request workers entirely.
+    """
+
+    help = "Validate transactions queued by POST /transaction/?async=true."
+
+    def add_arguments(self, parser):
+        config = get_async_settings()
+        parser.add_argument("--workers", type=int, default=config["WORKERS"])
+        parser.add_argument("--batch-size", type=int, default=config["BATCH_SIZE"])
+        parser.add_argument("--poll-interval", type=float, default=config["POLL_INTERVAL"])
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue and exit."
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            total = 0
+            while processed := process_pending_transactions(options["batch_size"]):
+                total += processed
+            self.stdout.write(self.style.SUCCESS(f"Validated {total} transactions."))
+            return
+
+        pool = ValidationWorkerPool(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+        pool.start()
+        self.stdout.write(f"Running {options['workers']} validation workers, press CTRL-C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pool.stop()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from transactions.duplicates import HashIndex, get_duplicate_settings, load_hash_index
+
+
+class Command(BaseCommand):
+    """
+    Brings the image hash index snapshot up to date, run it periodically (e.g. from cron)
+    so new processes load it instead of reading every transaction.
+    """
+
+    help = "Index the perceptual hashes of new transactions and save the IMAGE_HASHES index snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Ignore the snapshot and index every transaction.")
+
+    def handle(self, *args, **options):
+        config = get_duplicate_settings()
+        index = HashIndex() if options["rebuild"] else load_hash_index(config["INDEX_PATH"])
+        read = index.refresh(config["SETTLE_SECONDS"])
+        index.save(config["INDEX_PATH"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Read {read} transactions, {len(index)} indexed, watermark {index.watermark}.")
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_rename_clients_client'),
+        ('transactions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done')], default='done', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='result',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['status', 'id'], name='transaction_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:28
+
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_transaction_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='image_backside',
+            field=models.ImageField(storage=utils.storage.get_transaction_image_storage, upload_to='transaction_images/'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='image_frontside',
+            field=models.ImageField(storage=utils.storage.get_transaction_image_storage, upload_to='transaction_images/'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:33
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY does not block writes to the table, but cannot run
+    # in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('clients', '0002_rename_clients_client'),
+        ('transactions', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['creation_date', 'id'], name='transaction_keyset_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['client', 'creation_date'], name='transaction_client_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['result', 'error_code', 'creation_date'], name='transaction_result_idx'),
+        ),
+    ]
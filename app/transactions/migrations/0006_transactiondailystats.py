@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_rename_clients_client'),
+        ('transactions', '0005_transaction_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('result', models.BooleanField()),
+                ('error_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField()),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clients.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='transaction_stats_day_idx')],
+            },
+        ),
+    ]
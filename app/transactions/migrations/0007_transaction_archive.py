@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:38
+
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_transactiondailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='archive_backside',
+            field=models.ImageField(blank=True, storage=utils.storage.get_transaction_image_storage, upload_to='transaction_archive/'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='archive_frontside',
+            field=models.ImageField(blank=True, storage=utils.storage.get_transaction_image_storage, upload_to='transaction_archive/'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='originals_archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
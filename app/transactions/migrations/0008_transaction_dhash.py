@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='dhash_backside',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='dhash_frontside',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from clients.models import Client
+from utils.response_cache import invalidate_cached_responses
+from utils.storage import get_transaction_image_storage
 
 class Transaction(models.Model):
     """
@@ -10,17 +14,57 @@ class Transaction(models.Model):
         creation_date (DateTimeField): The date and time when the transaction was created.
         image_frontside (ImageField): The image of the front side of the transaction.
         image_backside (ImageField): The image of the back side of the transaction.
+            Both are stored content-addressed, identical images share one file.
         result (BooleanField): The result of the transaction (True for success, False for failure).
         error_code (PositiveIntegerField): The error code associated with the transaction (optional).
         details (TextField): Additional details about the transaction (optional).
+        status (CharField): The validation state. ``result``, ``error_code`` and ``details``
+            are only final once the status is ``done``.
+        claimed_at (DateTimeField): When a validation worker picked up the transaction (optional).
+        attempts (PositiveSmallIntegerField): How many times validation workers claimed the transaction.
+        archive_frontside (ImageField): Re-encoded, downscaled copy of the front side kept for audits (optional).
+        archive_backside (ImageField): Re-encoded, downscaled copy of the back side kept for audits (optional).
+        originals_archived_at (DateTimeField): When the original images were moved to cold storage (optional).
+            They stay readable through ``image_frontside``/``image_backside``.
+        dhash_frontside (BigIntegerField): Perceptual hash of the front side, set once it passed
+            validation (optional), see ``transactions.duplicates``.
+        dhash_backside (BigIntegerField): Perceptual hash of the back side (optional).
     """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        DONE = "done", "Done"
+
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
     creation_date = models.DateTimeField(auto_now_add=True)
-    image_frontside = models.ImageField(upload_to='transaction_images/')
-    image_backside = models.ImageField(upload_to='transaction_images/')
+    image_frontside = models.ImageField(upload_to='transaction_images/', storage=get_transaction_image_storage)
+    image_backside = models.ImageField(upload_to='transaction_images/', storage=get_transaction_image_storage)
     result = models.BooleanField(default=True)
     error_code = models.PositiveIntegerField(null=True, blank=True)
     details = models.TextField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.DONE)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    archive_frontside = models.ImageField(upload_to='transaction_archive/', storage=get_transaction_image_storage, blank=True)
+    archive_backside = models.ImageField(upload_to='transaction_archive/', storage=get_transaction_image_storage, blank=True)
+    originals_archived_at = models.DateTimeField(null=True, blank=True)
+    dhash_frontside = models.BigIntegerField(null=True, blank=True, editable=False)
+    dhash_backside = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keeps the validation queue scan small, finished rows are not indexed.
+            models.Index(
+                fields=["status", "id"],
+                name="transaction_queue_idx",
+                condition=models.Q(status__in=["pending", "processing"]),
+            ),
+            # Keyset pagination of the transaction list.
+            models.Index(fields=["creation_date", "id"], name="transaction_keyset_idx"),
+            models.Index(fields=["client", "creation_date"], name="transaction_client_date_idx"),
+            models.Index(fields=["result", "error_code", "creation_date"], name="transaction_result_idx"),
+        ]
 
     def __str__(self):
         """
@@ -29,4 +73,99 @@ class Transaction(models.Model):
         Returns:
             str: The string representation of the transaction.
         """
-        return f"{self.client} - {self.creation_date}"
\ No newline at end of file
+        return f"{self.client} - {self.creation_date}"
+
+class IdempotencyKey(models.Model):
+    """
+    Model storing the response of a request sent with an ``Idempotency-Key`` header.
+
+    Attributes:
+        key (CharField): The client supplied key.
+        owner (CharField): Who sent the key, keys are unique per owner.
+        method (CharField): The HTTP method of the original request.
+        path (CharField): The path of the original request.
+        status_code (PositiveSmallIntegerField): The status code of the stored response.
+        response_body (JSONField): The body of the stored response.
+        response_headers (JSONField): The headers of the stored response worth replaying.
+        created_at (DateTimeField): When the key was first used.
+        expires_at (DateTimeField): When the stored response may be discarded.
+    """
+
+    key = models.CharField(max_length=255)
+    owner = models.CharField(max_length=64, blank=True, default="")
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "key"], name="idempotency_key_owner_key_uniq"),
+        ]
+
+    def __str__(self):
+        """
+        Returns the string representation of the idempotency key.
+
+        Returns:
+            str: The key.
+        """
+        return self.key
+
+class TransactionDailyStats(models.Model):
+    """
+    Rollup of the finished transactions per day, client, result and error code,
+    refreshed with ``manage.py refresh_transaction_stats``.
+
+    Attributes:
+        day (DateField): The creation day of the counted transactions.
+        client (ForeignKey): The client of the counted transactions.
+        result (BooleanField): The result of the counted transactions.
+        error_code (PositiveIntegerField): The error code of the counted transactions (optional).
+        count (PositiveIntegerField): The number of transactions.
+    """
+
+    day = models.DateField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    result = models.BooleanField()
+    error_code = models.PositiveIntegerField(null=True, blank=True)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day"], name="transaction_stats_day_idx"),
+        ]
+
+    def __str__(self):
+        """
+        Returns the string representation of the rollup row.
+
+        Returns:
+            str: The string representation of the rollup row.
+        """
+        return f"{self.day} - {self.client_id} - {self.error_code}: {self.count}"
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_responses(instance, **kwargs):
+    """
+    Drop the cached representations of a client, including those of its
+    transactions, which embed it (see ``cached_representation``).
+    """
+    invalidate_cached_responses(Client, [instance.pk])
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_responses(instance, **kwargs):
+    """
+    Drop the cached representation of a transaction when it changes.
+
+    Queryset ``update()`` calls send no signal, call ``invalidate_cached_responses``
+    after them.
+    """
+    invalidate_cached_responses(Transaction, [instance.pk])
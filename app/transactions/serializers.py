@@ -1,7 +1,29 @@
+from django.db import models
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from .duplicates import check_seen_before, get_duplicate_settings
 from .models import Transaction
-from utils.processing_images import validate_image, base64_to_image
-from django.core.files.uploadedfile import TemporaryUploadedFile
+from utils.fields import ProbedImageField
+from utils.executors import get_validation_executor
+from utils.metrics import stage
+from utils.processing_images import (
+    VALID,
+    base64_to_image,
+    cache_verdict,
+    check_images_quality,
+    dhash_images,
+    validate_images,
+)
+from utils.thumbnails import get_thumbnail_settings
+
+# Stands for the pk in the reversed thumbnail URLs, see TransactionSerializer.get_thumbnails.
+THUMBNAIL_PK_PLACEHOLDER = "__pk__"
+
+IMAGE_LIMITS = {
+    "max_size_mb": 4,
+    "min_resolution": (224, 224),
+    "max_resolution": (3840, 2160),
+}
 
 
 class TransactionCreateSerializer(serializers.ModelSerializer):
@@ -16,12 +38,26 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         fields (list): The fields to be included in the serialized representation.
 
     Methods:
-        validate_image(image, max_size_mb, min_resolution, max_resolution):
-            Custom validation for image files.
         validate(data):
             Custom validation to ensure that both frontside and backside images are provided.
+            The images are checked with ``utils.processing_images.validate_images``.
+            With ``async_validation`` in the context, only presence is checked here. Valid images
+            get their perceptual hashes and, with ``SEEN_BEFORE_CHECK``, are checked for duplicates.
+        validate_seen_before(data):
+            Record and raise error 11 for documents submitted by another client.
+        raise_first_error(data, image_frontside, image_backside):
+            Record and raise the first failed image check.
+        record_failure(data, error_code, details, image_frontside, image_backside):
+            Store a failed transaction.
+        to_internal_value(data):
+            Convert base64 image strings to uploaded files.
     """
 
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: ProbedImageField,
+    }
+
     class Meta:
         """
         The Meta class provides metadata for the TransactionCreateSerializer.
@@ -47,82 +83,163 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         image_frontside = data.get("image_frontside")
         image_backside = data.get("image_backside")
         if not image_frontside:
-            Transaction.objects.create(
-                client=data["client"],
-                image_frontside=None,
-                image_backside=None,
-                result=False,
-                error_code=4,
-                details="Frontside image is missing.",
-            )
+            self.record_failure(data, 4, "Frontside image is missing.")
             raise serializers.ValidationError("Frontside image is missing.")
         elif not image_backside:
-            Transaction.objects.create(
-                client=data["client"],
-                image_frontside=None,
-                image_backside=None,
-                result=False,
-                error_code=5,
-                details="Backside image is missing.",
-            )
+            self.record_failure(data, 5, "Backside image is missing.")
             raise serializers.ValidationError("Backside image is missing.")
-        # Validate the images individually
-        data["image_frontside"] = validate_image(
-            client=data["client"],
-            image=image_frontside,
-            max_size_mb=4,
-            min_resolution=(224, 224),
-            max_resolution=(3840, 2160),
-        )
-        data["image_backside"] = validate_image(
-            client=data["client"],
-            image=image_backside,
-            max_size_mb=4,
-            min_resolution=(224, 224),
-            max_resolution=(3840, 2160),
-        )
-
-        if isinstance(data["image_frontside"], dict):
-            Transaction.objects.create(
-                client=data["client"],
-                image_frontside=image_frontside,
-                image_backside=image_backside,
-                result=False,
-                error_code=data["image_frontside"]["error_code"],
-                details=data["image_frontside"]["details"],
-            )
-            raise serializers.ValidationError(data["image_frontside"]["details"])
-        elif isinstance(data["image_backside"], dict):
-            Transaction.objects.create(
+        if self.context.get("async_validation"):
+            # The images are validated later by the worker pool (transactions.tasks).
+            return data
+        # Validate both sides concurrently, results keep the front/back order
+        with stage("validate_image"):
+            data["image_frontside"], data["image_backside"] = validate_images(
                 client=data["client"],
-                image_frontside=image_frontside,
-                image_backside=image_backside,
-                result=False,
-                error_code=data["image_backside"]["error_code"],
-                details=data["image_backside"]["details"],
+                images=[image_frontside, image_backside],
+                executor=get_validation_executor(),
+                **IMAGE_LIMITS,
             )
-            raise serializers.ValidationError(data["image_backside"]["details"])
+
+        self.raise_first_error(data, image_frontside, image_backside)
+
+        # Both headers are acceptable, run the full Pillow check on the pixels.
+        unchecked = []
+        for field_name in ("image_frontside", "image_backside"):
+            self.fields[field_name].verify(data[field_name])
+            if not getattr(data[field_name], "quality_checked", False):
+                unchecked.append(field_name)
+
+        # Then score the sharpness, exposure and glare of the images not known to pass.
+        with stage("quality_check"):
+            results = check_images_quality([data[field_name] for field_name in unchecked], get_validation_executor())
+        for field_name, result in zip(unchecked, results):
+            if isinstance(result, dict):
+                cache_verdict(data[field_name], result, IMAGE_LIMITS)
+            data[field_name] = result
+        self.raise_first_error(data, image_frontside, image_backside)
+
+        for field_name in ("image_frontside", "image_backside"):
+            cache_verdict(data[field_name], VALID, IMAGE_LIMITS)
+
+        # Hash the valid images for near-duplicate lookups (transactions.duplicates).
+        config = get_duplicate_settings()
+        if config["ENABLED"]:
+            with stage("dhash"):
+                data["dhash_frontside"], data["dhash_backside"] = dhash_images(
+                    [data["image_frontside"], data["image_backside"]], get_validation_executor()
+                )
+            if config["SEEN_BEFORE_CHECK"] and not self.context.get("defer_seen_before"):
+                self.validate_seen_before(data)
 
         return data
 
+    def validate_seen_before(self, data):
+        """
+        Record and raise error 11 if the document was submitted by another
+        client, see ``transactions.duplicates.check_seen_before``.
 
-def to_internal_value(self, data):
-    """
-    Convert base64 image strings to Image instances.
+        Runs from ``validate`` unless ``defer_seen_before`` is in the context,
+        for callers that validate on other threads and check afterwards.
 
-    Args:
-        data (dict): The data to be converted.
+        Args:
+            data (dict): The validated data, with the perceptual hashes.
 
-    Returns:
-        dict: The converted data.
-    """
-    if "image_frontside" in data and isinstance(data["image_frontside"], str):
-        data["image_frontside"] = base64_to_image(data["image_frontside"])
+        Raises:
+            serializers.ValidationError: If the document was seen before.
+        """
+        error = check_seen_before(data["client"], data.get("dhash_frontside"), data.get("dhash_backside"))
+        if error:
+            self.record_failure(
+                data,
+                error["error_code"],
+                error["details"],
+                image_frontside=data["image_frontside"],
+                image_backside=data["image_backside"],
+            )
+            raise serializers.ValidationError(error["details"])
 
-    if "image_backside" in data and isinstance(data["image_backside"], str):
-        data["image_backside"] = base64_to_image(data["image_backside"])
+    def raise_first_error(self, data, image_frontside, image_backside):
+        """
+        Record and raise the first error dict among the validated images, front first.
+
+        Raises:
+            serializers.ValidationError: If either image failed validation.
+        """
+        for error in (data["image_frontside"], data["image_backside"]):
+            if isinstance(error, dict):
+                self.record_failure(
+                    data,
+                    error["error_code"],
+                    error["details"],
+                    image_frontside=image_frontside,
+                    image_backside=image_backside,
+                )
+                raise serializers.ValidationError(error["details"])
+
+    def record_failure(self, data, error_code, details, image_frontside=None, image_backside=None):
+        """
+        Store a failed transaction.
+
+        When the context carries a ``failure_rows`` list (bulk submission), the
+        unsaved transaction is appended to it instead, to be inserted in bulk.
+
+        Args:
+            data (dict): The data being validated.
+            error_code (int): The error code of the failure.
+            details (str): The description of the failure.
+            image_frontside (UploadedFile): The frontside image to keep (optional).
+            image_backside (UploadedFile): The backside image to keep (optional).
+        """
+        transaction = Transaction(
+            client=data["client"],
+            image_frontside=image_frontside,
+            image_backside=image_backside,
+            result=False,
+            error_code=error_code,
+            details=details,
+            dhash_frontside=data.get("dhash_frontside"),
+            dhash_backside=data.get("dhash_backside"),
+        )
+        if "failure_rows" in self.context:
+            self.context["failure_rows"].append(transaction)
+        else:
+            with stage("failure_insert"):
+                transaction.save()
+
+    def to_internal_value(self, data):
+        """
+        Convert base64 image strings to uploaded files.
+
+        Bodies parsed by Base64StreamingJSONParser already carry files; this
+        covers base64 strings sent through other parsers (e.g. form fields).
+
+        Args:
+            data (dict): The data to be converted.
+
+        Returns:
+            dict: The converted data.
+        """
+        base64_fields = [
+            field_name
+            for field_name in ("image_frontside", "image_backside")
+            if isinstance(data.get(field_name), str) and data[field_name]
+        ]
+        if base64_fields:
+            data = {**data}
+            for field_name in base64_fields:
+                try:
+                    with stage("base64_decode"):
+                        data[field_name] = base64_to_image(
+                            data[field_name],
+                            name=field_name,
+                            max_size_mb=IMAGE_LIMITS["max_size_mb"],
+                        )
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {field_name: ["Invalid base64-encoded image."]}
+                    )
 
-    return super().to_internal_value(data)
+        return super().to_internal_value(data)
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -134,8 +251,11 @@ class TransactionSerializer(serializers.ModelSerializer):
     Attributes:
         model (django.db.models.Model): The model class to be used for serialization.
         fields (list): The fields to be included in the serialized representation.
+        thumbnails (SerializerMethodField): The thumbnail URLs of each side, by size name.
     """
 
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         """
         The Meta class provides metadata for the TransactionSerializer.
@@ -144,4 +264,31 @@ class TransactionSerializer(serializers.ModelSerializer):
 
         model = Transaction
         fields = "__all__"
-        depth = 1
\ No newline at end of file
+        depth = 1
+
+    def get_thumbnails(self, transaction):
+        """
+        Get the thumbnail URLs of the transaction images.
+
+        Returns:
+            dict: ``{"frontside": {size: url}, "backside": {size: url}}``.
+        """
+        templates = getattr(self, "_thumbnail_templates", None)
+        if templates is None:
+            # Reversed once per serializer, list pages only substitute the pk.
+            request = self.context.get("request")
+            templates = self._thumbnail_templates = {
+                side: {
+                    size: reverse(
+                        "transaction-thumbnail", args=[THUMBNAIL_PK_PLACEHOLDER, side, size], request=request
+                    ).split(THUMBNAIL_PK_PLACEHOLDER)
+                    for size in get_thumbnail_settings()["SIZES"]
+                }
+                for side in ("frontside", "backside")
+            }
+        pk = str(transaction.pk)
+        return {
+            side: {size: pk.join(template) for size, template in sizes.items()}
+            for side, sizes in templates.items()
+            if getattr(transaction, f"image_{side}")
+        }
@@ -0,0 +1,121 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Transaction, TransactionDailyStats
+
+
+def get_stats_settings():
+    """
+    Get the ``TRANSACTION_STATS`` settings with their defaults.
+
+    Returns:
+        dict: The stats settings.
+    """
+    return {
+        "USE_ROLLUP": False,
+        "REFRESH_DAYS": 2,
+        **getattr(settings, "TRANSACTION_STATS", {}),
+    }
+
+
+def _summarize(queryset, day, count):
+    # ``day`` annotates the day to group by, None when the model has a ``day`` field.
+    rejected = Q(result=False)
+    totals = queryset.aggregate(total=Coalesce(count(), 0), rejected=Coalesce(count(filter=rejected), 0))
+    by_error_code = (
+        queryset.filter(rejected).values("error_code").annotate(count=count()).order_by("error_code")
+    )
+    if day is not None:
+        queryset = queryset.annotate(day=day)
+    by_day = (
+        queryset.values("day")
+        .annotate(total=count(), rejected=Coalesce(count(filter=rejected), 0))
+        .order_by("day")
+    )
+    return {**totals, "by_error_code": list(by_error_code), "by_day": list(by_day)}
+
+
+def compute_stats(queryset):
+    """
+    Count the finished transactions of a queryset per error code and per day.
+
+    Args:
+        queryset (QuerySet): The (filtered) transactions.
+
+    Returns:
+        dict: ``total`` and ``rejected`` counts, ``by_error_code`` (``error_code``,
+        ``count``) and ``by_day`` (``day``, ``total``, ``rejected``) lists.
+    """
+    return _summarize(
+        queryset.filter(status=Transaction.Status.DONE),
+        day=TruncDate("creation_date"),
+        count=lambda **kwargs: Count("id", **kwargs),
+    )
+
+
+def compute_rollup_stats(queryset):
+    """
+    Same as ``compute_stats`` from TransactionDailyStats rows.
+
+    Args:
+        queryset (QuerySet): The (filtered) rollup rows.
+
+    Returns:
+        dict: The stats, in the format of ``compute_stats``.
+    """
+    return _summarize(queryset, day=None, count=lambda **kwargs: Sum("count", **kwargs))
+
+
+def filter_rollup(queryset, filters):
+    """
+    Apply the filters of TransactionFilterBackend to rollup rows. The date range
+    is widened to whole days.
+
+    Args:
+        queryset (QuerySet): The rollup rows.
+        filters (dict): The filters returned by ``TransactionFilterBackend.get_filters``.
+
+    Returns:
+        QuerySet: The filtered rollup rows.
+    """
+    lookups = {name: filters[name] for name in ("result", "error_code") if name in filters}
+    if "client" in filters:
+        lookups["client_id"] = filters["client"]
+    if "created_after" in filters:
+        lookups["day__gte"] = timezone.localdate(filters["created_after"])
+    if "created_before" in filters:
+        lookups["day__lte"] = timezone.localdate(filters["created_before"] - timedelta(microseconds=1))
+    return queryset.filter(**lookups)
+
+
+def refresh_daily_stats(days=None):
+    """
+    Recompute the TransactionDailyStats rows of the last ``days`` days.
+
+    Args:
+        days (int): The number of days to recompute, including today. All days when None.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    transactions = Transaction.objects.filter(status=Transaction.Status.DONE)
+    rollup = TransactionDailyStats.objects.all()
+    if days is not None:
+        since = timezone.localdate() - timedelta(days=days - 1)
+        transactions = transactions.filter(creation_date__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        rollup = rollup.filter(day__gte=since)
+    rows = (
+        transactions.annotate(day=TruncDate("creation_date"))
+        .values("day", "client_id", "result", "error_code")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    with db_transaction.atomic():
+        rollup.delete()
+        created = TransactionDailyStats.objects.bulk_create(
+            (TransactionDailyStats(**row) for row in rows), batch_size=1000
+        )
+    return len(created)
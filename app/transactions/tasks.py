@@ -0,0 +1,263 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from utils.processing_images import dhash_image, validate_stored_image
+from utils.response_cache import invalidate_cached_responses
+from .archive import archive_transaction, get_archive_settings
+from .duplicates import check_seen_before, get_duplicate_settings
+from .models import Transaction
+from .serializers import IMAGE_LIMITS
+
+logger = logging.getLogger(__name__)
+
+
+def get_async_settings():
+    """
+    Get the ``ASYNC_VALIDATION`` settings with their defaults.
+
+    Returns:
+        dict: The asynchronous validation settings.
+    """
+    return {
+        "ENABLED": False,
+        "WORKERS": 2,
+        "BATCH_SIZE": 10,
+        "POLL_INTERVAL": 1,
+        "CLAIM_TIMEOUT": 300,
+        "MAX_ATTEMPTS": 5,
+        "IN_PROCESS": True,
+        "AUTOSTART": False,
+        **getattr(settings, "ASYNC_VALIDATION", {}),
+    }
+
+
+def claim_pending_transactions(limit):
+    """
+    Claim up to ``limit`` transactions waiting for validation.
+
+    Rows are locked with ``SKIP LOCKED`` so concurrent workers never claim the
+    same transaction. Rows left in ``processing`` by a worker that died or
+    failed are claimed again once ``CLAIM_TIMEOUT`` seconds have passed, up to
+    ``MAX_ATTEMPTS`` claims; then they are given up (see ``give_up_transactions``).
+
+    Args:
+        limit (int): The maximum number of transactions to claim.
+
+    Returns:
+        list: The claimed transactions.
+    """
+    config = get_async_settings()
+    now = timezone.now()
+    stale = now - timedelta(seconds=config["CLAIM_TIMEOUT"])
+    with db_transaction.atomic():
+        rows = list(
+            Transaction.objects.select_related("client")
+            .select_for_update(skip_locked=True, of=("self",))
+            .filter(
+                Q(status=Transaction.Status.PENDING)
+                | Q(status=Transaction.Status.PROCESSING, claimed_at__lt=stale)
+            )
+            .order_by("id")[:limit]
+        )
+        claimed = [t for t in rows if t.attempts < config["MAX_ATTEMPTS"]]
+        give_up_transactions([t for t in rows if t.attempts >= config["MAX_ATTEMPTS"]])
+        Transaction.objects.filter(pk__in=[t.pk for t in claimed]).update(
+            status=Transaction.Status.PROCESSING, claimed_at=now, attempts=F("attempts") + 1
+        )
+        for transaction in claimed:
+            transaction.attempts += 1
+        invalidate_cached_responses(Transaction, [t.pk for t in claimed])
+    return claimed
+
+
+def give_up_transactions(transactions):
+    """
+    Record transactions that could not be validated in ``MAX_ATTEMPTS`` claims
+    as failed with error code 12, so they leave the queue.
+
+    Args:
+        transactions (list): The transactions.
+    """
+    if not transactions:
+        return
+    for transaction in transactions:
+        logger.error("Giving up on transaction %s after %s attempts", transaction.pk, transaction.attempts)
+    Transaction.objects.filter(pk__in=[t.pk for t in transactions]).update(
+        status=Transaction.Status.DONE,
+        result=False,
+        error_code=12,
+        details="The images could not be validated, submit them again.",
+    )
+    invalidate_cached_responses(Transaction, [t.pk for t in transactions])
+
+
+def validate_transaction(transaction):
+    """
+    Validate the stored images of a transaction and record the outcome.
+
+    The frontside is checked before the backside, so its error takes precedence
+    as in the synchronous path. Valid images then get their perceptual hashes
+    and, with ``SEEN_BEFORE_CHECK``, are checked for duplicates.
+
+    Args:
+        transaction (Transaction): The transaction to validate.
+
+    Returns:
+        Transaction: The updated transaction.
+    """
+    transaction.result, transaction.error_code, transaction.details = True, None, None
+    config = get_duplicate_settings()
+    dhashes = []
+    for image in (transaction.image_frontside, transaction.image_backside):
+        with image.open("rb"):
+            result = validate_stored_image(client=transaction.client, image=image, **IMAGE_LIMITS)
+            if not isinstance(result, dict) and config["ENABLED"]:
+                dhashes.append(dhash_image(result))
+        if isinstance(result, dict):
+            break
+    else:
+        if dhashes:
+            transaction.dhash_frontside, transaction.dhash_backside = dhashes
+            if config["SEEN_BEFORE_CHECK"]:
+                result = check_seen_before(transaction.client, *dhashes)
+    if isinstance(result, dict):
+        transaction.result = result["result"]
+        transaction.error_code = result["error_code"]
+        transaction.details = result["details"]
+    transaction.status = Transaction.Status.DONE
+    transaction.save(update_fields=["result", "error_code", "details", "status", "dhash_frontside", "dhash_backside"])
+    return transaction
+
+
+def process_pending_transactions(limit=None):
+    """
+    Claim and validate one batch of pending transactions, then store their
+    archival copies when ``TRANSACTION_ARCHIVE["ENABLED"]`` is set.
+
+    Args:
+        limit (int): The batch size, defaults to ``ASYNC_VALIDATION["BATCH_SIZE"]``.
+
+    Returns:
+        int: The number of transactions processed.
+    """
+    claimed = claim_pending_transactions(limit or get_async_settings()["BATCH_SIZE"])
+    for transaction in claimed:
+        try:
+            validate_transaction(transaction)
+        except Exception:
+            # Leave the row in processing, it is retried after CLAIM_TIMEOUT
+            # until MAX_ATTEMPTS.
+            logger.exception("Validation of transaction %s failed", transaction.pk)
+            if transaction.attempts >= get_async_settings()["MAX_ATTEMPTS"]:
+                give_up_transactions([transaction])
+            continue
+        if get_archive_settings()["ENABLED"]:
+            archive_transaction(transaction)
+    return len(claimed)
+
+
+class ValidationWorkerPool:
+    """
+    Local pool of threads draining the database-backed validation queue.
+
+    The queue is the ``Transaction`` table itself: rows created in ``pending``
+    state are claimed by ``process_pending_transactions``. Workers poll every
+    ``poll_interval`` seconds and can be woken early with ``wake``.
+    """
+
+    def __init__(self, workers=2, batch_size=10, poll_interval=1):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the worker threads, if not already running.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"validation-worker-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        """
+        Wake the workers without waiting for the next poll.
+        """
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker threads after their current batch.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def _run(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                processed = process_pending_transactions(self.batch_size)
+            except Exception:
+                logger.exception("Validation worker failed to claim transactions")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """
+    Get the in-process worker pool, starting it on first use.
+
+    Returns:
+        ValidationWorkerPool: The running pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = get_async_settings()
+                _pool = ValidationWorkerPool(
+                    workers=config["WORKERS"],
+                    batch_size=config["BATCH_SIZE"],
+                    poll_interval=config["POLL_INTERVAL"],
+                )
+                _pool.start()
+    return _pool
+
+
+def enqueue_transaction(transaction):
+    """
+    Notify the workers that a pending transaction is ready once it is committed.
+
+    Without ``IN_PROCESS`` the queue is drained by ``manage.py run_validation_workers``
+    and nothing needs to be done here.
+
+    Args:
+        transaction (Transaction): The pending transaction.
+    """
+    if get_async_settings()["IN_PROCESS"]:
+        db_transaction.on_commit(lambda: get_worker_pool().wake())
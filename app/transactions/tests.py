@@ -1,19 +1,1006 @@
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image, ImageDraw, ImageFilter
+from django.apps import apps
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import router
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth.models import User
-from clients.models import Cliente
-from .models import Transaccion
-from .serializers import TransaccionSerializer
+from clients.models import Client
+from utils.cache import LRUCache
+from utils.connection_pool import ConnectionPool, PoolTimeout
+from utils.db_router import PIN_COOKIE
+from utils.executors import ValidationExecutor
+from utils.fields import ProbedImageField
+from utils.metrics import stage
+from utils.middleware import ReplicaRoutingMiddleware
+from utils.processing_images import (
+    Base64ImageDecoder,
+    DecodeBudget,
+    DecodeBudgetExceeded,
+    check_image_quality,
+    decode_working_image,
+    get_decode_budget,
+    probe_image,
+    validate_image,
+)
+from utils.storage import ContentAddressedStorage, S3ContentAddressedStorage, get_transaction_image_storage
+from utils.testing import QueryCountAssertionsMixin
+from utils.thumbnails import ThumbnailCache
+from .async_views import TransactionAsyncView
+from .duplicates import HashIndex, check_seen_before, get_hash_index, hamming_distance, update_hash_index
+from .archive import archive_pending_transactions, archive_transaction, move_originals_to_cold_storage
+from .idempotency import purge_expired_keys
+from .models import IdempotencyKey, Transaction, TransactionDailyStats
+from .serializers import TransactionCreateSerializer
+from .stats import refresh_daily_stats
+from .tasks import process_pending_transactions
+
+
+def make_upload(name="front.jpg", size=(640, 480), image_format="JPEG"):
+    buffer = BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format=image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
 
 class TransaccionTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.client.force_authenticate(user=self.user)
-        self.cliente = Cliente.objects.create(nombre_apellido='Jane Doe', correo_electronico='jane@example.com')
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
 
     def test_create_transaccion(self):
-        data = {'cliente': self.cliente.id, 'imagen_frontside': 'front.jpg', 'imagen_backside': 'back.jpg', 'resultado': True}
-        response = self.client.post('/transactions/', data, format='json')
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg'), 'image_backside': make_upload('back.jpg')}
+        response = self.client.post('/transaction/', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Transaction.objects.get().client, self.cliente)
+
+    def test_create_transaccion_low_resolution(self):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg', size=(100, 100)), 'image_backside': make_upload('back.jpg')}
+        response = self.client.post('/transaction/', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.get().error_code, 2)
+
+    def test_create_transaccion_corrupt_image(self):
+        upload = make_upload('front.png', image_format='PNG')
+        upload = SimpleUploadedFile('front.png', upload.read()[:64])
+        data = {'client': self.cliente.id, 'image_frontside': upload, 'image_backside': make_upload('back.jpg')}
+        response = self.client.post('/transaction/', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image_frontside', response.data)
+
+
+class ProbeImageTests(SimpleTestCase):
+    def test_probe_formats(self):
+        for image_format in ('JPEG', 'PNG', 'BMP'):
+            probe = probe_image(make_upload(size=(321, 247), image_format=image_format))
+            self.assertEqual(probe, (image_format, 321, 247))
+
+    def test_probe_unknown_format(self):
+        self.assertIsNone(probe_image(make_upload('front.gif', image_format='GIF')))
+
+    def test_probe_restores_position(self):
+        upload = make_upload()
+        upload.seek(5)
+        probe_image(upload)
+        self.assertEqual(upload.tell(), 5)
+
+    def test_validate_image_rejects_from_header(self):
+        result = validate_image(None, make_upload(size=(4000, 300)), 4, (224, 224), (3840, 2160))
+        self.assertEqual(result['error_code'], 2)
+
+
+class WorkingImageTests(SimpleTestCase):
+    def test_decodes_upright_once_per_upload(self):
+        # Stored 800x400 with the top half black, rotated 90° clockwise for display.
+        image = Image.new('RGB', (800, 400), 'white')
+        ImageDraw.Draw(image).rectangle([0, 0, 800, 200], fill='black')
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', exif=exif)
+        upload = SimpleUploadedFile('photo.jpg', buffer.getvalue())
+
+        working = decode_working_image(upload, (200, 200))
+        self.assertEqual(working.size, (100, 200))
+        self.assertGreater(working.getpixel((10, 100))[0], 200)
+        self.assertLess(working.getpixel((90, 100))[0], 50)
+        self.assertEqual(upload.tell(), 0)
+        with mock.patch('utils.processing_images.Image.open') as open_image:
+            self.assertIs(decode_working_image(upload, (200, 200)), working)
+            self.assertEqual(decode_working_image(upload, (50, 50)).size, (25, 50))
+        open_image.assert_not_called()
+
+
+class DecodeBudgetTests(APITestCase):
+    def test_budget_waits_then_rejects(self):
+        budget = DecodeBudget(max_bytes=100, timeout=0.01)
+        budget.acquire(60)
+        with self.assertRaises(DecodeBudgetExceeded):
+            budget.acquire(60)
+        releaser = threading.Timer(0.05, budget.release, [60])
+        releaser.start()
+        budget.timeout = 5
+        budget.acquire(60)
+        releaser.join()
+        budget.release(60)
+        # Larger than the whole budget, admitted alone.
+        budget.release(budget.acquire(500))
+        stats = budget.stats()
+        self.assertEqual((stats['admitted'], stats['waited'], stats['rejected']), (3, 2, 1))
+        self.assertEqual((stats['in_use'], stats['peak']), (0, 500))
+        self.assertGreater(stats['wait_seconds'], 0)
+
+    @override_settings(IMAGE_DECODE={'MAX_PIXELS': 1_000_000})
+    def test_pixel_cap_is_checked_before_decoding(self):
+        upload = make_photo((1600, 1200))
+        with self.assertRaises(Image.DecompressionBombError):
+            decode_working_image(upload, (512, 512))
+        self.assertEqual(get_decode_budget().stats()['bombs'], 1)
+        self.assertEqual(get_decode_budget().stats()['admitted'], 0)
+
+    @override_settings(IMAGE_DECODE={'MAX_BYTES': 1, 'TIMEOUT': 0.01}, IMAGE_QUALITY={'ENABLED': True})
+    def test_exhausted_budget_answers_503(self):
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        data = {'client': cliente.id, 'image_frontside': make_photo(), 'image_backside': make_photo()}
+        budget = get_decode_budget()
+        budget.acquire(1)
+        try:
+            response = self.client.post('/transaction/', data, format='multipart')
+        finally:
+            budget.release(1)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Transaction.objects.exists())
+        self.assertGreaterEqual(budget.stats()['rejected'], 1)
+
+
+class MetricsTests(APITestCase):
+    def test_disabled_by_default(self):
+        self.assertIsInstance(stage('parse'), contextlib.nullcontext)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS={'ENABLED': True, 'TOKEN': 'scrape'})
+    def test_stages_and_queries_are_exported(self):
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        data = {'client': cliente.id, 'image_frontside': make_photo(), 'image_backside': make_photo()}
+        self.assertEqual(self.client.post('/transaction/', data, format='multipart').status_code, 201)
+
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        for stage_name in ('parse', 'validate_image', 'storage'):
+            self.assertIn(f'docvalidate_stage_duration_seconds_count{{stage="{stage_name}"}}', body)
+        self.assertIn('docvalidate_requests_total{method="POST",route="^transaction/$",status="201"} 1', body)
+        queries = [line for line in body.splitlines() if line.startswith('docvalidate_request_queries_count{method="POST"')]
+        self.assertEqual(queries, ['docvalidate_request_queries_count{method="POST",route="^transaction/$"} 1'])
+        self.assertNotIn('docvalidate_request_queries_bucket{method="POST",route="^transaction/$",le="0"} 1', body)
+        self.assertIn('docvalidate_image_decode_admitted_total', body)
+
+
+def make_photo(size=(1600, 1200), blur=0, brightness=0, glare=0):
+    # Gaussian noise around mid-gray stands in for a sharp, well exposed photo.
+    image = Image.effect_noise(size, 40).point(lambda value: min(max(value + brightness, 0), 255))
+    if glare:
+        ImageDraw.Draw(image).rectangle([0, 0, size[0] * glare, size[1]], fill=255)
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    buffer = BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=90)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue())
+
+
+@override_settings(IMAGE_QUALITY={'ENABLED': True})
+class ImageQualityTests(APITestCase):
+    def test_quality_error_codes(self):
+        self.assertNotIsInstance(check_image_quality(make_photo()), dict)
+        cases = [
+            (make_photo(blur=8), 7),
+            (make_photo(glare=0.2), 8),
+            (make_photo(brightness=-110), 9),
+            (make_photo(brightness=110), 10),
+        ]
+        for upload, error_code in cases:
+            self.assertEqual(check_image_quality(upload)['error_code'], error_code)
+            self.assertEqual(upload.tell(), 0)
+
+    def test_blurry_upload_is_recorded_as_failed(self):
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        data = {'client': cliente.id, 'image_frontside': make_photo(), 'image_backside': make_photo(blur=8)}
+        response = self.client.post('/transaction/', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.get().error_code, 7)
+
+
+class DuplicateDetectionTests(APITestCase):
+    def test_index_search_matches_linear_scan(self):
+        rng = random.Random(7)
+        index = HashIndex()
+        hashes = {}
+        for pk in range(1, 2001):
+            hashes[pk] = rng.getrandbits(64) - (1 << 63)
+            index.add(pk, pk % 10, hashes[pk], None)
+        query = hashes[42] ^ 0b1011 << 30
+        for max_distance in (0, 3, 6, 11):
+            expected = sorted((hamming_distance(query, value), pk, pk % 10) for pk, value in hashes.items() if hamming_distance(query, value) <= max_distance)
+            self.assertEqual(index.search(query, 'frontside', max_distance), expected)
+        self.assertEqual(index.search(query, 'backside', 6), [])
+
+        path = os.path.join(tempfile.mkdtemp(), 'index.bin')
+        index.watermark = 2000
+        index.save(path)
+        loaded = HashIndex.load(path)
+        self.assertEqual((len(loaded), loaded.watermark), (2000, 2000))
+        self.assertEqual(loaded.search(query, 'frontside', 11), index.search(query, 'frontside', 11))
+        loaded.discard(42)
+        loaded.add(2001, 1, hashes[42], None)
+        self.assertEqual([pk for _, pk, _ in loaded.search(query, 'frontside', 6)], [2001])
+
+    @override_settings(IMAGE_HASHES={'SEEN_BEFORE_CHECK': True})
+    @mock.patch('transactions.duplicates.start_hash_index_updater')
+    def test_lookups_do_not_build_the_index(self, start_hash_index_updater):
+        Transaction.objects.create(client=Client.objects.create(full_name='Jane Doe', email='jane@example.com'), dhash_frontside=1, dhash_backside=2)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_hash_index()), 0)
+        start_hash_index_updater.assert_called_once()
+        update_hash_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_hash_index()), 1)
+
+    @override_settings(IMAGE_HASHES={'SEEN_BEFORE_CHECK': True})
+    @mock.patch('transactions.duplicates.start_hash_index_updater')
+    def test_document_seen_before_from_another_client(self, start_hash_index_updater):
+        first, second = (Client.objects.create(full_name=name, email=f'{name}@example.com') for name in ('jane', 'john'))
+        front, back = make_photo().read(), make_photo().read()
+
+        def post(client):
+            data = {'client': client.id, 'image_frontside': SimpleUploadedFile('front.jpg', front), 'image_backside': SimpleUploadedFile('back.jpg', back)}
+            return self.client.post('/transaction/', data, format='multipart')
+
+        self.assertEqual(post(first).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(post(first).status_code, status.HTTP_201_CREATED)
+        update_hash_index()
+        self.assertEqual(post(second).status_code, status.HTTP_400_BAD_REQUEST)
+        flagged = Transaction.objects.get(client=second)
+        self.assertEqual(flagged.error_code, 11)
+        update_hash_index()
+
+        original = Transaction.objects.filter(client=first).first()
+        response = self.client.get(f'/transaction/{original.id}/matches/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({(match['transaction'], match['side'], match['distance']) for match in response.data if match['client'] == second.id}, {(flagged.id, 'frontside', 0), (flagged.id, 'backside', 0)})
+
+
+class ValidationExecutorTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+
+    def post_pair(self, front_size, back_size, back_format='JPEG'):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg', size=front_size), 'image_backside': make_upload('back.' + back_format.lower(), size=back_size, image_format=back_format)}
+        return self.client.post('/transaction/', data, format='multipart')
+
+    def test_frontside_error_reported_first(self):
+        for mode in ('sync', 'thread', 'process'):
+            with self.subTest(mode=mode), override_settings(VALIDATION_EXECUTOR={'MODE': mode, 'MAX_WORKERS': 2}):
+                response = self.post_pair((100, 100), (640, 480), back_format='GIF')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(Transaction.objects.latest('id').error_code, 2)
+
+    def test_process_mode_accepts_valid_pair(self):
+        with override_settings(VALIDATION_EXECUTOR={'MODE': 'process', 'MAX_WORKERS': 2}):
+            response = self.post_pair((640, 480), (640, 480))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_full_queue_runs_inline(self):
+        executor = ValidationExecutor(mode='thread', max_workers=1, max_queue=0, queue_timeout=0)
+        blocker = threading.Event()
+        executor.submit(blocker.wait)
+        self.assertEqual(executor.submit(threading.get_ident).result(), threading.get_ident())
+        blocker.set()
+        executor.shutdown()
+
+
+@override_settings(ASYNC_VALIDATION={'IN_PROCESS': False})
+class AsyncValidationTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+
+    def post_async(self, front_size):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg', size=front_size), 'image_backside': make_upload('back.jpg')}
+        return self.client.post('/transaction/?async=true', data, format='multipart')
+
+    def test_create_returns_accepted_and_worker_validates(self):
+        response = self.post_async((640, 480))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(process_pending_transactions(), 1)
+        response = self.client.get(f"/transaction/{response.data['id']}/")
+        self.assertEqual(response.data['status'], 'done')
+        self.assertTrue(response.data['result'])
+
+    def test_worker_records_validation_error(self):
+        response = self.post_async((100, 100))
+        process_pending_transactions()
+        transaction = Transaction.objects.get(pk=response.data['id'])
+        self.assertFalse(transaction.result)
+        self.assertEqual(transaction.error_code, 2)
+
+    def test_storage_errors_leave_the_transaction_to_retry(self):
+        response = self.post_async((640, 480))
+        failing_read = property(lambda file: mock.Mock(side_effect=OSError('storage unavailable')))
+        with mock.patch.object(FieldFile, 'read', failing_read, create=True), self.assertLogs('transactions.tasks'):
+            process_pending_transactions()
+        transaction = Transaction.objects.get(pk=response.data['id'])
+        self.assertEqual(transaction.status, Transaction.Status.PROCESSING)
+        self.assertIsNone(transaction.error_code)
+
+    @override_settings(ASYNC_VALIDATION={'CLAIM_TIMEOUT': 0, 'MAX_ATTEMPTS': 2})
+    def test_transaction_is_given_up_after_max_attempts(self):
+        response = self.post_async((640, 480))
+        failing_read = property(lambda file: mock.Mock(side_effect=OSError('storage unavailable')))
+        with mock.patch.object(FieldFile, 'read', failing_read, create=True), self.assertLogs('transactions.tasks'):
+            self.assertEqual(process_pending_transactions(), 1)
+            self.assertEqual(Transaction.objects.get().attempts, 1)
+            self.assertEqual(process_pending_transactions(), 1)
+        transaction = Transaction.objects.get(pk=response.data['id'])
+        self.assertEqual((transaction.status, transaction.result, transaction.error_code), (Transaction.Status.DONE, False, 12))
+        self.assertEqual(process_pending_transactions(), 0)
+
+    def test_worker_pool_starts_with_the_app_when_configured(self):
+        config = apps.get_app_config('transactions')
+        with mock.patch('transactions.tasks.get_worker_pool') as get_worker_pool:
+            config.ready()
+            get_worker_pool.assert_not_called()
+            with override_settings(ASYNC_VALIDATION={'AUTOSTART': True}):
+                config.ready()
+            get_worker_pool.assert_called_once()
+
+    def test_sync_override(self):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg'), 'image_backside': make_upload('back.jpg')}
+        with override_settings(ASYNC_VALIDATION={'ENABLED': True, 'IN_PROCESS': False}):
+            response = self.client.post('/transaction/?async=false', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class Base64UploadTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+
+    def encode(self, upload, data_uri=False):
+        encoded = base64.b64encode(upload.read()).decode()
+        return f'data:image/jpeg;base64,{encoded}' if data_uri else encoded
+
+    def test_create_from_json_base64(self):
+        data = {'client': self.cliente.id, 'image_frontside': self.encode(make_upload()), 'image_backside': self.encode(make_upload(), data_uri=True)}
+        response = self.client.post('/transaction/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Transaction.objects.get().image_frontside.name.endswith('.jpg'))
+
+    def test_escaped_slashes_and_line_breaks(self):
+        encoded = base64.encodebytes(make_upload().read()).decode()
+        body = json.dumps({'client': self.cliente.id, 'image_frontside': encoded, 'image_backside': encoded}).replace('/', '\\/')
+        response = self.client.post('/transaction/', body, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_oversized_image_is_truncated_while_decoding(self):
+        decoder = Base64ImageDecoder('image_frontside', max_size_mb=1)
+        encoded = base64.b64encode(b'\xff\xd8' + bytes(3 * 1024 * 1024)).decode()
+        for start in range(0, len(encoded), 1000):
+            decoder.feed(encoded[start:start + 1000].encode())
+        upload = decoder.close()
+        self.assertGreater(upload.size, 3 * 1024 * 1024)
+        self.assertLessEqual(len(upload.read()), 1024 * 1024)
+
+    def test_oversized_image_records_size_error(self):
+        encoded = base64.b64encode(make_upload().read() + bytes(5 * 1024 * 1024)).decode()
+        data = {'client': self.cliente.id, 'image_frontside': encoded, 'image_backside': self.encode(make_upload())}
+        response = self.client.post('/transaction/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.get().error_code, 1)
+
+    def test_invalid_base64(self):
+        data = {'client': self.cliente.id, 'image_frontside': 'abcde', 'image_backside': self.encode(make_upload())}
+        response = self.client.post('/transaction/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(VALIDATION_CACHE={'MAX_ENTRIES': 16, 'TTL': 60})
+class DeduplicationTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        self.front = make_upload('front.jpg', size=(640, 480)).read()
+        self.back = make_upload('back.jpg', size=(800, 600)).read()
+
+    def post_pair(self):
+        data = {'client': self.cliente.id, 'image_frontside': SimpleUploadedFile('front.jpg', self.front), 'image_backside': SimpleUploadedFile('back.jpg', self.back)}
+        return self.client.post('/transaction/', data, format='multipart')
+
+    def test_resubmission_shares_stored_files(self):
+        self.post_pair()
+        self.post_pair()
+        first, second = Transaction.objects.order_by('id')
+        self.assertEqual(first.image_frontside.name, second.image_frontside.name)
+        self.assertNotEqual(first.image_frontside.name, first.image_backside.name)
+        digest = hashlib.sha256(self.front).hexdigest()
+        self.assertEqual(first.image_frontside.name, f"transaction_images/{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+
+    def test_resubmission_skips_validation(self):
+        self.post_pair()
+        with mock.patch('utils.processing_images.validate_image') as validate, mock.patch.object(ProbedImageField, '_clean') as clean:
+            response = self.post_pair()
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Transaccion.objects.count(), 1)
-        self.assertEqual(Transaccion.objects.get().cliente, self.cliente)
\ No newline at end of file
+        validate.assert_not_called()
+        clean.assert_not_called()
+
+    def test_lru_cache_expiry_and_eviction(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('d', 4, ttl=0)
+        self.assertIsNone(cache.get('d'))
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+
+    def post_pair(self, key, front_size=(640, 480)):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg', size=front_size), 'image_backside': make_upload('back.jpg')}
+        return self.client.post('/transaction/', data, format='multipart', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response(self):
+        first = self.post_pair('key-1')
+        with mock.patch.object(TransactionCreateSerializer, 'is_valid') as is_valid:
+            second = self.post_pair('key-1')
+        is_valid.assert_not_called()
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_failure_rows_are_not_duplicated(self):
+        first = self.post_pair('key-2', front_size=(100, 100))
+        second = self.post_pair('key-2', front_size=(100, 100))
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.filter(result=False).count(), 1)
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='alice', password='testpass'))
+        first = self.post_pair('shared-key')
+        self.client.force_authenticate(user=User.objects.create_user(username='mallory', password='testpass'))
+        second = self.post_pair('shared-key')
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.filter(key='shared-key').count(), 2)
+
+    def test_expired_key_runs_again(self):
+        self.post_pair('key-3')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.post_pair('key-3')
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(purge_expired_keys(), 0)
+
+
+class BulkTransactionTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+
+    def encode(self, size=(640, 480)):
+        return base64.b64encode(make_upload(size=size).read()).decode()
+
+    def test_ndjson_items_return_per_item_results(self):
+        items = [
+            {'client': self.cliente.id, 'image_frontside': self.encode(), 'image_backside': self.encode()},
+            {'client': self.cliente.id, 'image_frontside': self.encode((100, 100)), 'image_backside': self.encode()},
+            {'client': 999, 'image_frontside': self.encode(), 'image_backside': self.encode()},
+        ]
+        body = '\n'.join(json.dumps(item) for item in items)
+        # Savepoint, one client lookup, one INSERT, release.
+        with self.assertNumQueries(4):
+            response = self.client.post('/transactions/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertTrue(results[0]['result'])
+        self.assertEqual(results[1]['error_code'], 2)
+        self.assertIsNone(results[2]['id'])
+        self.assertIn('client', results[2]['errors'])
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_multipart_pairs_by_position(self):
+        data = {'client': self.cliente.id, 'image_frontside': [make_upload('f1.jpg'), make_upload('f2.jpg')], 'image_backside': [make_upload('b1.jpg'), make_upload('b2.jpg')]}
+        response = self.client.post('/transactions/bulk/', data, format='multipart')
+        self.assertEqual([item['result'] for item in response.json()], [True, True])
+
+    @override_settings(IMAGE_HASHES={'SEEN_BEFORE_CHECK': True})
+    @mock.patch('transactions.duplicates.start_hash_index_updater')
+    def test_seen_before_runs_on_the_request_thread(self, start_hash_index_updater):
+        other = Client.objects.create(full_name='John Doe', email='john@example.com')
+        front, back = (base64.b64encode(make_photo().read()).decode() for _ in range(2))
+
+        def post(client):
+            body = json.dumps({'client': client.id, 'image_frontside': front, 'image_backside': back})
+            return self.client.post('/transactions/bulk/', body, content_type='application/x-ndjson')
+
+        threads = []
+
+        def check(*args):
+            threads.append(threading.current_thread())
+            return check_seen_before(*args)
+
+        with mock.patch('transactions.serializers.check_seen_before', side_effect=check):
+            self.assertTrue(post(self.cliente).json()[0]['result'])
+            update_hash_index()
+            self.assertEqual(post(other).json()[0]['error_code'], 11)
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+    def test_malformed_ndjson_rolls_back(self):
+        body = json.dumps({'client': self.cliente.id, 'image_frontside': self.encode(), 'image_backside': self.encode()}) + '\n{"client": '
+        response = self.client.post('/transactions/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+
+@mock.patch('utils.viewsets.KeysetPagination.page_size', 2)
+class TransactionPaginationTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        Transaction.objects.bulk_create(
+            Transaction(client=self.cliente, image_frontside='a.jpg', image_backside='b.jpg') for _ in range(5)
+        )
+        # Two rows share a timestamp so the id tie-breaker is exercised.
+        self.ids = list(Transaction.objects.order_by('id').values_list('id', flat=True))
+        Transaction.objects.filter(id__in=self.ids[1:3]).update(creation_date=timezone.now())
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            last_url, url = url, response.data[link]
+        return ids, last_url
+
+    def test_keyset_pages_forward_and_back(self):
+        expected = list(Transaction.objects.order_by('-creation_date', '-id').values_list('id', flat=True))
+        forward, last_url = self.walk('/transactions/', 'next')
+        self.assertEqual(forward, expected)
+        response = self.client.get(last_url)
+        backward, _ = self.walk(response.data['previous'], 'previous')
+        self.assertEqual(sorted(backward), sorted(expected[:4]))
+
+    def test_page_number_shape_still_available(self):
+        response = self.client.get('/transactions/', {'page': 1})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['current_page'], 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/transactions/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TransactionQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def create_rows(self, count):
+        for _ in range(count):
+            cliente = Client.objects.create(full_name='Jane Doe', email=f'jane{Client.objects.count()}@example.com')
+            Transaction.objects.create(client=cliente, image_frontside='a.jpg', image_backside='b.jpg')
+
+    def test_list_has_no_n_plus_one(self):
+        self.assertEqual(self.assertQueryCountIndependentOfRows('/transactions/', self.create_rows), 1)
+
+    def test_retrieve_selects_client(self):
+        self.create_rows(1)
+        url = f'/transaction/{Transaction.objects.get().id}/'
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['client']['full_name'], 'Jane Doe')
+
+
+class TransactionFilterStatsTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        other = Client.objects.create(full_name='John Doe', email='john@example.com')
+        rows = [(self.cliente, True, None), (self.cliente, False, 2), (self.cliente, False, 2), (other, False, 3)]
+        Transaction.objects.bulk_create(
+            Transaction(client=client, result=result, error_code=error_code, image_frontside='a.jpg', image_backside='b.jpg')
+            for client, result, error_code in rows
+        )
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        Transaction.objects.filter(client=other).update(creation_date=yesterday)
+        self.today = timezone.localdate().isoformat()
+
+    def list_ids(self, **params):
+        response = self.client.get('/transactions/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(response.data['results'])
+
+    def test_filters(self):
+        self.assertEqual(self.list_ids(client=self.cliente.id), 3)
+        self.assertEqual(self.list_ids(result='false'), 3)
+        self.assertEqual(self.list_ids(error_code=2), 2)
+        self.assertEqual(self.list_ids(created_after=self.today), 3)
+        self.assertEqual(self.list_ids(created_before=self.today), 4)
+        self.assertEqual(self.client.get('/transactions/', {'created_after': 'soon'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stats_live_and_rollup_agree(self):
+        live = self.client.get('/transactions/stats/', {'source': 'live'}).data
+        self.assertEqual((live['total'], live['rejected']), (4, 3))
+        self.assertEqual(live['by_error_code'], [{'error_code': 2, 'count': 2}, {'error_code': 3, 'count': 1}])
+        self.assertEqual([day['total'] for day in live['by_day']], [1, 3])
+        self.assertEqual(refresh_daily_stats(), 3)
+        rollup = self.client.get('/transactions/stats/', {'source': 'rollup'}).data
+        self.assertEqual({**rollup, 'source': 'live'}, live)
+        filtered = self.client.get('/transactions/stats/', {'source': 'rollup', 'client': self.cliente.id}).data
+        self.assertEqual((filtered['total'], filtered['rejected']), (3, 2))
+
+    def test_refresh_recent_days_keeps_older_rows(self):
+        refresh_daily_stats()
+        Transaction.objects.all().delete()
+        refresh_daily_stats(days=1)
+        self.assertEqual(TransactionDailyStats.objects.get().count, 1)
+
+
+class LocalS3Client:
+    """
+    In-memory stand-in for the subset of the boto3 S3 client used by the storage.
+    """
+
+    class NotFound(Exception):
+        response = {'Error': {'Code': '404'}}
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[(bucket, key)] = fileobj.read()
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound()
+        return {'ContentLength': len(self.objects[(Bucket, Key)]), 'LastModified': timezone.now()}
+
+    def get_object(self, Bucket, Key):
+        self.head_object(Bucket, Key)
+        return {'Body': BytesIO(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+class ShardedStorageTests(APITestCase):
+    def test_filesystem_layout_and_atomic_write(self):
+        storage = ContentAddressedStorage(fsync='always')
+        content = b'front side'
+        digest = hashlib.sha256(content).hexdigest()
+        name = storage.save('transaction_images/front.JPG', ContentFile(content))
+        self.assertEqual(name, f'transaction_images/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertTrue(storage.is_content_name(name))
+        self.assertFalse(storage.is_content_name('transaction_images/front.jpg'))
+        self.assertEqual(storage.listdir(f'transaction_images/{digest[:2]}/{digest[2:4]}')[1], [f'{digest}.jpg'])
+        with mock.patch.object(ContentAddressedStorage, '_save') as save:
+            self.assertEqual(storage.save('transaction_images/again.jpg', ContentFile(content)), name)
+        save.assert_not_called()
+        storage.delete(name)
+
+    def test_s3_mode_with_fallback(self):
+        legacy = FileSystemStorage()
+        legacy_name = legacy.save('transaction_images/legacy.jpg', ContentFile(b'legacy'))
+        with override_settings(STORAGES={**settings.STORAGES, 'legacy': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}}):
+            storage = S3ContentAddressedStorage(bucket_name='images', prefix='media', client=LocalS3Client(), base_url='https://cdn.test/', fallback='legacy')
+            name = storage.save('transaction_images/front.jpg', ContentFile(b'front side'))
+            self.assertTrue(storage.exists(name))
+            self.assertEqual(storage.size(name), 10)
+            with storage.open(name) as stored:
+                self.assertEqual(stored.read(), b'front side')
+            self.assertEqual(storage.url(name), f'https://cdn.test/media/{name}')
+            with storage.open(legacy_name) as stored:
+                self.assertEqual(stored.read(), b'legacy')
+            self.assertFalse(storage.exists('transaction_images/missing.jpg'))
+        legacy.delete(legacy_name)
+
+    def test_rehome_command(self):
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        old_name = FileSystemStorage().save('transaction_images/flat.jpg', ContentFile(b'flat image'))
+        Transaction.objects.bulk_create(
+            Transaction(client=cliente, image_frontside=old_name, image_backside=old_name) for _ in range(2)
+        )
+        call_command('rehome_transaction_images', '--delete-old', stdout=StringIO())
+        names = set(Transaction.objects.values_list('image_frontside', 'image_backside'))
+        self.assertEqual(len(names), 1)
+        new_name = names.pop()[0]
+        storage = get_transaction_image_storage()
+        self.assertTrue(storage.is_content_name(new_name))
+        self.assertFalse(storage.exists(old_name))
+        with storage.open(new_name) as stored:
+            self.assertEqual(stored.read(), b'flat image')
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        cold = {'BACKEND': 'utils.storage.ContentAddressedStorage', 'OPTIONS': {'location': tempfile.mkdtemp()}}
+        override = override_settings(STORAGES={**settings.STORAGES, 'transaction_images_cold': cold})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_archive_then_move_originals_to_cold_storage(self):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg', size=(2400, 1800)), 'image_backside': make_upload('back.png', size=(2000, 1500), image_format='PNG')}
+        self.assertEqual(self.client.post('/transaction/', data, format='multipart').status_code, status.HTTP_201_CREATED)
+        # Rejected uploads have nothing to archive and are not retried.
+        Transaction.objects.create(client=self.cliente, result=False, error_code=3)
+        with mock.patch('transactions.archive.archive_transaction', wraps=archive_transaction) as archive:
+            self.assertEqual(archive_pending_transactions(), 1)
+        archive.assert_called_once()
+        transaction = Transaction.objects.get(result=True)
+        with transaction.archive_frontside.open('rb') as archive, Image.open(archive) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (1600, 1200)))
+        self.assertTrue(transaction.archive_backside.name.endswith('.webp'))
+
+        self.assertEqual(move_originals_to_cold_storage(days=30), 0)
+        Transaction.objects.update(creation_date=timezone.now() - timezone.timedelta(days=31))
+        self.assertEqual(move_originals_to_cold_storage(days=30), 1)
+        transaction.refresh_from_db()
+        self.assertIsNotNone(transaction.originals_archived_at)
+        storage = get_transaction_image_storage()
+        self.assertFalse(storage.stored(transaction.image_frontside.name))
+        with transaction.image_frontside.open('rb') as original, Image.open(original) as image:
+            self.assertEqual(image.size, (2400, 1800))
+
+
+class ThumbnailTests(APITestCase):
+    def setUp(self):
+        override = override_settings(THUMBNAILS={'ROOT': tempfile.mkdtemp(), 'MAX_BYTES': 10 ** 6, 'SIZES': {'small': 160}})
+        override.enable()
+        self.addCleanup(override.disable)
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        data = {'client': cliente.id, 'image_frontside': make_upload('front.jpg', size=(1280, 960)), 'image_backside': make_upload('back.jpg')}
+        self.client.post('/transaction/', data, format='multipart')
+        self.transaction_id = Transaction.objects.get().id
+
+    def test_serializer_exposes_thumbnail_urls(self):
+        response = self.client.get(f'/transaction/{self.transaction_id}/')
+        self.assertEqual(
+            response.data['thumbnails']['frontside'],
+            {'small': f'http://testserver/transaction/{self.transaction_id}/thumbnail/frontside/small/'},
+        )
+
+    def test_thumbnail_is_cached_and_revalidated(self):
+        url = f'/transaction/{self.transaction_id}/thumbnail/frontside/small/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (160, 120))
+        response.close()
+        with mock.patch('transactions.viewsets.render_thumbnail') as render:
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        render.assert_not_called()
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(f'/transaction/{self.transaction_id}/thumbnail/frontside/huge/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_thumbnail_evicted_before_opening_is_rendered_again(self):
+        url = f'/transaction/{self.transaction_id}/thumbnail/frontside/small/'
+        get_or_create = ThumbnailCache.get_or_create
+        calls = []
+
+        def evicted_once(cache, key, render):
+            path = get_or_create(cache, key, render)
+            if not calls:
+                os.remove(path)
+            calls.append(path)
+            return path
+
+        with mock.patch.object(ThumbnailCache, 'get_or_create', evicted_once):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(calls), 2)
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (160, 120))
+        response.close()
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ThumbnailCache(tempfile.mkdtemp(), max_bytes=250)
+        first = cache.get_or_create('aa01', lambda: b'x' * 100)
+        second = cache.get_or_create('bb02', lambda: b'x' * 100)
+        os.utime(second, (1, 1))
+        os.utime(first, (2, 2))
+        cache.get_or_create('cc03', lambda: b'x' * 100)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+
+
+@override_settings(
+    ASGI_VIEWS={'ENABLED': True, 'THREADS': 0},
+    MIDDLEWARE=[
+        'utils.middleware.Inline' + path.rpartition('.')[2] if path.startswith('django.') else path
+        for path in settings.MIDDLEWARE
+    ],
+)
+class TransactionAsyncViewTests(APITestCase):
+    def setUp(self):
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        self.factory = AsyncRequestFactory()
+        self.view = TransactionAsyncView.as_view()
+
+    async def test_create_and_retrieve(self):
+        data = {'client': self.cliente.id, 'image_frontside': make_upload('front.jpg'), 'image_backside': make_upload('back.jpg')}
+        response = await self.view(self.factory.post('/transaction/', data))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        transaction = await Transaction.objects.aget()
+        response = await self.view(self.factory.get(f'/transaction/{transaction.id}/'), pk=str(transaction.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sync_response = await self.async_client.get(f'/transaction/{transaction.id}/')
+        self.assertEqual(response.content, sync_response.content)
+        # Served through the inline middleware.
+        self.assertEqual(sync_response['X-Frame-Options'], 'DENY')
+
+    async def test_retrieve_errors(self):
+        response = await self.view(self.factory.get('/transaction/999/'), pk='999')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content), {'detail': 'Not found.'})
+        response = await self.view(self.factory.get('/transaction/1/', headers={'Authorization': 'Bearer invalid'}), pk='1')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuses_returned_connections(self):
+        pool = self.make_pool(max_size=2)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual((pool.stats['connects'], pool.stats['reuses'], pool.size), (1, 1, 1))
+
+    def test_waits_for_a_connection_then_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        threading.Timer(0.01, pool.putconn, args=[connection]).start()
+        pool.timeout = 5
+        self.assertIs(pool.getconn(), connection)
+
+    def test_discards_unhealthy_and_unresettable_connections(self):
+        healthy = {'value': True}
+        pool = self.make_pool(check=lambda connection: healthy['value'], reset=lambda connection: True, check_after=0)
+        first = pool.getconn()
+        pool.putconn(first)
+        healthy['value'] = False
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+        pool.reset = lambda connection: False
+        pool.putconn(second)
+        self.assertEqual((pool.size, pool.stats['discarded']), (0, 2))
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica'], 'PIN_SECONDS': 5})
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        self.seen = []
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+
+    def view(self, request):
+        self.seen.append((router.db_for_read(Transaction), router.db_for_write(Transaction)))
+        return HttpResponse()
+
+    def route(self, request):
+        return self.middleware(request), self.seen.pop()
+
+    def test_reads_of_safe_requests_go_to_the_replica_until_the_client_writes(self):
+        factory = RequestFactory()
+        self.assertEqual(self.route(factory.get('/'))[1], ('replica', 'default'))
+        response, routes = self.route(factory.post('/'))
+        self.assertEqual(routes, ('default', 'default'))
+        factory.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.route(factory.get('/'))[1], ('default', 'default'))
+        header = RequestFactory(headers={'DB-Pinned-Until': response['DB-Pinned-Until']})
+        self.assertEqual(self.route(header.get('/'))[1], ('default', 'default'))
+        too_far = RequestFactory(headers={'DB-Pinned-Until': str(time.time() + 3600)})
+        self.assertEqual(self.route(too_far.get('/'))[1], ('replica', 'default'))
+
+    def test_create_stays_on_the_primary(self):
+        # No "replica" database exists, any read routed there would fail.
+        cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        data = {'client': cliente.id, 'image_frontside': make_upload('front.jpg', size=(100, 100)), 'image_backside': make_upload('back.jpg')}
+        response = self.client.post('/transaction/', data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.get().error_code, 2)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        self.cliente = Client.objects.create(full_name='Jane Doe', email='jane@example.com')
+        self.transaction = Transaction.objects.create(client=self.cliente)
+        self.url = f'/transaction/{self.transaction.id}/'
+
+    def test_retrieve_is_cached_and_revalidated_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual((cached.json(), cached['ETag']), (response.json(), etag))
+        not_modified = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/transaction/0{self.transaction.id}/')['ETag'], etag)
+
+    def test_saves_invalidate_the_transaction_and_the_client_it_embeds(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.get(f'/client/{self.cliente.id}/')
+        self.cliente.full_name = 'John Doe'
+        self.cliente.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['client']['full_name'], 'John Doe')
+        self.assertEqual(self.client.get(f'/client/{self.cliente.id}/').json()['full_name'], 'John Doe')
+        Transaction.objects.filter(pk=self.transaction.pk).update(details='stale')
+        self.assertIsNone(self.client.get(self.url).json()['details'])
+        self.transaction.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        # One client edit bumps one generation, whatever its number of transactions.
+        Transaction.objects.create(client=self.cliente)
+        with self.assertNumQueries(1):
+            self.cliente.save()
+
+
+class ReadPlanTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='testuser', password='testpass'))
+        self.cliente = Client.objects.create(full_name='Zoë\u2028"Doe"', email='zoe@example.com')
+        other = Client.objects.create(full_name='Jane Doe', email='jane@example.com', phone='5551234567')
+        Transaction.objects.create(client=self.cliente, image_frontside='a.jpg', image_backside='b.jpg')
+        Transaction.objects.create(
+            client=other, image_frontside='c.jpg', result=False, error_code=3, details='Blurry',
+            status=Transaction.Status.PROCESSING, claimed_at=timezone.now(),
+        )
+
+    def test_pages_are_byte_identical_to_the_serializers(self):
+        for url in ('/transactions/', '/transactions/?page=1', '/clients/?page=1'):
+            with override_settings(READ_PLANS={'ENABLED': False}):
+                expected = self.client.get(url)
+            with self.assertNumQueries(1 if url == '/transactions/' else 2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
@@ -1,6 +1,6 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework import routers
-from . import viewsets
+from . import async_views, viewsets
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -12,5 +12,12 @@ router.register(r"transaction", viewsets.TransactionDetailView, basename="transa
 
 urlpatterns = [path("", include(router.urls))]
 
+if getattr(settings, "ASGI_VIEWS", {}).get("ENABLED"):
+    # Shadow the create/detail routes of the router with their async versions.
+    urlpatterns = [
+        path("transaction/", async_views.TransactionAsyncView.as_view()),
+        re_path(r"^transaction/(?P<pk>[^/.]+)/$", async_views.TransactionAsyncView.as_view()),
+    ] + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
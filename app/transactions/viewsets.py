@@ -1,11 +1,31 @@
-from rest_framework import mixins
+import os
+from django.db import transaction as db_transaction
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Transaction
-from .serializers import TransactionSerializer, TransactionCreateSerializer
-from utils.viewsets import BaseViewSet
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from clients.models import Client
+from .bulk import create_transactions_in_bulk
+from .duplicates import find_matches
+from .filters import TransactionFilterBackend
+from .idempotency import idempotent
+from .models import Transaction, TransactionDailyStats
+from .serializers import IMAGE_LIMITS, TransactionSerializer, TransactionCreateSerializer
+from .stats import compute_rollup_stats, compute_stats, filter_rollup, get_stats_settings
+from .tasks import enqueue_transaction, get_async_settings
+from utils.response_cache import CachedRetrieveMixin
+from utils.parsers import Base64StreamingJSONParser, NDJSONParser
+from utils.thumbnails import get_thumbnail_cache, get_thumbnail_settings, render_thumbnail, thumbnail_key
+from utils.viewsets import BaseViewSet, KeysetPagination, ReadPlanListMixin
 
 
-class TransactionListCreateView(mixins.ListModelMixin, BaseViewSet):
+class TransactionListCreateView(ReadPlanListMixin, mixins.ListModelMixin, BaseViewSet):
     """
     View for listing and creating transactions.
     """
@@ -13,9 +33,79 @@ class TransactionListCreateView(mixins.ListModelMixin, BaseViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [AllowAny]
+    authentication_mode = "token"
+    pagination_class = KeysetPagination
+    select_related = {"list": ("client",)}
+    filter_backends = (TransactionFilterBackend,)
+    base64_file_fields = ("image_frontside", "image_backside")
+    base64_max_size_mb = IMAGE_LIMITS["max_size_mb"]
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        parser_classes=[NDJSONParser, MultiPartParser, JSONParser],
+    )
+    def bulk(self, request, *args, **kwargs):
+        """
+        Creates many transactions in one request.
+
+        Accepts NDJSON (one ``{"client", "image_frontside", "image_backside"}``
+        object per line, images base64-encoded), a JSON array of such objects, or
+        multipart with repeated ``image_frontside``/``image_backside`` files paired
+        by position and one ``client`` per pair (or a single one for all).
+        Returns one result per item, in order; the request is atomic.
+        """
+        with db_transaction.atomic():
+            results = create_transactions_in_bulk(self.get_bulk_items(request))
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="stats", pagination_class=None)
+    def stats(self, request, *args, **kwargs):
+        """
+        Returns the number of transactions per error code and per day.
+
+        Accepts the same filters as the list. ``?source=rollup`` reads the
+        TransactionDailyStats table (day granularity, as fresh as the last
+        ``refresh_transaction_stats`` run) and ``?source=live`` the transactions;
+        the default follows ``TRANSACTION_STATS["USE_ROLLUP"]``.
+        """
+        source = request.query_params.get("source")
+        if source is None:
+            source = "rollup" if get_stats_settings()["USE_ROLLUP"] else "live"
+        if source == "rollup":
+            filters = TransactionFilterBackend().get_filters(request)
+            data = compute_rollup_stats(filter_rollup(TransactionDailyStats.objects.all(), filters))
+        elif source == "live":
+            data = compute_stats(self.filter_queryset(Transaction.objects.all()))
+        else:
+            raise ValidationError({"source": ['Must be "live" or "rollup".']})
+        return Response({"source": source, **data}, status=status.HTTP_200_OK)
+
+    def get_bulk_items(self, request):
+        """
+        Returns an iterable of item dicts from the parsed bulk request body.
+        """
+        data = request.data
+        if not hasattr(data, "getlist"):
+            return data
+        fronts = data.getlist("image_frontside")
+        backs = data.getlist("image_backside")
+        clients = data.getlist("client")
+        if len(clients) == 1:
+            clients = clients * max(len(fronts), len(backs))
+        return [
+            {
+                "client": clients[index] if index < len(clients) else None,
+                "image_frontside": fronts[index] if index < len(fronts) else None,
+                "image_backside": backs[index] if index < len(backs) else None,
+            }
+            for index in range(max(len(fronts), len(backs)))
+        ]
 
 
 class TransactionDetailView(
+    CachedRetrieveMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -24,11 +114,18 @@ class TransactionDetailView(
 ):
     """
     View for retrieving, updating, and deleting a single transaction.
+    Retrieves are served from the response cache.
     """
 
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [AllowAny]
+    authentication_mode = "token"
+    select_related = {"retrieve": ("client",)}
+    cache_embeds = ((Client, "client"),)
+    parser_classes = [Base64StreamingJSONParser, FormParser, MultiPartParser]
+    base64_file_fields = ("image_frontside", "image_backside")
+    base64_max_size_mb = IMAGE_LIMITS["max_size_mb"]
 
     def get_serializer_class(self):
         """
@@ -40,8 +137,105 @@ class TransactionDetailView(
             return TransactionCreateSerializer
         return TransactionSerializer
 
+    def is_async(self):
+        """
+        Whether the images of this request are validated in the background.
+
+        The ``async`` query parameter ("true"/"false") overrides the
+        ``ASYNC_VALIDATION["ENABLED"]`` setting.
+        """
+        value = self.request.query_params.get("async")
+        if value is None:
+            return get_async_settings()["ENABLED"]
+        return value.lower() in ("1", "true", "yes")
+
+    def get_serializer_context(self):
+        """
+        Adds the ``async_validation`` flag used by TransactionCreateSerializer.
+        """
+        context = super().get_serializer_context()
+        context["async_validation"] = self.request.method == "POST" and self.is_async()
+        return context
+
     def post(self, request, *args, **kwargs):
         """
         Handles POST requests and creates a new transaction.
         """
-        return self.create(request, *args, **kwargs)
\ No newline at end of file
+        return self.create(request, *args, **kwargs)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """
+        Creates a transaction. In async mode the images are stored, the
+        transaction is queued for validation and 202 is returned; poll
+        GET /transaction/{id}/ until its status is "done".
+
+        Retries sent with the same ``Idempotency-Key`` header replay the
+        first response.
+        """
+        if not self.is_async():
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        transaction = serializer.save(status=Transaction.Status.PENDING)
+        enqueue_transaction(transaction)
+        return Response(
+            {"id": transaction.id, "status": transaction.status},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": reverse("transaction-detail", args=[transaction.id], request=request)},
+        )
+
+    @action(detail=True, methods=["get"])
+    def matches(self, request, pk=None):
+        """
+        Returns the transactions whose images are near-duplicates of this one's,
+        e.g. the same ID card submitted by another client.
+
+        Each match has the ``transaction`` and ``client`` ids, the matching
+        ``side`` and the Hamming ``distance`` of the perceptual hashes, at most
+        ``IMAGE_HASHES["MAX_DISTANCE"]`` bits, closest first.
+        """
+        return Response(find_matches(self.get_object()))
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"thumbnail/(?P<side>frontside|backside)/(?P<size>[a-z]+)",
+    )
+    def thumbnail(self, request, pk=None, side=None, size=None):
+        """
+        Returns a JPEG thumbnail of one side of the transaction.
+
+        ``size`` is one of the ``THUMBNAILS["SIZES"]`` names. Thumbnails are
+        rendered on the first request and cached on disk; responses carry an
+        ETag and Last-Modified so clients revalidate with a 304.
+        """
+        config = get_thumbnail_settings()
+        if size not in config["SIZES"]:
+            raise NotFound("Unknown thumbnail size.")
+        image = getattr(self.get_object(), f"image_{side}")
+        if not image:
+            raise NotFound("The transaction has no such image.")
+        key = thumbnail_key(image.name, config["SIZES"][size], config["QUALITY"])
+
+        def render():
+            with image.open("rb"):
+                return render_thumbnail(image, config["SIZES"][size], config["QUALITY"])
+
+        cache = get_thumbnail_cache()
+        try:
+            thumbnail = open(cache.get_or_create(key, render), "rb")
+        except FileNotFoundError:
+            # Evicted by another process since get_or_create, render it again.
+            thumbnail = open(cache.get_or_create(key, render), "rb")
+        etag = quote_etag(key)
+        last_modified = int(os.fstat(thumbnail.fileno()).st_mtime)
+        headers = {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": "private, no-cache"}
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = FileResponse(thumbnail, content_type="image/jpeg")
+        else:
+            thumbnail.close()
+        for header, value in headers.items():
+            response[header] = value
+        return response
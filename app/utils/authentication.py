@@ -0,0 +1,189 @@
+import copy
+import hmac
+import threading
+import time
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from utils.cache import LRUCache
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Get the process-wide cache of verified tokens configured by ``JWT_VERIFICATION_CACHE``.
+
+    Returns:
+        LRUCache: The shared cache.
+    """
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                config = getattr(settings, "JWT_VERIFICATION_CACHE", {})
+                _token_cache = LRUCache(max_entries=config.get("MAX_ENTRIES", 10000))
+    return _token_cache
+
+
+def get_user_cache():
+    """
+    Get the process-wide cache of authenticated users configured by ``JWT_USER_CACHE``.
+
+    Returns:
+        LRUCache: The shared cache, keyed by the ``USER_ID_CLAIM`` value.
+    """
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                config = getattr(settings, "JWT_USER_CACHE", {})
+                _user_cache = LRUCache(max_entries=config.get("MAX_ENTRIES", 10000), ttl=config.get("TTL", 300))
+    return _user_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    """
+    Drop the verified tokens and cached users when ``SIMPLE_JWT``,
+    ``JWT_VERIFICATION_CACHE`` or ``JWT_USER_CACHE`` is overridden in tests.
+    """
+    global _token_cache, _user_cache
+    if setting in ("SIMPLE_JWT", "JWT_VERIFICATION_CACHE"):
+        with _token_cache_lock:
+            _token_cache = None
+    if setting in ("SIMPLE_JWT", "JWT_USER_CACHE"):
+        with _user_cache_lock:
+            _user_cache = None
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(instance, **kwargs):
+    """
+    Drop a user from the user cache of this process when it changes.
+
+    Other processes keep their copy for at most ``JWT_USER_CACHE["TTL"]`` seconds.
+    """
+    if _user_cache is not None:
+        _user_cache.delete(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+def verify_token(raw_token):
+    """
+    Verify a JWT, at most once per process for the lifetime of the token.
+
+    Verified tokens are cached under their signature until their ``exp``
+    claim. A hit also has to match the whole raw token, so a payload forged
+    under a known signature is still verified (and rejected).
+
+    Args:
+        raw_token (str | bytes): The encoded token.
+
+    Raises:
+        InvalidToken: If the token is not valid for any of ``AUTH_TOKEN_CLASSES``.
+
+    Returns:
+        rest_framework_simplejwt.tokens.Token: The validated token.
+    """
+    if isinstance(raw_token, bytes):
+        raw_token = raw_token.decode()
+    signature = raw_token.rpartition(".")[2]
+    cache = get_token_cache()
+    cached = cache.get(signature)
+    if cached is not None and hmac.compare_digest(cached[0], raw_token):
+        return cached[1]
+
+    messages = []
+    for AuthToken in api_settings.AUTH_TOKEN_CLASSES:
+        try:
+            token = AuthToken(raw_token)
+            break
+        except TokenError as e:
+            messages.append(
+                {
+                    "token_class": AuthToken.__name__,
+                    "token_type": AuthToken.token_type,
+                    "message": e.args[0],
+                }
+            )
+    else:
+        raise InvalidToken(
+            {
+                "detail": _("Given token not valid for any token type"),
+                "messages": messages,
+            }
+        )
+
+    ttl = token.get("exp", 0) - time.time()
+    if ttl > 0:
+        cache.set(signature, (raw_token, token), ttl=ttl)
+    return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that verifies each token once per process through
+    ``verify_token``, sharing the verified tokens with ``jwt_required``.
+    """
+
+    def get_validated_token(self, raw_token):
+        """
+        Validates an encoded JSON web token and returns a validated token
+        wrapper object.
+        """
+        return verify_token(raw_token)
+
+
+class TokenUserAuthentication(CachedJWTAuthentication, JWTStatelessUserAuthentication):
+    """
+    Stateless CachedJWTAuthentication: ``request.user`` is a ``TokenUser`` built
+    from the token claims, without querying the user table. Deactivating a user
+    takes effect when their access token expires.
+    """
+
+
+class CachedUserAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication that keeps the authenticated users in a per process
+    cache, invalidated when the user is saved or deleted.
+    """
+
+    def get_user(self, validated_token):
+        """
+        Attempts to find and return a user using the given validated token.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cache = get_user_cache()
+        user = cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(user_id, user)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        # Requests must not share (and mutate) the cached instance.
+        return copy.copy(user)
+
+
+# Authentication modes selectable with ``BaseViewSet.authentication_mode``.
+AUTHENTICATION_MODES = {
+    "user": CachedJWTAuthentication,
+    "cached_user": CachedUserAuthentication,
+    "token": TokenUserAuthentication,
+}
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """
+    No connection of the pool became available within its timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections shared by the threads of a process.
+
+    ``getconn`` hands out the most recently returned idle connection, opening a
+    new one while fewer than ``max_size`` exist and otherwise waiting up to
+    ``timeout`` seconds for one to be returned. Connections idle for more than
+    ``check_after`` seconds are health checked before reuse, and connections
+    older than ``max_lifetime`` seconds are closed instead of reused, as are
+    connections idle for more than ``max_idle`` seconds beyond the first
+    ``min_size``.
+
+    Args:
+        connect (callable): Opens a new connection.
+        check (callable): Receives a connection and returns whether it is
+            usable, e.g. by running ``SELECT 1``.
+        reset (callable): Receives a returned connection and puts it back in a
+            reusable state (e.g. rolls back). Returns False if it cannot.
+    """
+
+    def __init__(
+        self,
+        connect,
+        check=None,
+        reset=None,
+        min_size=0,
+        max_size=10,
+        timeout=5,
+        check_after=30,
+        max_idle=300,
+        max_lifetime=3600,
+    ):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._idle = deque()
+        self._created = {}
+        self._connecting = 0
+        self._condition = threading.Condition()
+        self.stats = {"connects": 0, "reuses": 0, "checks": 0, "discarded": 0, "waits": 0}
+
+    @property
+    def size(self):
+        """
+        The number of open connections, idle or in use.
+        """
+        return len(self._created) + self._connecting
+
+    def getconn(self):
+        """
+        Check out a connection.
+
+        Raises:
+            PoolTimeout: If all ``max_size`` connections stayed in use for ``timeout`` seconds.
+
+        Returns:
+            The connection, to be given back with ``putconn``.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                while self._idle:
+                    connection, returned_at = self._idle.pop()
+                    now = time.monotonic()
+                    if self._expired(connection, now, returned_at):
+                        self._discard(connection)
+                        continue
+                    if now - returned_at > self.check_after and self.check is not None:
+                        self.stats["checks"] += 1
+                        if not self.check(connection):
+                            self._discard(connection)
+                            continue
+                    self.stats["reuses"] += 1
+                    return connection
+                if self.size < self.max_size:
+                    # Reserve the slot, connect outside of the lock.
+                    self._connecting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No connection available within {self.timeout} seconds.")
+                self.stats["waits"] += 1
+                self._condition.wait(remaining)
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._connecting -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._connecting -= 1
+            self._created[id(connection)] = time.monotonic()
+            self.stats["connects"] += 1
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """
+        Give back a connection checked out with ``getconn``.
+
+        Args:
+            connection: The connection.
+            discard (bool): Close it instead of keeping it for reuse.
+        """
+        if not discard and self.reset is not None:
+            try:
+                discard = not self.reset(connection)
+            except Exception:
+                discard = True
+        with self._condition:
+            if discard or self._expired(connection, time.monotonic()):
+                self._discard(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close the idle connections. Connections in use are closed when given back.
+        """
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self.max_size = 0
+
+    def _expired(self, connection, now, returned_at=None):
+        if self.max_size == 0:
+            return True
+        if now - self._created.get(id(connection), now) > self.max_lifetime:
+            return True
+        idle_too_long = returned_at is not None and now - returned_at > self.max_idle
+        return idle_too_long and len(self._created) > self.min_size
+
+    def _discard(self, connection):
+        self._created.pop(id(connection), None)
+        self.stats["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
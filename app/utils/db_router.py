@@ -0,0 +1,112 @@
+import contextlib
+import contextvars
+import math
+import random
+import time
+from django.conf import settings
+
+# The replica the reads of the current request go to, None for the primary.
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+PIN_COOKIE = "db_pinned_until"
+PIN_HEADER = "DB-Pinned-Until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def get_replica_settings():
+    """
+    Get the ``READ_REPLICAS`` settings with their defaults.
+
+    Returns:
+        dict: The replica settings.
+    """
+    return {
+        "ALIASES": [],
+        "PIN_SECONDS": 5,
+        **getattr(settings, "READ_REPLICAS", {}),
+    }
+
+
+def pinned_until(request):
+    """
+    Get the end of the read-your-writes window of the client of a request.
+
+    The window comes from the cookie set on the client's last write or, for
+    clients without cookies, from the header echoing it. Values further away
+    than ``PIN_SECONDS`` are ignored.
+
+    Returns:
+        float: A UNIX timestamp, 0 when the client is not pinned.
+    """
+    value = request.COOKIES.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        until = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return until if until <= time.time() + get_replica_settings()["PIN_SECONDS"] else 0
+
+
+def route_request(request):
+    """
+    Choose the database the reads of a request go to.
+
+    Safe-method requests of clients outside their read-your-writes window read
+    from one of the ``ALIASES`` replicas, kept for the whole request so that
+    its queries see one snapshot; everything else reads from the primary.
+
+    Returns:
+        contextvars.Token: Restores the previous choice with ``reset_route``.
+    """
+    aliases = get_replica_settings()["ALIASES"]
+    alias = None
+    if aliases and request.method in SAFE_METHODS and pinned_until(request) < time.time():
+        alias = random.choice(aliases)
+    return _read_alias.set(alias)
+
+
+def reset_route(token):
+    _read_alias.reset(token)
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """
+    Send the reads of the block to the primary, whatever the request.
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_client(request, response):
+    """
+    Pin the client of a write request to the primary for ``PIN_SECONDS``.
+    """
+    config = get_replica_settings()
+    if request.method in SAFE_METHODS or not config["ALIASES"]:
+        return
+    window = config["PIN_SECONDS"]
+    # Rounded down, a value rounded up would fall outside of the window.
+    until = f"{math.floor((time.time() + window) * 1000) / 1000:.3f}"
+    response[PIN_HEADER] = until
+    response.set_cookie(PIN_COOKIE, until, max_age=window, httponly=True, samesite="Lax")
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of safe-method requests to the replica chosen by
+    ``route_request`` and everything else, including every write, to the
+    primary (``default``).
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
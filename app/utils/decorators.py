@@ -1,8 +1,8 @@
 from functools import wraps
 from rest_framework_simplejwt.exceptions import InvalidToken
-from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework.response import Response
 from rest_framework import status
+from utils.authentication import CachedJWTAuthentication, verify_token
 
 
 def jwt_required(view_func):
@@ -11,6 +11,9 @@ def jwt_required(view_func):
     If the token is valid and of type "access", the view function is called.
     Otherwise, a 401 Unauthorized response is returned.
 
+    The token is verified through ``verify_token``, so a token already verified
+    by ``CachedJWTAuthentication`` (or an earlier request) is not verified again.
+
     Args:
         view_func (function): The view function to be decorated.
 
@@ -20,8 +23,13 @@ def jwt_required(view_func):
 
     @wraps(view_func)
     def wrapped_view(request, *args, **kwargs):
+        authentication = CachedJWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header is not None else None
         try:
-            token = UntypedToken(request.auth)
+            if raw_token is None:
+                raise InvalidToken("Missing token")
+            token = verify_token(raw_token)
             if not token["token_type"] == "access":
                 raise InvalidToken("Invalid token type")
         except InvalidToken:
@@ -0,0 +1,193 @@
+import functools
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+
+class ValidationExecutor:
+    """
+    Shared pool used to run independent image validations concurrently.
+
+    The pool is either a thread pool or a process pool (``mode``), or ``sync`` to
+    run everything in the calling thread. At most ``max_workers + max_queue``
+    tasks are in flight; a caller that cannot get a slot within
+    ``queue_timeout`` seconds runs its task inline instead of piling up work.
+    """
+
+    MODES = ("sync", "thread", "process")
+
+    def __init__(self, mode="thread", max_workers=2, max_queue=32, queue_timeout=5):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown validation executor mode {mode!r}, expected one of {self.MODES}.")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    pool_class = ProcessPoolExecutor if self.mode == "process" else ThreadPoolExecutor
+                    self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule ``fn(*args, **kwargs)`` on the pool.
+
+        Args:
+            fn (callable): The callable to run. Must be picklable in process mode.
+
+        Returns:
+            concurrent.futures.Future: The future holding the result.
+        """
+        if self.mode != "sync" and self._slots.acquire(timeout=self.queue_timeout):
+            try:
+                future = self._get_pool().submit(fn, *args, **kwargs)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            return future
+
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def map(self, fn, items, **kwargs):
+        """
+        Run ``fn(item, **kwargs)`` for every item concurrently.
+
+        Args:
+            fn (callable): The callable to run for each item.
+            items (iterable): The first positional argument of each call.
+
+        Returns:
+            list: The results, in the order of ``items``.
+        """
+        futures = [self.submit(fn, item, **kwargs) for item in items]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True):
+        """
+        Stop the underlying pool. A new one is created on the next submit.
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_validation_executor():
+    """
+    Get the process-wide validation executor configured by ``VALIDATION_EXECUTOR``.
+
+    Returns:
+        ValidationExecutor: The shared executor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                config = getattr(settings, "VALIDATION_EXECUTOR", {})
+                _executor = ValidationExecutor(
+                    mode=config.get("MODE", "thread"),
+                    max_workers=config.get("MAX_WORKERS", 2),
+                    max_queue=config.get("MAX_QUEUE", 32),
+                    queue_timeout=config.get("QUEUE_TIMEOUT", 5),
+                )
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_validation_executor(setting, **kwargs):
+    """
+    Drop the shared executor when ``VALIDATION_EXECUTOR`` is overridden in tests.
+    """
+    global _executor
+    if setting == "VALIDATION_EXECUTOR" and _executor is not None:
+        with _executor_lock:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+_view_executor = None
+_view_executor_lock = threading.Lock()
+
+
+def get_view_executor():
+    """
+    Get the process-wide thread pool of the async views, sized by ``ASGI_VIEWS["THREADS"]``.
+
+    Returns:
+        ThreadPoolExecutor | None: The shared pool, or None when ``THREADS`` is 0.
+    """
+    global _view_executor
+    if _view_executor is None:
+        threads = getattr(settings, "ASGI_VIEWS", {}).get("THREADS", 8)
+        if not threads:
+            return None
+        with _view_executor_lock:
+            if _view_executor is None:
+                _view_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi-view")
+    return _view_executor
+
+
+def _closing_connections(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # No request_finished signal is sent in this thread.
+            close_old_connections()
+
+    return wrapper
+
+
+async def run_in_view_thread(fn, *args, **kwargs):
+    """
+    Run a blocking callable from an async view without blocking the event loop.
+
+    Under ASGI, Django runs every sync view and async ORM call on one thread per
+    worker. With ``ASGI_VIEWS["THREADS"]`` set, ``fn`` runs on a pool of that many
+    threads instead, and the database connections of the thread are released
+    afterwards as ``CONN_MAX_AGE`` requires. With 0 threads it runs on Django's
+    thread, which is what tests need to see their transaction.
+
+    Args:
+        fn (callable): The blocking callable.
+
+    Returns:
+        The result of ``fn(*args, **kwargs)``.
+    """
+    executor = get_view_executor()
+    if executor is None:
+        return await sync_to_async(fn)(*args, **kwargs)
+    return await sync_to_async(_closing_connections(fn), thread_sensitive=False, executor=executor)(*args, **kwargs)
+
+
+@receiver(setting_changed)
+def reset_view_executor(setting, **kwargs):
+    """
+    Drop the view thread pool when ``ASGI_VIEWS`` is overridden in tests.
+    """
+    global _view_executor
+    if setting == "ASGI_VIEWS" and _view_executor is not None:
+        with _view_executor_lock:
+            _view_executor.shutdown(wait=False)
+            _view_executor = None
@@ -0,0 +1,61 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.fields import get_error_detail
+from utils.processing_images import probe_image
+
+
+class ProbedImageField(serializers.ImageField):
+    """
+    Image field that reads the format and dimensions from the file header.
+
+    Uploads with a recognised JPEG, PNG or BMP header skip Django's Pillow based
+    validation in ``to_internal_value`` and carry an ``ImageProbe`` as
+    ``file.probe`` instead, so ``validate_image`` can reject them without
+    decoding. Call ``verify`` once the cheap checks have passed.
+    """
+
+    def to_internal_value(self, data):
+        """
+        Validate the upload and attach its header probe.
+
+        Args:
+            data (django.core.files.uploadedfile.UploadedFile): The uploaded file.
+
+        Returns:
+            django.core.files.uploadedfile.UploadedFile: The uploaded file.
+        """
+        file_object = serializers.FileField.to_internal_value(self, data)
+        probe = probe_image(file_object)
+        if probe is None:
+            return self._clean(file_object)
+        file_object.probe = probe
+        return file_object
+
+    def verify(self, file_object):
+        """
+        Run the full Pillow validation on an upload that was only probed.
+
+        Uploads marked ``verified`` (e.g. by a cached verdict) are returned as is.
+
+        Args:
+            file_object (django.core.files.uploadedfile.UploadedFile): The uploaded file.
+
+        Raises:
+            serializers.ValidationError: If Pillow cannot read the image.
+
+        Returns:
+            django.core.files.uploadedfile.UploadedFile: The validated file.
+        """
+        if hasattr(file_object, "image") or getattr(file_object, "verified", False):
+            return file_object
+        try:
+            file_object = self._clean(file_object)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({self.field_name: get_error_detail(exc)})
+        file_object.verified = True
+        return file_object
+
+    def _clean(self, file_object):
+        django_field = self._DjangoImageField()
+        django_field.error_messages = self.error_messages
+        return django_field.clean(file_object)
@@ -0,0 +1,343 @@
+import contextvars
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# [query count, seconds] of the request being served, see MetricsMiddleware.
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+_enabled = None
+_NOOP = nullcontext()
+
+
+def get_metrics_settings():
+    """
+    Get the ``METRICS`` settings with their defaults.
+
+    Returns:
+        dict: The metrics settings.
+    """
+    return {
+        "ENABLED": False,
+        "TOKEN": "",
+        **getattr(settings, "METRICS", {}),
+    }
+
+
+def metrics_enabled():
+    """
+    Returns:
+        bool: Whether ``METRICS["ENABLED"]`` is set, read once per process.
+    """
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(get_metrics_settings()["ENABLED"])
+    return _enabled
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        """
+        Returns:
+            list: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values)
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with labels and fixed bucket bounds, rendered in the Prometheus
+    text format. Observations cost a bisect and a lock.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [counts per bucket, +Inf last; sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        """
+        Returns:
+            list: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "docvalidate_stage_duration_seconds",
+    "Time spent in each stage of handling a transaction.",
+    ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "docvalidate_request_duration_seconds",
+    "Time to answer a request, by route.",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "docvalidate_requests_total",
+    "Requests answered, by route and status code.",
+    ["method", "route", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "docvalidate_request_queries",
+    "Database queries run per request, by route.",
+    ["method", "route"],
+    QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    "docvalidate_request_query_duration_seconds",
+    "Time spent in database queries per request, by route.",
+    ["method", "route"],
+)
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, REQUEST_QUERIES, REQUEST_QUERY_SECONDS]
+
+
+def collect_decode_budget():
+    """
+    Render the ``DecodeBudget`` counters of ``utils.processing_images``.
+
+    Returns:
+        list: The lines of the metrics.
+    """
+    from utils.processing_images import get_decode_budget
+
+    stats = get_decode_budget().stats()
+    lines = []
+    for key, name, kind, documentation in (
+        ("max_bytes", "budget_bytes", "gauge", "Memory budget of the image decodes."),
+        ("in_use", "in_use_bytes", "gauge", "Memory reserved by the running image decodes."),
+        ("peak", "peak_bytes", "gauge", "Most memory reserved by image decodes at once."),
+        ("admitted", "admitted_total", "counter", "Image decodes admitted by the budget."),
+        ("waited", "waited_total", "counter", "Image decodes that waited for memory."),
+        ("wait_seconds", "wait_seconds_total", "counter", "Time image decodes waited for memory."),
+        ("rejected", "rejected_total", "counter", "Image decodes rejected after waiting for memory."),
+        ("bombs", "bombs_total", "counter", "Images rejected for their pixel count."),
+    ):
+        name = f"docvalidate_image_decode_{name}"
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {stats[key]}"]
+    return lines
+
+
+COLLECTORS = [collect_decode_budget]
+
+
+def render_metrics():
+    """
+    Render every metric of the process in the Prometheus text format.
+
+    Returns:
+        str: The exposition.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.collect()
+    for collect in COLLECTORS:
+        lines += collect()
+    return "\n".join(lines) + "\n"
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.name)
+
+
+def stage(name):
+    """
+    Time a block into ``docvalidate_stage_duration_seconds{stage=name}``.
+
+    A shared no-op context manager when metrics are disabled.
+
+    Args:
+        name (str): The stage.
+
+    Returns:
+        A context manager.
+    """
+    if not metrics_enabled():
+        return _NOOP
+    return _StageTimer(name)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - start
+
+
+def _install_query_wrapper(connection):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+@receiver(connection_created)
+def install_query_wrapper(connection, **kwargs):
+    """
+    Count the queries of new connections when metrics are enabled.
+    """
+    if metrics_enabled():
+        _install_query_wrapper(connection)
+
+
+@receiver(setting_changed)
+def reset_metrics_enabled(setting, **kwargs):
+    """
+    Re-read ``METRICS`` when it is overridden in tests.
+    """
+    global _enabled
+    if setting == "METRICS":
+        _enabled = None
+        if metrics_enabled():
+            for connection in connections.all(initialized_only=True):
+                _install_query_wrapper(connection)
+
+
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and database queries (count and time) of each
+    request by route when ``METRICS["ENABLED"]`` is set. Sync and async capable.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not metrics_enabled():
+            return self.get_response(request)
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics_enabled():
+            return await self.get_response(request)
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def record(self, request, response, elapsed, queries):
+        labels = (request.method, _route(request))
+        REQUEST_SECONDS.observe(elapsed, *labels)
+        REQUESTS.inc(*labels, str(response.status_code))
+        REQUEST_QUERIES.observe(queries[0], *labels)
+        REQUEST_QUERY_SECONDS.observe(queries[1], *labels)
+
+
+def metrics_view(request):
+    """
+    Serves the metrics of this process in the Prometheus text format.
+
+    404 unless ``METRICS["ENABLED"]``; with a ``METRICS["TOKEN"]``, scrapes
+    must send it as ``Authorization: Bearer <token>``.
+    """
+    config = get_metrics_settings()
+    if not metrics_enabled():
+        raise Http404()
+    if config["TOKEN"]:
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), f"Bearer {config['TOKEN']}".encode()):
+            return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
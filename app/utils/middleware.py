@@ -0,0 +1,108 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.common import CommonMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from django.middleware.security import SecurityMiddleware
+from utils.db_router import pin_client, reset_route, route_request
+
+
+class InlineMiddlewareMixin:
+    """
+    Runs the hooks of a ``MiddlewareMixin`` middleware on the event loop under ASGI.
+
+    Django calls ``process_request`` and ``process_response`` of sync middleware
+    through ``sync_to_async(thread_sensitive=True)``: two trips to the single sync
+    thread of the worker per middleware and request, which serializes requests.
+    Only for middleware whose hooks do no blocking I/O; ``needs_sync_thread``
+    sends a response back to the sync thread when they would.
+    """
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, "process_request"):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, "process_response"):
+            if self.needs_sync_thread(request):
+                response = await sync_to_async(self.process_response)(request, response)
+            else:
+                response = self.process_response(request, response)
+        return response
+
+    def needs_sync_thread(self, request):
+        return False
+
+
+class InlineSecurityMiddleware(InlineMiddlewareMixin, SecurityMiddleware):
+    pass
+
+
+class InlineCommonMiddleware(InlineMiddlewareMixin, CommonMiddleware):
+    pass
+
+
+class InlineCsrfViewMiddleware(InlineMiddlewareMixin, CsrfViewMiddleware):
+    async def process_view(self, request, callback, callback_args, callback_kwargs):
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class InlineAuthenticationMiddleware(InlineMiddlewareMixin, AuthenticationMiddleware):
+    pass
+
+
+class InlineSessionMiddleware(InlineMiddlewareMixin, SessionMiddleware):
+    def needs_sync_thread(self, request):
+        # Saving the session queries the database.
+        session = getattr(request, "session", None)
+        return session is not None and (session.modified or settings.SESSION_SAVE_EVERY_REQUEST)
+
+
+class InlineMessageMiddleware(InlineMiddlewareMixin, MessageMiddleware):
+    def needs_sync_thread(self, request):
+        # Storing messages may load and write the session.
+        storage = getattr(request, "_messages", None)
+        return storage is not None and (storage.used or storage.added_new)
+
+
+class InlineXFrameOptionsMiddleware(InlineMiddlewareMixin, XFrameOptionsMiddleware):
+    pass
+
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes the reads of each request with ``utils.db_router`` and pins clients
+    to the primary after their writes. Sync and async capable.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = route_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_route(token)
+        pin_client(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = route_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_route(token)
+        pin_client(request, response)
+        return response
@@ -0,0 +1,263 @@
+import json
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import BaseParser, JSONParser
+from utils.metrics import metrics_enabled, stage
+from utils.processing_images import Base64ImageDecoder
+
+WHITESPACE = b" \t\r\n"
+# Characters that may follow a backslash inside a JSON string holding base64.
+BASE64_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b"", ord("t"): b""}
+
+
+class _JSONObjectReader:
+    """
+    Minimal incremental reader for a top-level JSON object.
+
+    Values of ``file_fields`` that are strings are streamed through a
+    ``Base64ImageDecoder`` chunk by chunk; every other value is sliced out of
+    the stream and handed to ``json.loads``.
+    """
+
+    def __init__(self, stream, file_fields, max_size_mb, encoding, chunk_size):
+        self.stream = stream
+        self.file_fields = file_fields
+        self.max_size_mb = max_size_mb
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.buffer = b""
+        self.pos = 0
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char):
+        if self._peek() != ord(char):
+            raise ValueError(f"Expecting '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def _read_value(self):
+        """
+        Consume one JSON value of any type and decode it with ``json.loads``.
+        """
+        self._peek()
+        start, depth, in_string, escaped = self.pos, 0, False, False
+        raw = b""
+        while True:
+            if self.pos >= len(self.buffer):
+                raw += self.buffer[start:]
+                start = self.pos
+                if not self._fill():
+                    break
+                start = 0
+                continue
+            char = self.buffer[self.pos]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == ord("\\"):
+                    escaped = True
+                elif char == ord('"'):
+                    in_string = False
+                    if depth == 0:
+                        self.pos += 1
+                        break
+            elif char == ord('"'):
+                in_string = True
+            elif char in b"{[":
+                depth += 1
+            elif char in b"}]":
+                if depth == 0:
+                    break
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    break
+            elif char == ord(",") and depth == 0:
+                break
+            self.pos += 1
+        raw += self.buffer[start : self.pos]
+        return json.loads(raw.decode(self.encoding))
+
+    def _read_base64(self, name):
+        """
+        Consume a JSON string, streaming its content into a ``Base64ImageDecoder``.
+        """
+        with stage("base64_decode"):
+            return self._decode_base64(name)
+
+    def _decode_base64(self, name):
+        self._expect('"')
+        decoder = Base64ImageDecoder(name, max_size_mb=self.max_size_mb)
+        while True:
+            quote = self.buffer.find(b'"', self.pos)
+            backslash = self.buffer.find(b"\\", self.pos, quote if quote != -1 else None)
+            end = backslash if backslash != -1 else quote
+            if end == -1:
+                decoder.feed(self.buffer[self.pos :])
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ValueError("Unterminated string")
+                continue
+            decoder.feed(self.buffer[self.pos : end])
+            self.pos = end + 1
+            if end == quote:
+                return decoder.close()
+            if self.pos >= len(self.buffer) and not self._fill():
+                raise ValueError("Unterminated string")
+            escape = BASE64_ESCAPES.get(self.buffer[self.pos])
+            if escape is None:
+                raise ValueError(f"Invalid escape in base64 string at offset {self.pos}")
+            decoder.feed(escape)
+            self.pos += 1
+
+    def read_object(self):
+        """
+        Consume one JSON object.
+
+        Returns:
+            dict: The decoded object.
+        """
+        self._expect("{")
+        data = {}
+        if self._peek() == ord("}"):
+            self.pos += 1
+        else:
+            while True:
+                key = self._read_value()
+                if not isinstance(key, str):
+                    raise ValueError("Expecting property name")
+                self._expect(":")
+                if key in self.file_fields and self._peek() == ord('"'):
+                    data[key] = self._read_base64(key)
+                else:
+                    data[key] = self._read_value()
+                if self._peek() == ord(","):
+                    self.pos += 1
+                    continue
+                self._expect("}")
+                break
+        return data
+
+    def read(self):
+        """
+        Consume a body holding exactly one JSON object.
+        """
+        data = self.read_object()
+        if self._peek() is not None:
+            raise ValueError(f"Extra data at offset {self.pos}")
+        return data
+
+    def read_objects(self):
+        """
+        Lazily consume a body holding a sequence of JSON objects (NDJSON).
+        """
+        while self._peek() is not None:
+            yield self.read_object()
+
+
+class Base64StreamingJSONParser(JSONParser):
+    """
+    JSON parser that decodes base64 file fields while reading the request body.
+
+    The view lists the fields in ``base64_file_fields`` and may cap their decoded
+    size with ``base64_max_size_mb``. Those fields are delivered as uploaded files
+    backed by a spooled temporary file, so a large image is never held in memory
+    as one string. Views without ``base64_file_fields`` get plain JSON parsing.
+    """
+
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Parses the incoming bytestream as JSON and returns the resulting data.
+        """
+        parser_context = parser_context or {}
+        view = parser_context.get("view")
+        if not getattr(view, "base64_file_fields", ()) or stream is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return get_reader(stream, parser_context, self.chunk_size).read()
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON objects, streaming base64 file fields like
+    Base64StreamingJSONParser.
+
+    The result is a lazy iterator of dicts: the body is consumed as the view
+    iterates, so only the items being processed are held at once. Malformed
+    input raises ParseError during iteration.
+    """
+
+    media_type = "application/x-ndjson"
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Returns an iterator over the objects of the incoming bytestream.
+        """
+        if stream is None:
+            return iter(())
+        reader = get_reader(stream, parser_context or {}, self.chunk_size)
+
+        def objects():
+            try:
+                yield from reader.read_objects()
+            except ValueError as exc:
+                raise ParseError("NDJSON parse error - %s" % str(exc))
+
+        return objects()
+
+
+def get_reader(stream, parser_context, chunk_size):
+    view = parser_context.get("view")
+    return _JSONObjectReader(
+        stream,
+        file_fields=getattr(view, "base64_file_fields", ()),
+        max_size_mb=getattr(view, "base64_max_size_mb", None),
+        encoding=parser_context.get("encoding", settings.DEFAULT_CHARSET),
+        chunk_size=chunk_size,
+    )
+
+
+class _TimedParser:
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __getattr__(self, name):
+        return getattr(self.parser, name)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        with stage("parse"):
+            return self.parser.parse(stream, media_type, parser_context)
+
+
+class TimedContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation timing the parsing of request bodies into the "parse"
+    metrics stage when metrics are enabled.
+    """
+
+    def select_parser(self, request, parsers):
+        parser = super().select_parser(request, parsers)
+        if parser is None or not metrics_enabled():
+            return parser
+        return _TimedParser(parser)
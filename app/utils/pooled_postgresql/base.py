@@ -0,0 +1,114 @@
+"""
+PostgreSQL backend whose connections come from a process-wide ConnectionPool.
+
+Use ``"ENGINE": "utils.pooled_postgresql"`` and size the pool with a ``POOL``
+dict next to ``OPTIONS`` (``MIN_SIZE``, ``MAX_SIZE``, ``TIMEOUT``,
+``CHECK_AFTER``, ``MAX_IDLE``, ``MAX_LIFETIME``, see ConnectionPool). Closing
+the Django connection, e.g. at the end of a request with ``CONN_MAX_AGE = 0``,
+gives it back to the pool, so the threads of a worker share ``MAX_SIZE``
+connections instead of opening one per request.
+"""
+import threading
+from django.db.backends.postgresql import base, creation
+from django.db.backends.base.base import NO_DB_ALIAS
+from utils.connection_pool import ConnectionPool, PoolTimeout
+
+# psycopg2.extensions.TRANSACTION_STATUS_* and psycopg.pq.TransactionStatus
+IDLE, INTRANS, INERROR = 0, 2, 3
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    """
+    Returns:
+        bool: Whether the connection answers ``SELECT 1``.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
+def reset_connection(connection):
+    """
+    Roll back what a returned connection left open.
+
+    Returns:
+        bool: Whether the connection can be reused.
+    """
+    if connection.closed:
+        return False
+    status = int(connection.info.transaction_status)
+    if status in (INTRANS, INERROR):
+        connection.rollback()
+        status = int(connection.info.transaction_status)
+    return status == IDLE
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database in use.
+        self.connection.close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_pool(self, conn_params):
+        """
+        Get the pool of this alias and connection parameters, created on first use.
+
+        Returns:
+            ConnectionPool: The pool.
+        """
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        pool = _pools.get(key)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(key)
+                if pool is None:
+                    config = self.settings_dict.get("POOL", {})
+                    connect = super().get_new_connection
+                    pool = _pools[key] = ConnectionPool(
+                        lambda: connect(conn_params),
+                        check=check_connection,
+                        reset=reset_connection,
+                        min_size=config.get("MIN_SIZE", 0),
+                        max_size=config.get("MAX_SIZE", 10),
+                        timeout=config.get("TIMEOUT", 5),
+                        check_after=config.get("CHECK_AFTER", 30),
+                        max_idle=config.get("MAX_IDLE", 300),
+                        max_lifetime=config.get("MAX_LIFETIME", 3600),
+                    )
+        return pool
+
+    def close_pools(self):
+        """
+        Close the idle connections of every pool of this alias.
+        """
+        with _pools_lock:
+            for key in [key for key in _pools if key[0] == self.alias]:
+                _pools.pop(key).close()
+
+    def get_new_connection(self, conn_params):
+        if self.alias == NO_DB_ALIAS:
+            # Short-lived maintenance connections (test database creation).
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = self.get_pool(conn_params)
+        try:
+            return self.pool.getconn()
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.pool.putconn(self.connection, discard=self.errors_occurred and not self.is_usable())
@@ -1,12 +1,178 @@
-import base64
+import binascii
+import hashlib
+import struct
+import threading
+import time
+from collections import namedtuple
 from io import BytesIO
-from PIL import Image
+from tempfile import SpooledTemporaryFile
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from PIL import ExifTags, Image
+from utils.cache import LRUCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ImageProbe = namedtuple("ImageProbe", ["format", "width", "height"])
+# Picklable stand-in for an upload, carrying what validate_image needs.
+ImageSnapshot = namedtuple("ImageSnapshot", ["size", "probe"])
+# Quality metrics of an image, see score_image_quality.
+QualityScore = namedtuple("QualityScore", ["sharpness", "brightness", "glare_ratio"])
+# Cached verdict of an image that passed every check.
+VALID = "valid"
+
+# Transpositions making an image upright, by EXIF orientation (as ImageOps.exif_transpose).
+EXIF_TRANSPOSITIONS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# Orientations whose stored width is the upright height.
+EXIF_SWAPPED_AXES = {5, 6, 7, 8}
+
+# JPEG start-of-frame markers carrying the frame dimensions. DHT (C4), JPG (C8)
+# and DAC (CC) share the range but are not frame headers.
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+# Markers that stand alone without a length field (TEM, RSTn, SOI).
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+JPEG_SOS_MARKER = 0xDA
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _probe_jpeg(stream):
+    """
+    Walk the JPEG marker segments until the start-of-frame header is found.
+
+    Segments are skipped with ``seek`` so metadata such as EXIF thumbnails is
+    never read into memory.
+
+    Args:
+        stream (file): A binary file positioned right after the SOI marker.
+
+    Returns:
+        tuple: ``(width, height)``, or None if no frame header precedes the scan data.
+    """
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = stream.read(1)
+        # Any number of 0xFF fill bytes may precede a marker.
+        while marker == b"\xff":
+            marker = stream.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == JPEG_SOS_MARKER:
+            return None
+        header = stream.read(2)
+        if len(header) < 2:
+            return None
+        (length,) = struct.unpack(">H", header)
+        if marker in JPEG_SOF_MARKERS:
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            _, height, width = struct.unpack(">BHH", frame)
+            return width, height
+        stream.seek(length - 2, 1)
+
+
+def _probe_png(header):
+    """
+    Read the dimensions from the PNG IHDR chunk.
+
+    Args:
+        header (bytes): The first bytes of the file, signature included.
+
+    Returns:
+        tuple: ``(width, height)``, or None if the IHDR chunk is malformed.
+    """
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def _probe_bmp(header):
+    """
+    Read the dimensions from the BMP DIB header.
+
+    Args:
+        header (bytes): The first bytes of the file, signature included.
+
+    Returns:
+        tuple: ``(width, height)``, or None if the DIB header is malformed.
+    """
+    if len(header) < 26:
+        return None
+    (dib_size,) = struct.unpack("<I", header[14:18])
+    if dib_size == 12:
+        # OS/2 BITMAPCOREHEADER uses unsigned 16-bit dimensions.
+        return struct.unpack("<HH", header[18:22])
+    width, height = struct.unpack("<ii", header[18:26])
+    # A negative height marks a top-down bitmap.
+    return abs(width), abs(height)
+
+
+def probe_image(image):
+    """
+    Read the format and dimensions of an image from its header bytes only.
+
+    Only JPEG, PNG and BMP headers are understood; no pixel data is decoded and
+    the file position is restored afterwards.
+
+    Args:
+        image (django.core.files.File): The uploaded image file.
+
+    Returns:
+        ImageProbe: The format (as reported by PIL) and dimensions, or None if
+        the header is not a recognised JPEG, PNG or BMP header.
+    """
+    position = image.tell()
+    try:
+        image.seek(0)
+        header = image.read(26)
+        if header.startswith(b"\xff\xd8"):
+            image.seek(2)
+            image_format, dimensions = "JPEG", _probe_jpeg(image)
+        elif header.startswith(PNG_SIGNATURE):
+            image_format, dimensions = "PNG", _probe_png(header)
+        elif header.startswith(b"BM"):
+            image_format, dimensions = "BMP", _probe_bmp(header)
+        else:
+            return None
+    finally:
+        image.seek(position)
+    if dimensions is None:
+        return None
+    return ImageProbe(image_format, *dimensions)
 
 
 def validate_image(client, image, max_size_mb, min_resolution, max_resolution):
     """
     Custom validation for image files.
 
+    The resolution and format are taken from the header (see ``probe_image``)
+    when possible, so most rejections happen without decoding the image.
+
     Args:
         client (django.contrib.auth.models.User): The client associated with the image.
         image (PIL.Image.Image): The image to be validated.
@@ -29,8 +195,13 @@ def validate_image(client, image, max_size_mb, min_resolution, max_resolution):
             "details": f"Image size exceeds the limit of {max_size_mb} MB.",
         }
 
+    probe = getattr(image, "probe", None) or probe_image(image)
+    if probe is not None:
+        image_format, (width, height) = probe.format, (probe.width, probe.height)
+    else:
+        image_format, (width, height) = image.image.format, image.image.size
+
     # Check the resolution
-    width, height = image.image.size
     if (
         not min_resolution[0] <= width <= max_resolution[0]
         or not min_resolution[1] <= height <= max_resolution[1]
@@ -42,7 +213,7 @@ def validate_image(client, image, max_size_mb, min_resolution, max_resolution):
         }
 
     # Check the file format
-    if image.image.format not in ["JPEG", "JPG", "PNG", "BMP"]:
+    if image_format not in ["JPEG", "JPG", "PNG", "BMP"]:
         return {
             "result": False,
             "error_code": 3,
@@ -52,16 +223,886 @@ def validate_image(client, image, max_size_mb, min_resolution, max_resolution):
     return image
 
 
-def base64_to_image(self, base64_string):
+def validate_images(client, images, executor, **limits):
+    """
+    Validate several images concurrently with ``validate_image``.
+
+    Verdicts are looked up in the verdict cache by content hash first, so a
+    resubmitted image is not probed or decoded again. In process mode the
+    uploads are replaced by an ``ImageSnapshot`` before being sent to the
+    workers, as open files cannot be pickled.
+
+    Args:
+        client (clients.models.Client): The client associated with the images.
+        images (list): The uploaded images.
+        executor (utils.executors.ValidationExecutor): The executor running the checks.
+        **limits: ``max_size_mb``, ``min_resolution`` and ``max_resolution``.
+
+    Returns:
+        list: For each image, in order, the image itself or the error dict.
+    """
+    results = [get_cached_verdict(image, limits) for image in images]
+    futures = {
+        index: executor.submit(
+            validate_image,
+            client=client,
+            image=snapshot_image(image) if executor.mode == "process" else image,
+            **limits,
+        )
+        for index, image in enumerate(images)
+        if results[index] is None
+    }
+    for index, future in futures.items():
+        results[index] = future.result()
+        if isinstance(results[index], dict):
+            cache_verdict(images[index], results[index], limits)
+    return [
+        result if isinstance(result, dict) else image
+        for image, result in zip(images, results)
+    ]
+
+
+def content_hash(image):
+    """
+    Get the SHA-256 hex digest of a file's content.
+
+    The digest is stored on the file as ``content_hash``, so it is only
+    computed once; ``Base64ImageDecoder`` sets it while decoding.
+
+    Args:
+        image (django.core.files.File): The file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = getattr(image, "content_hash", None)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        for chunk in image.chunks():
+            sha256.update(chunk)
+        image.seek(0)
+        digest = image.content_hash = sha256.hexdigest()
+    return digest
+
+
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """
+    Get the process-wide cache of validation verdicts, see ``VALIDATION_CACHE``.
+
+    Returns:
+        utils.cache.LRUCache: The verdict cache.
+    """
+    global _verdict_cache
+    if _verdict_cache is None:
+        with _verdict_cache_lock:
+            if _verdict_cache is None:
+                config = getattr(settings, "VALIDATION_CACHE", {})
+                _verdict_cache = LRUCache(
+                    max_entries=config.get("MAX_ENTRIES", 4096),
+                    ttl=config.get("TTL", 3600),
+                )
+    return _verdict_cache
+
+
+@receiver(setting_changed)
+def reset_verdict_cache(setting, **kwargs):
+    """
+    Drop the verdict cache when ``VALIDATION_CACHE`` or ``IMAGE_QUALITY`` is
+    overridden in tests.
+    """
+    global _verdict_cache
+    if setting in ("VALIDATION_CACHE", "IMAGE_QUALITY"):
+        _verdict_cache = None
+
+
+def _verdict_key(image, limits):
+    if getattr(image, "truncated", False):
+        return None
+    return (content_hash(image), tuple(sorted(limits.items())))
+
+
+def get_cached_verdict(image, limits):
+    """
+    Look up the verdict of a previous validation of the same content.
+
+    A cached ``VALID`` verdict marks the image as ``verified`` and
+    ``quality_checked`` so the full Pillow check and the quality checks are
+    skipped as well.
+
+    Args:
+        image (django.core.files.File): The uploaded image.
+        limits (dict): The limits passed to ``validate_image``.
+
+    Returns:
+        object: The error dict, ``VALID``, or None on a miss.
+    """
+    key = _verdict_key(image, limits)
+    verdict = get_verdict_cache().get(key) if key else None
+    if verdict == VALID:
+        image.verified = image.quality_checked = True
+    return verdict
+
+
+def cache_verdict(image, verdict, limits):
+    """
+    Remember the verdict for the content of an image.
+
+    Args:
+        image (django.core.files.File): The uploaded image.
+        verdict (object): The error dict returned by ``validate_image``, or ``VALID``
+            once the image also passed the full Pillow check.
+        limits (dict): The limits passed to ``validate_image``.
+    """
+    key = _verdict_key(image, limits)
+    if key:
+        get_verdict_cache().set(key, verdict)
+
+
+def snapshot_image(image):
+    """
+    Build an ``ImageSnapshot`` of an upload.
+
+    Args:
+        image (django.core.files.File): The uploaded image file.
+
+    Returns:
+        ImageSnapshot: The size and header probe of the upload.
+    """
+    probe = getattr(image, "probe", None) or probe_image(image)
+    if probe is None:
+        probe = ImageProbe(image.image.format, *image.image.size)
+    return ImageSnapshot(image.size, probe)
+
+
+def validate_stored_image(client, image, max_size_mb, min_resolution, max_resolution):
+    """
+    Validate an image that has already been written to storage.
+
+    Runs ``validate_image`` and, once the header checks pass, a full Pillow
+    verification and ``check_image_quality``. Unlike uploads, stored files have not been checked by the
+    serializer field, so unreadable files are reported as an error too.
+
+    The content is read from storage first, at most one byte more than
+    ``max_size_mb``, and checked from memory: storage errors (missing files,
+    S3 timeouts) and decodes not admitted by the decode budget raise, for the
+    worker to retry, and only the content itself can be reported as unreadable.
+
+    Args:
+        client (clients.models.Client): The client associated with the image.
+        image (django.db.models.fields.files.FieldFile): The stored image, opened for reading.
+        max_size_mb (int): The maximum size of the image in megabytes.
+        min_resolution (tuple): The minimum resolution allowed for the image.
+        max_resolution (tuple): The maximum resolution allowed for the image.
+
+    Raises:
+        OSError: If the image cannot be read from storage.
+        DecodeBudgetExceeded: If the decode was not admitted in time.
+
+    Returns:
+        django.core.files.base.ContentFile: The validated content of the image,
+        or the error dict.
+    """
+    unreadable = {
+        "result": False,
+        "error_code": 6,
+        "details": "Image file is corrupted or unreadable.",
+    }
+    image.seek(0)
+    try:
+        content = ContentFile(image.read(max_size_mb * 1024 * 1024 + 1), name=image.name)
+    finally:
+        image.seek(0)
+    try:
+        if probe_image(content) is None:
+            content.image = Image.open(content)
+        result = validate_image(client, content, max_size_mb, min_resolution, max_resolution)
+        if isinstance(result, dict):
+            return result
+        content.seek(0)
+        Image.open(content).verify()
+        return check_image_quality(content)
+    except (OSError, SyntaxError, ValueError, EOFError, struct.error, Image.DecompressionBombError):
+        # Decoding errors: Pillow reports truncated and unidentified images as OSError.
+        return unreadable
+    finally:
+        content.seek(0)
+
+
+def get_decode_settings():
+    """
+    Get the ``IMAGE_DECODE`` settings with their defaults.
+
+    Returns:
+        dict: The decode admission settings.
+    """
+    return {
+        "MAX_BYTES": 256 * 1024 * 1024,
+        "TIMEOUT": 10,
+        "MAX_PIXELS": 30_000_000,
+        **getattr(settings, "IMAGE_DECODE", {}),
+    }
+
+
+class DecodeBudgetExceeded(Exception):
+    """
+    The decoded pixels of an image did not fit in the decode budget in time.
+    """
+
+
+class DecodeBudget:
+    """
+    Per-process budget of decoded pixel memory, a semaphore counting bytes.
+
+    Decodes ``acquire`` their estimated memory before decoding and ``release``
+    it once the full-size buffers are freed. When the budget is exhausted they
+    wait up to ``timeout`` seconds, then are rejected. A decode larger than the
+    whole budget is admitted alone, once nothing else is in use.
+
+    Each process has its own budget: the validation processes of the
+    "process" executor mode do not share the budget of the web worker, so
+    ``IMAGE_DECODE["MAX_BYTES"]`` is divided between them in the settings.
+
+    Attributes:
+        max_bytes (int): The budget.
+        timeout (float): How long a decode waits for memory before being rejected.
+        in_use (int): The bytes currently reserved.
+        peak (int): The most bytes reserved at once.
+        admitted (int): The number of admitted decodes.
+        waited (int): The number of admitted or rejected decodes that had to wait.
+        wait_seconds (float): The total time spent waiting.
+        rejected (int): The number of decodes rejected after ``timeout``.
+        bombs (int): The number of images rejected for their pixel count.
+    """
+
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.in_use = self.peak = 0
+        self.admitted = self.waited = self.rejected = self.bombs = 0
+        self.wait_seconds = 0.0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes):
+        return self.in_use + nbytes <= self.max_bytes or self.in_use == 0
+
+    def acquire(self, nbytes):
+        """
+        Reserve ``nbytes``, waiting up to ``timeout`` seconds.
+
+        Raises:
+            DecodeBudgetExceeded: If the bytes could not be reserved in time.
+
+        Returns:
+            int: ``nbytes``, to pass to ``release``.
+        """
+        with self._condition:
+            if not self._fits(nbytes):
+                self.waited += 1
+                start = time.monotonic()
+                admitted = self._condition.wait_for(lambda: self._fits(nbytes), self.timeout)
+                self.wait_seconds += time.monotonic() - start
+                if not admitted:
+                    self.rejected += 1
+                    raise DecodeBudgetExceeded(
+                        f"{nbytes} bytes of pixels did not fit in the decode budget within {self.timeout} seconds."
+                    )
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+            self.admitted += 1
+        return nbytes
+
+    def release(self, nbytes):
+        """
+        Give back bytes reserved with ``acquire``.
+        """
+        with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+    def record_bomb(self):
+        """
+        Count an image rejected by ``check_pixel_count``.
+        """
+        with self._condition:
+            self.bombs += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: The attributes above, for monitoring.
+        """
+        with self._condition:
+            return {
+                "max_bytes": self.max_bytes,
+                "in_use": self.in_use,
+                "peak": self.peak,
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "wait_seconds": self.wait_seconds,
+                "rejected": self.rejected,
+                "bombs": self.bombs,
+            }
+
+
+_decode_budget = None
+_decode_budget_lock = threading.Lock()
+
+
+def get_decode_budget():
+    """
+    Get the process-wide decode budget configured by ``IMAGE_DECODE``.
+
+    Returns:
+        DecodeBudget: The shared budget.
+    """
+    global _decode_budget
+    if _decode_budget is None:
+        with _decode_budget_lock:
+            if _decode_budget is None:
+                config = get_decode_settings()
+                _decode_budget = DecodeBudget(config["MAX_BYTES"], config["TIMEOUT"])
+    return _decode_budget
+
+
+@receiver(setting_changed)
+def reset_decode_budget(setting, **kwargs):
+    """
+    Drop the shared budget when ``IMAGE_DECODE`` is overridden in tests.
+    """
+    global _decode_budget
+    if setting == "IMAGE_DECODE":
+        with _decode_budget_lock:
+            _decode_budget = None
+
+
+def _pixel_bytes(mode):
+    # Pillow stores multi-band pixels in 32 bits.
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def estimate_decode_bytes(image, mode):
+    """
+    Estimate the memory of decoding an opened image into ``mode``: its
+    decoded pixels (at the ``draft`` scale, if any) and their converted copy.
+
+    Args:
+        image (PIL.Image.Image): The image, opened but not loaded.
+        mode (str): The mode it is converted to.
+
+    Returns:
+        int: The estimate in bytes.
+    """
+    pixels = image.width * image.height
+    return pixels * (_pixel_bytes(image.mode) + _pixel_bytes(mode))
+
+
+def check_pixel_count(image, max_pixels=None):
+    """
+    Reject images with more pixels than ``IMAGE_DECODE["MAX_PIXELS"]``, a
+    stricter cap than Pillow's ``MAX_IMAGE_PIXELS``.
+
+    Args:
+        image (PIL.Image.Image): The image, opened but not loaded.
+        max_pixels (int): The cap, defaults to the setting.
+
+    Raises:
+        PIL.Image.DecompressionBombError: If the image has too many pixels.
+    """
+    if max_pixels is None:
+        max_pixels = get_decode_settings()["MAX_PIXELS"]
+    if image.width * image.height > max_pixels:
+        get_decode_budget().record_bomb()
+        raise Image.DecompressionBombError(
+            f"Image size ({image.width * image.height} pixels) exceeds the limit of {max_pixels} pixels."
+        )
+
+
+def _fit(size, box):
+    scale = min(box[0] / size[0], box[1] / size[1], 1)
+    return max(round(size[0] * scale), 1), max(round(size[1] * scale), 1)
+
+
+def _shrink(image, size, resample):
+    # reduce() averages blocks of pixels much faster than resampling; leave at
+    # least a 2x downscale to the filter, as Image.thumbnail does.
+    factor = min(image.width // size[0], image.height // size[1]) // 2
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.size != size:
+        image = image.resize(size, resample)
+    return image
+
+
+def decode_working_image(image, box, mode="RGB", resample=Image.Resampling.BICUBIC):
+    """
+    Decode an image upright, in ``mode`` and downscaled to fit in ``box``,
+    decoding at most once per upload.
+
+    JPEGs are decoded by the DCT at 1/2 to 1/8 scale (``draft``), and only
+    their luminance for "L". The rest of the downscale is ``reduce()`` then
+    ``resample``, and the EXIF orientation is applied last, to the small
+    image. Results are memoized on the upload (``working_images``); a later
+    request for a smaller box in the same mode and resampling is derived from
+    the smallest memoized image large enough instead of decoding again.
+
+    Decodes are admitted by the process-wide ``DecodeBudget`` on the estimate
+    of their memory, and images above ``IMAGE_DECODE["MAX_PIXELS"]`` are
+    rejected from their header.
+
+    Args:
+        image (django.core.files.File): The image, opened for reading.
+        box (tuple): The maximum upright width and height.
+        mode (str): The PIL mode of the result, "RGB" or "L".
+        resample (PIL.Image.Resampling): The filter of the final resize.
+
+    Raises:
+        PIL.UnidentifiedImageError: If Pillow cannot read the image.
+        PIL.Image.DecompressionBombError: If the image has too many pixels.
+        DecodeBudgetExceeded: If the decode was not admitted in time.
+
+    Returns:
+        PIL.Image.Image: The working image. It is shared, do not modify it.
+    """
+    memo = getattr(image, "working_images", None)
+    if memo is None:
+        memo = image.working_images = {}
+    key = (mode, tuple(box), resample)
+    if key in memo:
+        return memo[key]
+    if memo:
+        size = _fit(image.upright_size, box)
+        sources = [
+            source
+            for (source_mode, _, source_resample), source in memo.items()
+            if (source_mode, source_resample) == (mode, resample)
+            and source.width >= size[0]
+            and source.height >= size[1]
+        ]
+        if sources:
+            memo[key] = _shrink(min(sources, key=lambda source: source.width), size, resample)
+            return memo[key]
+    budget = get_decode_budget()
+    reserved = 0
+    image.seek(0)
+    try:
+        with Image.open(image) as original:
+            check_pixel_count(original)
+            orientation = original.getexif().get(ExifTags.Base.Orientation)
+            if orientation in EXIF_SWAPPED_AXES:
+                upright = original.size[::-1]
+                stored = _fit(upright, box)[::-1]
+            else:
+                upright = original.size
+                stored = _fit(upright, box)
+            original.draft(mode, stored)
+            reserved = budget.acquire(estimate_decode_bytes(original, mode))
+            decoded = _shrink(original.convert(mode), stored, resample)
+    finally:
+        # Closing the image freed its full-size pixels.
+        if reserved:
+            budget.release(reserved)
+        image.seek(0)
+    if orientation in EXIF_TRANSPOSITIONS:
+        decoded = decoded.transpose(EXIF_TRANSPOSITIONS[orientation])
+    image.upright_size = upright
+    memo[key] = decoded
+    return decoded
+
+
+def get_quality_settings():
+    """
+    Get the ``IMAGE_QUALITY`` settings with their defaults.
+
+    Returns:
+        dict: The image quality settings.
+    """
+    return {
+        "ENABLED": False,
+        "WORKING_SIZE": 512,
+        "MIN_SHARPNESS": 100.0,
+        "MIN_BRIGHTNESS": 40.0,
+        "MAX_BRIGHTNESS": 220.0,
+        "GLARE_LEVEL": 250,
+        "MAX_GLARE_RATIO": 0.05,
+        **getattr(settings, "IMAGE_QUALITY", {}),
+    }
+
+
+def decode_grayscale(image, working_size):
     """
-    Convert base64 image string to Image instance.
+    Decode the luminance of an image fitting in a ``working_size`` square.
+
+    Box-filtered, so metrics do not depend on the upload resolution. See
+    ``decode_working_image``.
+
+    Args:
+        image (django.core.files.File): The image, opened for reading.
+        working_size (int): The longest side of the working image.
+
+    Returns:
+        PIL.Image.Image: The shared "L" image, do not modify it.
+    """
+    return decode_working_image(image, (working_size, working_size), "L", Image.Resampling.BOX)
+
+
+def score_image_quality(gray, glare_level=250):
+    """
+    Compute the quality metrics of a grayscale image with NumPy.
+
+    * ``sharpness``: the variance of the 4-neighbour Laplacian, low when blurry.
+    * ``brightness``: the mean luminance (0-255), from the histogram.
+    * ``glare_ratio``: the share of pixels at or above ``glare_level``, i.e.
+      clipped highlights.
+
+    Args:
+        gray (PIL.Image.Image): The "L" image, see ``decode_grayscale``.
+        glare_level (int): The luminance from which a pixel counts as clipped.
+
+    Raises:
+        ImproperlyConfigured: If NumPy is not installed.
+
+    Returns:
+        QualityScore: The metrics.
+    """
+    if np is None:
+        raise ImproperlyConfigured("Image quality checks require numpy.")
+    pixels = np.asarray(gray)
+    # The Laplacian of 8-bit pixels lies in [-1020, 1020].
+    center = pixels[1:-1, 1:-1].astype(np.int16)
+    laplacian = pixels[:-2, 1:-1].astype(np.int16)
+    laplacian += pixels[2:, 1:-1]
+    laplacian += pixels[1:-1, :-2]
+    laplacian += pixels[1:-1, 2:]
+    laplacian -= center * 4
+    histogram = np.bincount(pixels.ravel(), minlength=256)
+    total = pixels.size
+    return QualityScore(
+        sharpness=float(laplacian.var()) if laplacian.size else 0.0,
+        brightness=float(histogram @ np.arange(256)) / total,
+        glare_ratio=float(histogram[glare_level:].sum()) / total,
+    )
+
+
+def check_image_quality(image, config=None):
+    """
+    Reject images too dark, overexposed, washed out by glare or blurry.
+
+    Runs on a reduced-scale decode (see ``decode_grayscale``) with the
+    thresholds of ``IMAGE_QUALITY``; does nothing unless it is ``ENABLED``.
+
+    The decode is most of the cost: libjpeg entropy-decodes the whole file at
+    any DCT scale, so a detailed 12 MP JPEG takes about 20-35 ms on a slow
+    core, above the 15 ms target, whatever the ``WORKING_SIZE``. Scoring takes
+    about 2 ms, see benchmarks/bench_image_quality.py.
 
     Args:
-        base64_string (str): The base64-encoded image string.
+        image (django.core.files.File): The image, opened for reading.
+        config (dict): The settings, defaults to ``get_quality_settings()``.
+
+    Raises:
+        PIL.UnidentifiedImageError: If Pillow cannot read the image.
 
     Returns:
-        PIL.Image.Image: The Image instance.
+        django.core.files.File: The image, or the error dict.
     """
-    image_data = base64.b64decode(base64_string)
-    image = Image.open(BytesIO(image_data))
+    config = config or get_quality_settings()
+    if not config["ENABLED"]:
+        return image
+    score = score_image_quality(decode_grayscale(image, config["WORKING_SIZE"]), config["GLARE_LEVEL"])
+    if score.brightness < config["MIN_BRIGHTNESS"]:
+        return {
+            "result": False,
+            "error_code": 9,
+            "details": "Image is too dark.",
+        }
+    if score.brightness > config["MAX_BRIGHTNESS"]:
+        return {
+            "result": False,
+            "error_code": 10,
+            "details": "Image is overexposed.",
+        }
+    if score.glare_ratio > config["MAX_GLARE_RATIO"]:
+        return {
+            "result": False,
+            "error_code": 8,
+            "details": "Image has glare, avoid direct light on the document.",
+        }
+    if score.sharpness < config["MIN_SHARPNESS"]:
+        return {
+            "result": False,
+            "error_code": 7,
+            "details": "Image is too blurry.",
+        }
     return image
+
+
+def check_images_quality(images, executor):
+    """
+    Run ``check_image_quality`` on several images concurrently.
+
+    In process mode the workers get the content of the uploads, as open files
+    cannot be pickled.
+
+    Args:
+        images (list): The uploaded images, already verified.
+        executor (utils.executors.ValidationExecutor): The executor running the checks.
+
+    Returns:
+        list: For each image, in order, the image itself or the error dict.
+    """
+    config = get_quality_settings()
+    if not config["ENABLED"]:
+        return images
+    results = executor.map(check_image_quality, _executor_inputs(images, executor), config=config)
+    return [
+        result if isinstance(result, dict) else image
+        for image, result in zip(images, results)
+    ]
+
+
+def _executor_inputs(images, executor):
+    # Open files cannot be pickled, process workers get copies of the content.
+    if executor.mode != "process":
+        return images
+    contents = []
+    for image in images:
+        image.seek(0)
+        contents.append(BytesIO(image.read()))
+        image.seek(0)
+    return contents
+
+
+def dhash_image(image, working_size=512):
+    """
+    Compute the 64-bit difference hash (dHash) of an image.
+
+    The luminance is squashed to 9x8 pixels and each bit tells whether a pixel
+    is brighter than its right neighbour. Photos of the same document differ
+    in a few bits, see ``transactions.duplicates``. Reuses the working image
+    of the quality checks when the upload has one of the same size.
+
+    Args:
+        image (django.core.files.File): The image, opened for reading.
+        working_size (int): The longest side of the working image.
+
+    Raises:
+        PIL.UnidentifiedImageError: If Pillow cannot read the image.
+
+    Returns:
+        int: The hash, as a signed 64-bit integer for BigIntegerField.
+    """
+    pixels = decode_grayscale(image, working_size).resize((9, 8), Image.Resampling.BOX).tobytes()
+    value = 0
+    for row in range(0, 72, 9):
+        for column in range(row, row + 8):
+            value = value << 1 | (pixels[column] > pixels[column + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def dhash_images(images, executor):
+    """
+    Run ``dhash_image`` on several images concurrently.
+
+    Args:
+        images (list): The uploaded images, already validated.
+        executor (utils.executors.ValidationExecutor): The executor running the hashing.
+
+    Returns:
+        list: The hash of each image, in order.
+    """
+    return executor.map(dhash_image, _executor_inputs(images, executor))
+
+
+ARCHIVE_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+
+def downscale_image(image, max_resolution):
+    """
+    Decode an image upright (EXIF orientation applied) and downscaled to fit in
+    ``max_resolution``, see ``decode_working_image``.
+
+    Args:
+        image (django.core.files.File): The image, opened for reading.
+        max_resolution (tuple): The maximum width and height.
+
+    Raises:
+        PIL.UnidentifiedImageError: If Pillow cannot read the image.
+
+    Returns:
+        PIL.Image.Image: The shared RGB image, do not modify it.
+    """
+    return decode_working_image(image, max_resolution, "RGB")
+
+
+def encode_archive_image(image, image_format="WEBP", quality=60, max_resolution=(1600, 1600)):
+    """
+    Re-encode an image as a smaller archival copy.
+
+    The image is made upright, downscaled to fit in ``max_resolution`` and saved
+    as WebP or progressive JPEG. Metadata is dropped.
+
+    Args:
+        image (django.core.files.File): The image, opened for reading.
+        image_format (str): "WEBP" or "JPEG".
+        quality (int): The encoder quality, 1-100.
+        max_resolution (tuple): The maximum width and height of the copy.
+
+    Raises:
+        PIL.UnidentifiedImageError: If Pillow cannot read the image.
+
+    Returns:
+        django.core.files.base.ContentFile: The encoded copy, named ``archive.<ext>``.
+    """
+    copy = downscale_image(image, max_resolution)
+    buffer = BytesIO()
+    if image_format == "JPEG":
+        copy.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        # Method 2 is within ~10% of the smallest output at a third of the encode time.
+        copy.save(buffer, format="WEBP", quality=quality, method=2)
+    return ContentFile(buffer.getvalue(), name="archive" + ARCHIVE_EXTENSIONS[image_format])
+
+
+class Base64ImageDecoder:
+    """
+    Incrementally decode base64 text into a spooled temporary file.
+
+    Text is fed in arbitrary chunks with ``feed``; whitespace and a leading
+    ``data:<type>;base64,`` prefix are ignored. Once ``max_size_mb`` is exceeded
+    the remaining text is only counted, not decoded, so oversized payloads never
+    reach memory or disk. The first ``max_size_mb`` are kept, so the header can
+    still be probed.
+    """
+
+    chunk_size = 64 * 1024
+    # Magic numbers used to pick a file extension Django's image validator accepts.
+    SIGNATURES = [
+        (b"\xff\xd8", "jpg", "image/jpeg"),
+        (PNG_SIGNATURE, "png", "image/png"),
+        (b"BM", "bmp", "image/bmp"),
+        (b"GIF8", "gif", "image/gif"),
+        (b"II*\x00", "tif", "image/tiff"),
+        (b"MM\x00*", "tif", "image/tiff"),
+    ]
+
+    def __init__(self, name, max_size_mb=None):
+        self.name = name
+        self.max_bytes = max_size_mb * 1024 * 1024 if max_size_mb else None
+        self.file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        self.size = 0
+        self.truncated = False
+        self._sha256 = hashlib.sha256()
+        self._pending = b""
+        self._prefix = b""
+
+    def feed(self, text):
+        """
+        Decode the next chunk of base64 text.
+
+        Args:
+            text (bytes): The base64 text, ASCII encoded.
+        """
+        text = text.translate(None, b" \t\r\n")
+        if self._prefix is not None:
+            # Hold back the start of the text until we know whether it is a data URI.
+            self._prefix += text
+            if self._prefix.startswith(b"data:"):
+                if b"," not in self._prefix:
+                    if len(self._prefix) < 256:
+                        return
+                    raise ValueError("Invalid data URI.")
+                text = self._prefix.split(b",", 1)[1]
+            elif len(self._prefix) < 5 and b"data:".startswith(self._prefix):
+                return
+            else:
+                text = self._prefix
+            self._prefix = None
+        if self.truncated:
+            self.size += len(text) * 3 // 4
+            return
+        text = self._pending + text
+        cut = len(text) - len(text) % 4
+        self._pending = text[cut:]
+        self._write(binascii.a2b_base64(text[:cut]))
+
+    def _write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            data = data[: max(0, len(data) - (self.size - self.max_bytes))]
+            self.truncated = True
+        self._sha256.update(data)
+        self.file.write(data)
+
+    def close(self):
+        """
+        Finish decoding.
+
+        Raises:
+            ValueError: If the text is not valid base64.
+
+        Returns:
+            django.core.files.uploadedfile.UploadedFile: The decoded file. Its ``size``
+            is the full decoded size, even when the content was truncated.
+        """
+        text = self._prefix or b""
+        if text.startswith(b"data:"):
+            raise ValueError("Invalid data URI.")
+        if (self._pending or text) and not self.truncated:
+            text = self._pending + text
+            text += b"=" * (-len(text) % 4)
+            if text.count(b"=") > 2:
+                raise ValueError("Invalid base64-encoded image.")
+            self._write(binascii.a2b_base64(text))
+        self.file.seek(0)
+        header = self.file.read(8)
+        self.file.seek(0)
+        extension, content_type = next(
+            (
+                (extension, content_type)
+                for signature, extension, content_type in self.SIGNATURES
+                if header.startswith(signature)
+            ),
+            ("bin", "application/octet-stream"),
+        )
+        upload = UploadedFile(
+            file=self.file,
+            name=f"{self.name}.{extension}",
+            content_type=content_type,
+            size=self.size,
+        )
+        upload.truncated = self.truncated
+        if not self.truncated:
+            upload.content_hash = self._sha256.hexdigest()
+        return upload
+
+
+def base64_to_image(base64_string, name="image", max_size_mb=None):
+    """
+    Convert base64 image string to an uploaded file.
+
+    The string is decoded in chunks into a spooled temporary file, see
+    ``Base64ImageDecoder``.
+
+    Args:
+        base64_string (str): The base64-encoded image string, optionally a data URI.
+        name (str): The file name, without extension.
+        max_size_mb (int): Stop decoding past this size (optional).
+
+    Raises:
+        ValueError: If the string is not valid base64.
+
+    Returns:
+        django.core.files.uploadedfile.UploadedFile: The decoded image file.
+    """
+    decoder = Base64ImageDecoder(name, max_size_mb=max_size_mb)
+    for start in range(0, len(base64_string), decoder.chunk_size):
+        decoder.feed(base64_string[start : start + decoder.chunk_size].encode("ascii"))
+    return decoder.close()
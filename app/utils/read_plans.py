@@ -0,0 +1,250 @@
+import threading
+from operator import itemgetter
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Fields whose representation of a non-null database value is the value itself.
+IDENTITY_FIELDS = (serializers.BooleanField, serializers.CharField, serializers.EmailField, serializers.IntegerField)
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def get_read_plan_settings():
+    """
+    Get the ``READ_PLANS`` settings with their defaults.
+
+    Returns:
+        dict: The read plan settings.
+    """
+    return {
+        "ENABLED": True,
+        **getattr(settings, "READ_PLANS", {}),
+    }
+
+
+class UnsupportedField(Exception):
+    """
+    A serializer field a ReadPlan cannot render from ``.values()`` rows.
+    """
+
+
+class _Row:
+    """
+    Attribute access to the values of one object of a ``.values()`` row, for
+    SerializerMethodFields. File fields are their names.
+    """
+
+    __slots__ = ("_row", "_prefix", "_pk")
+
+    def __init__(self, row, prefix, pk):
+        self._row = row
+        self._prefix = prefix
+        self._pk = pk
+
+    def __getattr__(self, name):
+        try:
+            return self._row[self._prefix + (self._pk if name == "pk" else name)]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class ReadPlan:
+    """
+    Flattened, read-only form of a ModelSerializer rendering ``.values()`` rows.
+
+    The serializer fields are compiled once into steps reading one column each:
+    plain fields (booleans, strings, integers) are copied, datetimes are
+    formatted in the time zone of the request, other scalar fields go through
+    their ``to_representation``, file fields become their (absolute)
+    URL, nested model serializers (``depth``) read the columns of the joined
+    model and SerializerMethodFields get a ``_Row``. The output is the same as
+    ``serializer.data``, without instantiating models or walking the fields of
+    every object.
+
+    Raises:
+        UnsupportedField: For relational fields other than nested serializers,
+            float fields and dotted sources.
+    """
+
+    def __init__(self, serializer):
+        self.paths = []
+        self.steps = self._compile(serializer, "", ())
+
+    def _compile(self, serializer, prefix, owner):
+        if not isinstance(serializer, serializers.ModelSerializer):
+            raise UnsupportedField(type(serializer).__name__)
+        model = serializer.Meta.model
+        steps = []
+        for field in serializer._readable_fields:
+            name = field.field_name
+            if isinstance(field, serializers.SerializerMethodField):
+                steps.append((name, "method", (owner, field.method_name, prefix, model._meta.pk.name)))
+                continue
+            if len(field.source_attrs) != 1:
+                raise UnsupportedField(name)
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise UnsupportedField(name) from None
+            path = prefix + field.source
+            if isinstance(field, serializers.ModelSerializer):
+                pk_path = f"{path}__{field.Meta.model._meta.pk.name}"
+                nested = self._compile(field, path + "__", owner + (name,))
+                if pk_path not in self.paths:
+                    self.paths.append(pk_path)
+                steps.append((name, "nested", (pk_path, nested)))
+                continue
+            if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField, serializers.ManyRelatedField)):
+                raise UnsupportedField(name)
+            if isinstance(field, serializers.FloatField):
+                # Rendered with FastJSONRenderer, whose float formatting differs.
+                raise UnsupportedField(name)
+            self.paths.append(path)
+            if isinstance(field, serializers.FileField):
+                use_url = getattr(field, "use_url", True)
+                steps.append((name, "file", (path, model_field.storage, use_url)))
+            elif type(field) in IDENTITY_FIELDS:
+                steps.append((name, "value", path))
+            elif type(field) is serializers.DateTimeField:
+                steps.append((name, "datetime", (path, field)))
+            else:
+                steps.append((name, "call", (path, field.to_representation)))
+        return steps
+
+    def bind(self, serializer):
+        """
+        Bind the steps to the context of a request.
+
+        Args:
+            serializer (Serializer): The serializer of the request, for its
+                ``request`` and method fields.
+
+        Returns:
+            callable: Renders one row.
+        """
+        request = serializer.context.get("request")
+        build_absolute_uri = request.build_absolute_uri if request is not None else None
+        converters = self._bind(self.steps, serializer, build_absolute_uri)
+
+        def render(row):
+            return {name: convert(row) for name, convert in converters}
+
+        return render
+
+    def _bind(self, steps, serializer, build_absolute_uri):
+        converters = []
+        for name, kind, arg in steps:
+            if kind == "value":
+                convert = itemgetter(arg)
+            elif kind == "call":
+                convert = _call_converter(*arg)
+            elif kind == "datetime":
+                convert = _datetime_converter(*arg)
+            elif kind == "file":
+                convert = _file_converter(*arg, build_absolute_uri)
+            elif kind == "method":
+                owner, method_name, prefix, pk = arg
+                bound = serializer
+                for field_name in owner:
+                    bound = bound.fields[field_name]
+                convert = _method_converter(getattr(bound, method_name), prefix, pk)
+            else:
+                convert = _nested_converter(arg[0], self._bind(arg[1], serializer, build_absolute_uri))
+            converters.append((name, convert))
+        return converters
+
+    def render(self, rows, serializer):
+        """
+        Render ``.values(*plan.paths)`` rows.
+
+        Returns:
+            list: The rows as ``serializer.data`` would represent their objects.
+        """
+        render = self.bind(serializer)
+        return [render(row) for row in rows]
+
+
+def _call_converter(path, to_representation):
+    def convert(row):
+        value = row[path]
+        return None if value is None else to_representation(value)
+
+    return convert
+
+
+def _datetime_converter(path, field):
+    # DateTimeField.to_representation with the time zone looked up once.
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return _call_converter(path, field.to_representation)
+
+    def convert(row):
+        value = row[path]
+        if value is None:
+            return None
+        if value.utcoffset() is None:
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(field_timezone).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return convert
+
+
+def _file_converter(path, storage, use_url, build_absolute_uri):
+    def convert(row):
+        name = row[path]
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return build_absolute_uri(url) if build_absolute_uri is not None else url
+
+    return convert
+
+
+def _method_converter(method, prefix, pk):
+    def convert(row):
+        return method(_Row(row, prefix, pk))
+
+    return convert
+
+
+def _nested_converter(pk_path, converters):
+    def convert(row):
+        if row[pk_path] is None:
+            return None
+        return {name: nested(row) for name, nested in converters}
+
+    return convert
+
+
+def get_read_plan(serializer):
+    """
+    Get the ReadPlan of a serializer class, compiled on first use.
+
+    Args:
+        serializer (ModelSerializer): An instance of the serializer class.
+
+    Returns:
+        ReadPlan: The plan, or None if the serializer has unsupported fields.
+    """
+    serializer_class = type(serializer)
+    try:
+        return _plans[serializer_class]
+    except KeyError:
+        pass
+    with _plans_lock:
+        if serializer_class not in _plans:
+            try:
+                _plans[serializer_class] = ReadPlan(serializer)
+            except UnsupportedField:
+                _plans[serializer_class] = None
+        return _plans[serializer_class]
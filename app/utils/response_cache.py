@@ -0,0 +1,182 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connections, router
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from utils.db_router import read_from_primary
+
+
+def get_response_cache_settings():
+    """
+    Get the ``RESPONSE_CACHE`` settings with their defaults.
+
+    Returns:
+        dict: The response cache settings.
+    """
+    return {
+        "ENABLED": True,
+        "ALIAS": "default",
+        "TIMEOUT": 300,
+        **getattr(settings, "RESPONSE_CACHE", {}),
+    }
+
+
+def _keys(model, pk):
+    key = f"response:{model._meta.label_lower}:{pk}"
+    return key, key + ":generation"
+
+
+def invalidate_cached_responses(model, pks):
+    """
+    Invalidate the cached representations of some objects.
+
+    Each object gets a new generation, entries cached under an older one are
+    ignored. Inside a transaction it is done again on commit, so requests
+    reading the old row until then cannot cache it for good.
+
+    Args:
+        model (type): The model.
+        pks (iterable): The primary keys of the objects.
+    """
+    config = get_response_cache_settings()
+    if not config["ENABLED"]:
+        return
+    keys = [_keys(model, pk)[1] for pk in pks]
+    if not keys:
+        return
+
+    def invalidate():
+        # Outlive the entries, an expired generation must not validate an older entry.
+        generation = uuid.uuid4().hex
+        caches[config["ALIAS"]].set_many(dict.fromkeys(keys, generation), config["TIMEOUT"] + 60)
+
+    invalidate()
+    connection = connections[router.db_for_write(model)]
+    if connection.in_atomic_block:
+        connection.on_commit(invalidate)
+
+
+def _embedded_generations(cache, config, data, embeds):
+    keys = []
+    for embedded_model, field in embeds:
+        value = data.get(field)
+        if isinstance(value, dict):
+            value = value.get(embedded_model._meta.pk.attname)
+        if value is not None:
+            keys.append(_keys(embedded_model, value)[1])
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, uuid.uuid4().hex, config["TIMEOUT"] + 60)
+            generations[key] = cache.get(key)
+    return generations
+
+
+def cached_representation(request, model, pk, load, embeds=()):
+    """
+    Get the serialized representation of an object through the response cache.
+
+    Entries are keyed by model and pk, and only used for requests to the same
+    host since representations hold absolute URLs. Misses are loaded from the
+    primary so that replica lag is never cached.
+
+    An entry also records the generations of the objects it embeds, so one
+    ``invalidate_cached_responses`` of e.g. a client invalidates every cached
+    representation embedding it.
+
+    Args:
+        request (HttpRequest): The request.
+        model (type): The model of the object.
+        pk: The primary key of the object, as given in the URL.
+        load (callable): Returns the serialized object on a miss. Exceptions
+            (e.g. Http404) propagate and nothing is cached.
+        embeds (iterable): ``(model, field)`` pairs of the embedded objects,
+            ``data[field]`` being their representation or pk.
+
+    Returns:
+        tuple: The serialized object and its ETag.
+    """
+    config = get_response_cache_settings()
+    try:
+        # One entry per object, whatever the spelling of the pk in the URL.
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        config["ENABLED"] = False
+    if not config["ENABLED"]:
+        data = load()
+        return data, hashlib.sha256(JSONRenderer().render(data)).hexdigest()
+    cache = caches[config["ALIAS"]]
+    key, generation_key = _keys(model, pk)
+    base = request.build_absolute_uri("/")
+    values = cache.get_many([key, generation_key])
+    entry, generation = values.get(key), values.get(generation_key)
+    if generation is None:
+        # Never validate against a missing (expired or evicted) generation.
+        cache.add(generation_key, uuid.uuid4().hex, config["TIMEOUT"] + 60)
+        generation = cache.get(generation_key)
+    elif (
+        entry is not None
+        and entry["generation"] == generation
+        and entry["base"] == base
+        and "embeds" in entry
+        and (not entry["embeds"] or cache.get_many(list(entry["embeds"])) == entry["embeds"])
+    ):
+        return entry["data"], entry["etag"]
+    with read_from_primary():
+        data = load()
+    etag = hashlib.sha256(JSONRenderer().render(data)).hexdigest()
+    entry = {
+        "generation": generation,
+        "embeds": _embedded_generations(cache, config, data, embeds),
+        "base": base,
+        "etag": etag,
+        "data": data,
+    }
+    cache.set(key, entry, config["TIMEOUT"])
+    return data, etag
+
+
+def conditional_json_response(request, data, etag, response_class=Response):
+    """
+    Build the response of a cached representation, a 304 when the client has it.
+
+    Returns:
+        HttpResponse: ``response_class(data)`` or ``HttpResponseNotModified``.
+    """
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = response_class(data)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+class CachedRetrieveMixin:
+    """
+    Serve ``retrieve`` from the response cache (``RESPONSE_CACHE``), with an
+    ETag so unchanged objects return 304.
+
+    Hits skip ``get_object``, so only for views without object permissions.
+    The model must invalidate its entries with ``invalidate_cached_responses``
+    when it changes, and list the models it embeds in ``cache_embeds``, see
+    ``cached_representation``.
+    """
+
+    cache_embeds = ()
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+
+        def load():
+            return self.get_serializer(self.get_object()).data
+
+        data, etag = cached_representation(
+            request, self.get_queryset().model, kwargs[lookup_url_kwarg], load, self.cache_embeds
+        )
+        return conditional_json_response(request, data, etag)
@@ -0,0 +1,350 @@
+import atexit
+import os
+import posixpath
+import tempfile
+import threading
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from utils.metrics import stage
+from utils.processing_images import content_hash
+
+
+class ContentAddressedMixin:
+    """
+    Names files after the SHA-256 of their content, sharded by hash prefix.
+
+    ``transaction_images/photo.jpg`` is stored as
+    ``transaction_images/ab/cd/abcd….jpg`` with the default ``shard_depth`` of 2
+    and ``shard_width`` of 2, so no directory holds more than a few thousand
+    files. Saving content that is already stored returns the existing name
+    without writing anything, so identical uploads share a single file.
+
+    With ``fallback`` (the alias of another storage, or a list of aliases tried in
+    order) files missing here are read from that storage. This keeps rows
+    pointing at an old backend working while ``manage.py rehome_transaction_images``
+    moves them, and originals moved to cold storage readable.
+    """
+
+    def __init__(self, *args, shard_depth=2, shard_width=2, fallback=None, **kwargs):
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+        self.fallback = fallback
+        super().__init__(*args, **kwargs)
+
+    def get_content_name(self, name, content):
+        """
+        Get the name the content is stored under.
+
+        Args:
+            name (str): The requested name, only its directory and extension are used.
+            content (django.core.files.File): The content to store.
+
+        Returns:
+            str: The sharded content-addressed name.
+        """
+        digest = content_hash(content)
+        shards = [digest[i * self.shard_width : (i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        extension = posixpath.splitext(name)[1].lower()
+        directory = posixpath.dirname(name)
+        if self.is_content_name(name) and self.shard_depth:
+            # Copying a stored file from another content-addressed storage.
+            directory = "/".join(directory.split("/")[: -self.shard_depth])
+        return posixpath.join(directory, *shards, digest + extension)
+
+    def is_content_name(self, name):
+        """
+        Whether ``name`` has the sharded content-addressed layout of this storage.
+        """
+        directory, filename = posixpath.split(name)
+        digest = posixpath.splitext(filename)[0]
+        if len(digest) != 64 or any(char not in "0123456789abcdef" for char in digest):
+            return False
+        shards = [digest[i * self.shard_width : (i + 1) * self.shard_width] for i in range(self.shard_depth)]
+        return directory.split("/")[-self.shard_depth :] == shards if shards else True
+
+    def save(self, name, content, max_length=None):
+        """
+        Save the content under its hash, unless it is already stored.
+
+        Args:
+            name (str): The requested name, only its directory and extension are used.
+            content (django.core.files.File): The content to store.
+            max_length (int): The maximum length of the returned name.
+
+        Returns:
+            str: The name of the stored file.
+        """
+        with stage("storage"):
+            name = self.get_content_name(name, content)
+            if self.stored(name):
+                return name
+            return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # A content-addressed name is never taken by different content.
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(f'Storage can not find an available filename for "{name}".')
+        return name
+
+    def get_fallback(self, name):
+        """
+        Get the storage holding ``name`` when it is only in the fallback storage.
+
+        Returns:
+            django.core.files.storage.Storage: The fallback storage or None.
+        """
+        if not self.fallback or self.stored(name):
+            return None
+        aliases = [self.fallback] if isinstance(self.fallback, str) else list(self.fallback)
+        for alias in aliases[:-1]:
+            if storages[alias].exists(name):
+                return storages[alias]
+        return storages[aliases[-1]]
+
+    def stored(self, name):
+        """
+        Whether ``name`` is in this storage, ignoring the fallback.
+        """
+        raise NotImplementedError("subclasses of ContentAddressedMixin must provide a stored() method")
+
+    def _open(self, name, mode="rb"):
+        fallback = self.get_fallback(name)
+        if fallback is not None:
+            return fallback.open(name, mode)
+        return super()._open(name, mode)
+
+    def exists(self, name):
+        fallback = self.get_fallback(name)
+        return self.stored(name) if fallback is None else fallback.exists(name)
+
+    def size(self, name):
+        fallback = self.get_fallback(name)
+        return super().size(name) if fallback is None else fallback.size(name)
+
+    def url(self, name):
+        fallback = self.get_fallback(name)
+        return super().url(name) if fallback is None else fallback.url(name)
+
+    def get_modified_time(self, name):
+        fallback = self.get_fallback(name)
+        return super().get_modified_time(name) if fallback is None else fallback.get_modified_time(name)
+
+
+class FsyncBatcher:
+    """
+    Defers ``fsync`` of written files and their directories so that they are
+    flushed together, every ``batch_size`` files or ``interval`` seconds.
+
+    A crash may lose the files written since the last flush, never leave a
+    partially written file under its final name.
+    """
+
+    def __init__(self, batch_size=64, interval=1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def add(self, path):
+        """
+        Schedule the fsync of a written file and of its directory.
+        """
+        with self._lock:
+            self._pending.append(path)
+            full = len(self._pending) >= self.batch_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Fsync the pending files and their directories.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for path in pending:
+            _fsync_path(path)
+        for directory in {os.path.dirname(path) for path in pending}:
+            _fsync_path(directory)
+
+
+def _fsync_path(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    """
+    File system storage with sharded content-addressed names and atomic writes.
+
+    Files are written to a temporary file in the target directory and renamed
+    into place, so readers never see a partial file. ``fsync`` is ``"always"``
+    (each file before it is renamed), ``"batch"`` (through an ``FsyncBatcher``
+    of ``fsync_batch_size`` files or ``fsync_interval`` seconds) or ``"never"``.
+    """
+
+    def __init__(self, *args, fsync="batch", fsync_batch_size=64, fsync_interval=1.0, **kwargs):
+        if fsync not in ("always", "batch", "never"):
+            raise ImproperlyConfigured('fsync must be "always", "batch" or "never".')
+        self.fsync = fsync
+        self.fsync_batcher = FsyncBatcher(fsync_batch_size, fsync_interval) if fsync == "batch" else None
+        super().__init__(*args, **kwargs)
+
+    def stored(self, name):
+        return os.path.lexists(self.path(name))
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+                if self.fsync == "always":
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if self.fsync == "always":
+            _fsync_path(directory)
+        elif self.fsync_batcher is not None:
+            self.fsync_batcher.add(full_path)
+        return name
+
+
+class S3ContentAddressedStorage(ContentAddressedMixin, Storage):
+    """
+    Content-addressed storage in an S3 compatible bucket (AWS, MinIO, Ceph…).
+
+    Requires ``boto3`` unless a ``client`` with the same interface is given
+    (e.g. a local stand-in in tests). Object PUTs are atomic, so no temporary
+    objects are needed. URLs are ``base_url`` + name when set, otherwise
+    presigned for ``url_expiry`` seconds.
+    """
+
+    def __init__(
+        self,
+        bucket_name=None,
+        prefix="",
+        endpoint_url=None,
+        base_url=None,
+        url_expiry=3600,
+        client=None,
+        client_options=None,
+        **kwargs,
+    ):
+        if not bucket_name:
+            raise ImproperlyConfigured("S3ContentAddressedStorage requires a bucket_name.")
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self.base_url = base_url
+        self.url_expiry = url_expiry
+        self.client_options = client_options or {}
+        self._client = client
+        super().__init__(**kwargs)
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImproperlyConfigured("S3ContentAddressedStorage requires boto3.")
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, **self.client_options)
+        return self._client
+
+    def key(self, name):
+        return posixpath.join(self.prefix, name) if self.prefix else name
+
+    def stored(self, name):
+        return self.head(name) is not None
+
+    def head(self, name):
+        """
+        Get the metadata of an object.
+
+        Returns:
+            dict: The ``head_object`` response or None if the object does not exist.
+        """
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=self.key(name))
+        except Exception as exc:
+            code = getattr(exc, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _save(self, name, content):
+        if hasattr(content, "seek"):
+            content.seek(0)
+        self.client.upload_fileobj(content, self.bucket_name, self.key(name))
+        return name
+
+    def _open(self, name, mode="rb"):
+        fallback = self.get_fallback(name)
+        if fallback is not None:
+            return fallback.open(name, mode)
+        body = self.client.get_object(Bucket=self.bucket_name, Key=self.key(name))["Body"]
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        while chunk := body.read(64 * 1024):
+            spooled.write(chunk)
+        spooled.seek(0)
+        return File(spooled, name=name)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self.key(name))
+
+    def size(self, name):
+        fallback = self.get_fallback(name)
+        return self.head(name)["ContentLength"] if fallback is None else fallback.size(name)
+
+    def get_modified_time(self, name):
+        fallback = self.get_fallback(name)
+        return self.head(name)["LastModified"] if fallback is None else fallback.get_modified_time(name)
+
+    def url(self, name):
+        fallback = self.get_fallback(name)
+        if fallback is not None:
+            return fallback.url(name)
+        if self.base_url:
+            return self.base_url.rstrip("/") + "/" + self.key(name)
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket_name, "Key": self.key(name)}, ExpiresIn=self.url_expiry
+        )
+
+
+def get_transaction_image_storage():
+    """
+    Storage of the transaction images, configured as ``STORAGES["transaction_images"]``.
+
+    Returns:
+        django.core.files.storage.Storage: The storage instance.
+    """
+    return storages["transaction_images"]
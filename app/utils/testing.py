@@ -0,0 +1,38 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin with query count assertions for API endpoints.
+    """
+
+    def assertQueryCountIndependentOfRows(self, url, create_rows, row_counts=(1, 5)):
+        """
+        Assert that a list endpoint runs the same number of queries however many
+        rows it returns, i.e. that it has no N+1 query.
+
+        Args:
+            url (str): The URL of the list endpoint.
+            create_rows (callable): Called with a number of rows to create.
+            row_counts (tuple): Increasing numbers of rows, all fitting in one page.
+
+        Returns:
+            int: The number of queries of one request.
+        """
+        query_counts = []
+        created = 0
+        for row_count in row_counts:
+            create_rows(row_count - created)
+            created = row_count
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(
+            len(set(query_counts)),
+            1,
+            f"The queries of {url} grow with the number of rows: "
+            + ", ".join(f"{rows} rows: {queries}" for rows, queries in zip(row_counts, query_counts)),
+        )
+        return query_counts[0]
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from utils.processing_images import downscale_image
+
+
+def get_thumbnail_settings():
+    """
+    Get the ``THUMBNAILS`` settings with their defaults.
+
+    Returns:
+        dict: The thumbnail settings.
+    """
+    return {
+        "ROOT": os.path.join(settings.BASE_DIR, "thumbnails"),
+        "MAX_BYTES": 512 * 1024 * 1024,
+        "SIZES": {"small": 160, "medium": 480, "large": 1024},
+        "QUALITY": 80,
+        **getattr(settings, "THUMBNAILS", {}),
+    }
+
+
+def render_thumbnail(image, size, quality=80):
+    """
+    Render a JPEG thumbnail fitting in a ``size`` x ``size`` square.
+
+    Args:
+        image (django.core.files.File): The source image, opened for reading.
+        size (int): The maximum width and height in pixels.
+        quality (int): The JPEG quality.
+
+    Returns:
+        bytes: The encoded thumbnail.
+    """
+    thumbnail = downscale_image(image, (size, size))
+    buffer = BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Disk cache of rendered thumbnails capped at ``max_bytes``.
+
+    Files are written atomically under ``root``. Every hit refreshes the file's
+    access time, and once the cache grows past ``max_bytes`` the least recently
+    used files are deleted until it is back under 90% of the cap. The
+    modification time is left alone, so it stays the time of rendering.
+
+    Attributes:
+        root (str): The cache directory.
+        max_bytes (int): The size cap of the cache.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".jpg")
+
+    def get_or_create(self, key, render):
+        """
+        Get the path of a cached file, rendering it on a miss.
+
+        Args:
+            key (str): The hex key of the file.
+            render (callable): Returns the bytes of the file, called on a miss.
+
+        Returns:
+            str: The path of the cached file.
+        """
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+            return path
+        except FileNotFoundError:
+            pass
+        content = render()
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".thumbnail-")
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _scan(self):
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_atime_ns
+
+    def _evict(self):
+        # Rescan rather than trust the running total, other processes share the directory.
+        files = sorted(self._scan(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for path, size, _ in files:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+
+def thumbnail_key(name, size, quality):
+    """
+    Get the cache key (and ETag) of a thumbnail of a stored image.
+
+    Stored images are content-addressed, so the key changes whenever the image does.
+
+    Returns:
+        str: A hex digest.
+    """
+    return hashlib.sha256(f"{name}:{size}:{quality}".encode()).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """
+    Get the process-wide thumbnail cache configured by ``THUMBNAILS``.
+
+    Returns:
+        ThumbnailCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = get_thumbnail_settings()
+                _cache = ThumbnailCache(config["ROOT"], config["MAX_BYTES"])
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_thumbnail_cache(setting, **kwargs):
+    """
+    Drop the shared cache when ``THUMBNAILS`` is overridden in tests.
+    """
+    global _cache
+    if setting == "THUMBNAILS":
+        with _cache_lock:
+            _cache = None
@@ -1,9 +1,22 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
+from datetime import datetime
+from functools import reduce
+from operator import attrgetter, itemgetter, or_
+from django.db.models import Q
 from rest_framework import filters, mixins, viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.utils.urls import replace_query_param
+from utils.authentication import AUTHENTICATION_MODES, CachedJWTAuthentication
+from utils.parsers import TimedContentNegotiation
+from utils.processing_images import DecodeBudgetExceeded
+from utils.read_plans import get_read_plan, get_read_plan_settings
+from utils.renderers import FastJSONRenderer
 
 
 class CustomPagination(PageNumberPagination):
@@ -37,6 +50,175 @@ class CustomPagination(PageNumberPagination):
         )
 
 
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over ``ordering``, newest first.
+
+    Pages are selected with ``WHERE (creation_date, id) < (cursor)`` instead of
+    OFFSET and no ``COUNT(*)`` is run, so every page costs the same at any depth
+    as long as ``ordering`` is indexed. Requests with a ``page`` parameter get
+    the page-number response of ``CustomPagination`` instead.
+    """
+
+    page_size = CustomPagination.page_size
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    ordering = ("creation_date", "id")
+    page_number_class = CustomPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Paginate a queryset.
+
+        Args:
+            queryset (QuerySet): The filtered queryset.
+            request (Request): The current request.
+            view (APIView): The current view.
+
+        Returns:
+            list: The objects of the requested page.
+        """
+        self.page_number = None
+        descending = [f"-{field}" for field in self.ordering]
+        if self.page_number_class.page_query_param in request.query_params:
+            self.page_number = self.page_number_class()
+            return self.page_number.paginate_queryset(queryset.order_by(*descending), request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            values, reverse = None, False
+            queryset = queryset.order_by(*descending)
+        else:
+            values, reverse = cursor
+            if reverse:
+                queryset = queryset.filter(self.keyset_filter(values, "gt")).order_by(*self.ordering)
+            else:
+                queryset = queryset.filter(self.keyset_filter(values, "lt")).order_by(*descending)
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        # Objects, or the rows of a ``.values()`` queryset.
+        key = itemgetter(*self.ordering) if results and isinstance(results[0], dict) else attrgetter(*self.ordering)
+        self.next_values = key(results[-1]) if has_next and results else None
+        self.previous_values = key(results[0]) if has_previous and results else None
+        return results
+
+    def keyset_filter(self, values, lookup):
+        """
+        Build ``(f1, f2, ...) <lookup> (v1, v2, ...)`` as a lexicographic Q object.
+
+        The leading ``f1 <lookup>= v1`` bound lets the database range-scan the index.
+        """
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            equal = {name: value for name, value in zip(self.ordering[:index], values)}
+            conditions.append(Q(**equal, **{f"{field}__{lookup}": values[index]}))
+        leading = Q(**{f"{self.ordering[0]}__{lookup}e": values[0]})
+        return leading & reduce(or_, conditions)
+
+    def encode_cursor(self, values, reverse):
+        payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        token = urlsafe_b64encode(json.dumps([payload, reverse]).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload, reverse = json.loads(urlsafe_b64decode(token.encode()))
+            created, pk = payload
+            return (datetime.fromisoformat(created), int(pk)), bool(reverse)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, reverse=True)
+
+    def get_paginated_response(self, data):
+        """
+        Get the paginated response.
+
+        Args:
+            data (list): The paginated data.
+
+        Returns:
+            Response: The paginated response with the next and previous links.
+        """
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class ReadPlanListMixin:
+    """
+    List with the ReadPlan of the serializer (``READ_PLANS``).
+
+    The filtered queryset is read with ``.values()`` and its rows rendered by
+    the plan, then encoded by FastJSONRenderer when the client negotiated
+    JSON; the body is the same as with ``ListModelMixin``. Serializers the plan
+    does not support are listed by ``ListModelMixin``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        plan = get_read_plan(serializer) if get_read_plan_settings()["ENABLED"] else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        ordering = getattr(self.paginator, "ordering", ())
+        paths = plan.paths + [field for field in ordering if field not in plan.paths]
+        queryset = self.filter_queryset(self.get_queryset()).values(*paths)
+        page = self.paginate_queryset(queryset)
+        data = plan.render(queryset if page is None else page, serializer)
+        if type(request.accepted_renderer) is JSONRenderer:
+            request.accepted_renderer = FastJSONRenderer()
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+
+class ImageDecodeBusy(APIException):
+    """
+    503 for images not admitted by the decode budget, retried after ``wait`` seconds.
+    """
+
+    status_code = 503
+    default_detail = "Too many images are being processed, retry later."
+    default_code = "image_decode_busy"
+    wait = 1
+
 
 class BaseViewSet(viewsets.GenericViewSet):
     """
@@ -46,7 +228,52 @@ class BaseViewSet(viewsets.GenericViewSet):
     pagination_class = CustomPagination
     filter_backends = (filters.SearchFilter,)
     custom_serializer_class = None
-    authentication_classes = [JWTAuthentication]
+    content_negotiation_class = TimedContentNegotiation
+    authentication_classes = [CachedJWTAuthentication]
+    # "user" (the user is read from the database), "cached_user" (read once per
+    # process, see JWT_USER_CACHE) or "token" (built from the token claims).
+    # None uses ``authentication_classes``.
+    authentication_mode = None
+    # Queryset tuning per action, e.g. ``select_related = {"list": ("client",)}``.
+    select_related = {}
+    prefetch_related = {}
+    only_fields = {}
+
+    def get_authenticators(self):
+        """
+        Get the authenticators of the ``authentication_mode``.
+
+        Returns:
+            list: The authenticator instances.
+        """
+        if self.authentication_mode is None:
+            return super().get_authenticators()
+        return [AUTHENTICATION_MODES[self.authentication_mode]()]
+
+    def get_queryset(self):
+        """
+        Get the queryset with the ``select_related``, ``prefetch_related`` and
+        ``only_fields`` declared for the current action.
+
+        Returns:
+            QuerySet: The queryset.
+        """
+        queryset = super().get_queryset()
+        if fields := self.select_related.get(self.action):
+            queryset = queryset.select_related(*fields)
+        if lookups := self.prefetch_related.get(self.action):
+            queryset = queryset.prefetch_related(*lookups)
+        if fields := self.only_fields.get(self.action):
+            queryset = queryset.only(*fields)
+        return queryset
+
+    def handle_exception(self, exc):
+        """
+        Answer 503 with a Retry-After header when the decode budget is exhausted.
+        """
+        if isinstance(exc, DecodeBudgetExceeded):
+            exc = ImageDecodeBusy()
+        return super().handle_exception(exc)
 
     def get_serializer_class(self):
         """
@@ -0,0 +1,29 @@
+# Gunicorn settings of the production profile, see compose-prod.yaml.
+#
+# SERVER_MODE=asgi (default) runs uvicorn workers with the async transaction
+# views (ASGI_VIEWS), SERVER_MODE=wsgi threaded sync workers. Both start
+# WEB_CONCURRENCY processes, one per CPU given to the container by default.
+import multiprocessing
+import os
+
+chdir = "app"
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# In-process validation workers start with each worker process, so transactions
+# left pending by a restart are validated without waiting for a new upload, and
+# so does the image hash index updater.
+os.environ.setdefault("ASYNC_VALIDATION_AUTOSTART", "true")
+os.environ.setdefault("IMAGE_HASHES_AUTOSTART", "true")
+
+if os.getenv("SERVER_MODE", "asgi") == "asgi":
+    wsgi_app = "core.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    os.environ.setdefault("ASGI_VIEWS", "true")
+else:
+    wsgi_app = "core.wsgi:application"
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", 8))